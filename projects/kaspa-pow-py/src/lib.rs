@@ -127,12 +127,253 @@ fn cshake256(custom: &[u8], data: &[u8], output_len: usize) -> Vec<u8> {
     output
 }
 
+// ═══════════════════════════════════════════════════════════════════════════════
+// Keccak-f[1600] (scalar + 4-way) for the mining loop
+// ═══════════════════════════════════════════════════════════════════════════════
+//
+// The sha3 crate does not expose its sponge state, so the hot path keeps raw
+// states: both cSHAKE inputs (80 and 32 bytes) fit in one 136-byte block, so
+// each hash is exactly one permutation on a precomputed state.
+
+const KECCAK_RATE: usize = 136;
+/// cSHAKE domain padding (SHAKE would be 0x1F)
+const CSHAKE_PAD: u64 = 0x04;
+/// Final bit of the rate block (byte 135 = 0x80), i.e. lane 16's top bit
+const RATE_END: u64 = 1 << 63;
+
+const KECCAK_RC: [u64; 24] = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808a, 0x8000000080008000,
+    0x000000000000808b, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008a, 0x0000000000000088, 0x0000000080008009, 0x000000008000000a,
+    0x000000008000808b, 0x800000000000008b, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800a, 0x800000008000000a,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+];
+
+/// Keccak-f[1600] on one state, each round fully unrolled (lane i = x + 5y)
+fn keccak_f1600(st: &mut [u64; 25]) {
+    let [
+        mut a0, mut a1, mut a2, mut a3, mut a4,
+        mut a5, mut a6, mut a7, mut a8, mut a9,
+        mut a10, mut a11, mut a12, mut a13, mut a14,
+        mut a15, mut a16, mut a17, mut a18, mut a19,
+        mut a20, mut a21, mut a22, mut a23, mut a24,
+    ] = *st;
+    for rc in KECCAK_RC.iter() {
+        let c0 = a0 ^ a5 ^ a10 ^ a15 ^ a20;
+        let c1 = a1 ^ a6 ^ a11 ^ a16 ^ a21;
+        let c2 = a2 ^ a7 ^ a12 ^ a17 ^ a22;
+        let c3 = a3 ^ a8 ^ a13 ^ a18 ^ a23;
+        let c4 = a4 ^ a9 ^ a14 ^ a19 ^ a24;
+        let d0 = c4 ^ c1.rotate_left(1);
+        let d1 = c0 ^ c2.rotate_left(1);
+        let d2 = c1 ^ c3.rotate_left(1);
+        let d3 = c2 ^ c4.rotate_left(1);
+        let d4 = c3 ^ c0.rotate_left(1);
+        let b0 = a0 ^ d0;
+        let b1 = (a6 ^ d1).rotate_left(44);
+        let b2 = (a12 ^ d2).rotate_left(43);
+        let b3 = (a18 ^ d3).rotate_left(21);
+        let b4 = (a24 ^ d4).rotate_left(14);
+        let b5 = (a3 ^ d3).rotate_left(28);
+        let b6 = (a9 ^ d4).rotate_left(20);
+        let b7 = (a10 ^ d0).rotate_left(3);
+        let b8 = (a16 ^ d1).rotate_left(45);
+        let b9 = (a22 ^ d2).rotate_left(61);
+        let b10 = (a1 ^ d1).rotate_left(1);
+        let b11 = (a7 ^ d2).rotate_left(6);
+        let b12 = (a13 ^ d3).rotate_left(25);
+        let b13 = (a19 ^ d4).rotate_left(8);
+        let b14 = (a20 ^ d0).rotate_left(18);
+        let b15 = (a4 ^ d4).rotate_left(27);
+        let b16 = (a5 ^ d0).rotate_left(36);
+        let b17 = (a11 ^ d1).rotate_left(10);
+        let b18 = (a17 ^ d2).rotate_left(15);
+        let b19 = (a23 ^ d3).rotate_left(56);
+        let b20 = (a2 ^ d2).rotate_left(62);
+        let b21 = (a8 ^ d3).rotate_left(55);
+        let b22 = (a14 ^ d4).rotate_left(39);
+        let b23 = (a15 ^ d0).rotate_left(41);
+        let b24 = (a21 ^ d1).rotate_left(2);
+        a0 = b0 ^ (!b1 & b2);
+        a1 = b1 ^ (!b2 & b3);
+        a2 = b2 ^ (!b3 & b4);
+        a3 = b3 ^ (!b4 & b0);
+        a4 = b4 ^ (!b0 & b1);
+        a5 = b5 ^ (!b6 & b7);
+        a6 = b6 ^ (!b7 & b8);
+        a7 = b7 ^ (!b8 & b9);
+        a8 = b8 ^ (!b9 & b5);
+        a9 = b9 ^ (!b5 & b6);
+        a10 = b10 ^ (!b11 & b12);
+        a11 = b11 ^ (!b12 & b13);
+        a12 = b12 ^ (!b13 & b14);
+        a13 = b13 ^ (!b14 & b10);
+        a14 = b14 ^ (!b10 & b11);
+        a15 = b15 ^ (!b16 & b17);
+        a16 = b16 ^ (!b17 & b18);
+        a17 = b17 ^ (!b18 & b19);
+        a18 = b18 ^ (!b19 & b15);
+        a19 = b19 ^ (!b15 & b16);
+        a20 = b20 ^ (!b21 & b22);
+        a21 = b21 ^ (!b22 & b23);
+        a22 = b22 ^ (!b23 & b24);
+        a23 = b23 ^ (!b24 & b20);
+        a24 = b24 ^ (!b20 & b21);
+        a0 ^= rc;
+    }
+    *st = [
+        a0, a1, a2, a3, a4,
+        a5, a6, a7, a8, a9,
+        a10, a11, a12, a13, a14,
+        a15, a16, a17, a18, a19,
+        a20, a21, a22, a23, a24,
+    ];
+}
+
+/// Keccak-f[1600] on 4 independent states at once, one 256-bit register per lane index
+#[cfg(target_arch = "x86_64")]
+#[target_feature(enable = "avx2")]
+unsafe fn keccak_f1600_x4_avx2(st: &mut [[u64; 4]; 25]) {
+    use std::arch::x86_64::*;
+    macro_rules! rotl {
+        ($x:expr, $k:literal) => {{
+            let x = $x;
+            _mm256_or_si256(_mm256_slli_epi64::<$k>(x), _mm256_srli_epi64::<{64 - $k}>(x))
+        }};
+    }
+    // [[u64; 4]; 25] and [__m256i; 25] are both 800 bytes; way w of lane i is element w of register i
+    let [
+        mut a0, mut a1, mut a2, mut a3, mut a4,
+        mut a5, mut a6, mut a7, mut a8, mut a9,
+        mut a10, mut a11, mut a12, mut a13, mut a14,
+        mut a15, mut a16, mut a17, mut a18, mut a19,
+        mut a20, mut a21, mut a22, mut a23, mut a24,
+    ]: [__m256i; 25] = std::mem::transmute(*st);
+    for rc in KECCAK_RC.iter() {
+        let c0 = _mm256_xor_si256(_mm256_xor_si256(a0, a5), _mm256_xor_si256(_mm256_xor_si256(a10, a15), a20));
+        let c1 = _mm256_xor_si256(_mm256_xor_si256(a1, a6), _mm256_xor_si256(_mm256_xor_si256(a11, a16), a21));
+        let c2 = _mm256_xor_si256(_mm256_xor_si256(a2, a7), _mm256_xor_si256(_mm256_xor_si256(a12, a17), a22));
+        let c3 = _mm256_xor_si256(_mm256_xor_si256(a3, a8), _mm256_xor_si256(_mm256_xor_si256(a13, a18), a23));
+        let c4 = _mm256_xor_si256(_mm256_xor_si256(a4, a9), _mm256_xor_si256(_mm256_xor_si256(a14, a19), a24));
+        let d0 = _mm256_xor_si256(c4, rotl!(c1, 1));
+        let d1 = _mm256_xor_si256(c0, rotl!(c2, 1));
+        let d2 = _mm256_xor_si256(c1, rotl!(c3, 1));
+        let d3 = _mm256_xor_si256(c2, rotl!(c4, 1));
+        let d4 = _mm256_xor_si256(c3, rotl!(c0, 1));
+        let b0 = _mm256_xor_si256(a0, d0);
+        let b1 = rotl!(_mm256_xor_si256(a6, d1), 44);
+        let b2 = rotl!(_mm256_xor_si256(a12, d2), 43);
+        let b3 = rotl!(_mm256_xor_si256(a18, d3), 21);
+        let b4 = rotl!(_mm256_xor_si256(a24, d4), 14);
+        let b5 = rotl!(_mm256_xor_si256(a3, d3), 28);
+        let b6 = rotl!(_mm256_xor_si256(a9, d4), 20);
+        let b7 = rotl!(_mm256_xor_si256(a10, d0), 3);
+        let b8 = rotl!(_mm256_xor_si256(a16, d1), 45);
+        let b9 = rotl!(_mm256_xor_si256(a22, d2), 61);
+        let b10 = rotl!(_mm256_xor_si256(a1, d1), 1);
+        let b11 = rotl!(_mm256_xor_si256(a7, d2), 6);
+        let b12 = rotl!(_mm256_xor_si256(a13, d3), 25);
+        let b13 = rotl!(_mm256_xor_si256(a19, d4), 8);
+        let b14 = rotl!(_mm256_xor_si256(a20, d0), 18);
+        let b15 = rotl!(_mm256_xor_si256(a4, d4), 27);
+        let b16 = rotl!(_mm256_xor_si256(a5, d0), 36);
+        let b17 = rotl!(_mm256_xor_si256(a11, d1), 10);
+        let b18 = rotl!(_mm256_xor_si256(a17, d2), 15);
+        let b19 = rotl!(_mm256_xor_si256(a23, d3), 56);
+        let b20 = rotl!(_mm256_xor_si256(a2, d2), 62);
+        let b21 = rotl!(_mm256_xor_si256(a8, d3), 55);
+        let b22 = rotl!(_mm256_xor_si256(a14, d4), 39);
+        let b23 = rotl!(_mm256_xor_si256(a15, d0), 41);
+        let b24 = rotl!(_mm256_xor_si256(a21, d1), 2);
+        a0 = _mm256_xor_si256(b0, _mm256_andnot_si256(b1, b2));
+        a1 = _mm256_xor_si256(b1, _mm256_andnot_si256(b2, b3));
+        a2 = _mm256_xor_si256(b2, _mm256_andnot_si256(b3, b4));
+        a3 = _mm256_xor_si256(b3, _mm256_andnot_si256(b4, b0));
+        a4 = _mm256_xor_si256(b4, _mm256_andnot_si256(b0, b1));
+        a5 = _mm256_xor_si256(b5, _mm256_andnot_si256(b6, b7));
+        a6 = _mm256_xor_si256(b6, _mm256_andnot_si256(b7, b8));
+        a7 = _mm256_xor_si256(b7, _mm256_andnot_si256(b8, b9));
+        a8 = _mm256_xor_si256(b8, _mm256_andnot_si256(b9, b5));
+        a9 = _mm256_xor_si256(b9, _mm256_andnot_si256(b5, b6));
+        a10 = _mm256_xor_si256(b10, _mm256_andnot_si256(b11, b12));
+        a11 = _mm256_xor_si256(b11, _mm256_andnot_si256(b12, b13));
+        a12 = _mm256_xor_si256(b12, _mm256_andnot_si256(b13, b14));
+        a13 = _mm256_xor_si256(b13, _mm256_andnot_si256(b14, b10));
+        a14 = _mm256_xor_si256(b14, _mm256_andnot_si256(b10, b11));
+        a15 = _mm256_xor_si256(b15, _mm256_andnot_si256(b16, b17));
+        a16 = _mm256_xor_si256(b16, _mm256_andnot_si256(b17, b18));
+        a17 = _mm256_xor_si256(b17, _mm256_andnot_si256(b18, b19));
+        a18 = _mm256_xor_si256(b18, _mm256_andnot_si256(b19, b15));
+        a19 = _mm256_xor_si256(b19, _mm256_andnot_si256(b15, b16));
+        a20 = _mm256_xor_si256(b20, _mm256_andnot_si256(b21, b22));
+        a21 = _mm256_xor_si256(b21, _mm256_andnot_si256(b22, b23));
+        a22 = _mm256_xor_si256(b22, _mm256_andnot_si256(b23, b24));
+        a23 = _mm256_xor_si256(b23, _mm256_andnot_si256(b24, b20));
+        a24 = _mm256_xor_si256(b24, _mm256_andnot_si256(b20, b21));
+        a0 = _mm256_xor_si256(a0, _mm256_set1_epi64x(*rc as i64));
+    }
+    *st = std::mem::transmute::<[__m256i; 25], [[u64; 4]; 25]>([
+        a0, a1, a2, a3, a4,
+        a5, a6, a7, a8, a9,
+        a10, a11, a12, a13, a14,
+        a15, a16, a17, a18, a19,
+        a20, a21, a22, a23, a24,
+    ]);
+}
+
+/// 4-way Keccak-f[1600]: AVX2 when the CPU has it, otherwise one state at a time
+fn keccak_f1600_x4(st: &mut [[u64; 4]; 25]) {
+    #[cfg(target_arch = "x86_64")]
+    {
+        if is_x86_feature_detected!("avx2") {
+            return unsafe { keccak_f1600_x4_avx2(st) };
+        }
+    }
+    for w in 0..4 {
+        let mut one = [0u64; 25];
+        for i in 0..25 {
+            one[i] = st[i][w];
+        }
+        keccak_f1600(&mut one);
+        for i in 0..25 {
+            st[i][w] = one[i];
+        }
+    }
+}
+
+/// Sponge state after absorbing cSHAKE256's bytepad(encode_string("") || encode_string(custom), 136)
+fn cshake256_init(custom: &[u8]) -> [u64; 25] {
+    assert!(custom.len() < 32, "custom string must fit a one-byte left_encode");
+    // left_encode(136) || left_encode(0) || left_encode(8 * len) || custom, zero-padded to one block
+    let mut block = [0u8; KECCAK_RATE];
+    block[..6].copy_from_slice(&[1, KECCAK_RATE as u8, 1, 0, 1, (custom.len() * 8) as u8]);
+    block[6..6 + custom.len()].copy_from_slice(custom);
+    
+    let mut st = [0u64; 25];
+    for i in 0..KECCAK_RATE / 8 {
+        st[i] = u64::from_le_bytes(block[i * 8..i * 8 + 8].try_into().unwrap());
+    }
+    keccak_f1600(&mut st);
+    st
+}
+
+#[inline]
+fn lanes_to_bytes(lanes: [u64; 4]) -> [u8; 32] {
+    let mut out = [0u8; 32];
+    for i in 0..4 {
+        out[i * 8..i * 8 + 8].copy_from_slice(&lanes[i].to_le_bytes());
+    }
+    out
+}
+
 // ═══════════════════════════════════════════════════════════════════════════════
 // HeavyHash (internal, no allocation per call)
 // ═══════════════════════════════════════════════════════════════════════════════
 
+/// Matrix multiply + XOR fold (everything before the final cSHAKE256)
 #[inline]
-fn heavy_hash_internal(matrix: &Matrix, hash: &[u8; 32]) -> [u8; 32] {
+fn heavy_digest(matrix: &Matrix, hash: &[u8; 32]) -> [u8; 32] {
     // Expand to 64 x 4-bit values
     let mut v = [0u16; 64];
     for i in 0..32 {
@@ -157,6 +398,141 @@ fn heavy_hash_internal(matrix: &Matrix, hash: &[u8; 32]) -> [u8; 32] {
         let low4 = (p[i * 2 + 1] & 0x0F) as u8;
         digest[i] = hash[i] ^ ((high4 << 4) | low4);
     }
+    digest
+}
+
+/// The matrix packed for the mining loop's int8 dot products
+///
+/// Entries and input nibbles are 0..15, so u8 x u8 products summed over 4
+/// columns fit VPDPBUSD / VPMADDUBSW. Rows are grouped 16 at a time and each
+/// group stores 4 consecutive columns per row next to each other, so one load
+/// feeds 16 rows at once, every row sum ends up in its own i32 lane and no
+/// horizontal reduction is needed. Two such column groups share a byte
+/// (low nibble = group 2c, high nibble = group 2c + 1):
+/// `nibbles[g][c][4 r + k] = m[16 g + r][8 c + k] | m[16 g + r][8 c + 4 + k] << 4`.
+/// That is 2 KiB instead of 8 KiB of u16; one AND / shift unpacks a load.
+/// The row-major matrix is kept for CPUs without AVX2.
+#[repr(C, align(64))]
+struct MatrixU8 {
+    nibbles: [[[u8; 64]; 8]; 4],
+    rows: Matrix,
+}
+
+impl MatrixU8 {
+    fn new(matrix: &Matrix) -> Self {
+        let mut nibbles = [[[0u8; 64]; 8]; 4];
+        for g in 0..4 {
+            for c in 0..8 {
+                for r in 0..16 {
+                    for k in 0..4 {
+                        let row = &matrix[g * 16 + r];
+                        nibbles[g][c][r * 4 + k] = (row[c * 8 + k] | (row[c * 8 + 4 + k] << 4)) as u8;
+                    }
+                }
+            }
+        }
+        MatrixU8 { nibbles, rows: *matrix }
+    }
+}
+
+/// 64 nibbles (high first) packed 4 per u32, matching MatrixU8's column groups
+#[inline]
+fn nibbles_x4(hash: &[u8; 32]) -> [u32; 16] {
+    let mut v = [0u32; 16];
+    for c in 0..16 {
+        let (b0, b1) = (hash[c * 2] as u32, hash[c * 2 + 1] as u32);
+        v[c] = (b0 >> 4) | ((b0 & 0x0F) << 8) | ((b1 >> 4) << 16) | ((b1 & 0x0F) << 24);
+    }
+    v
+}
+
+#[inline]
+fn xor_fold(hash: &[u8; 32], p: &[u32; 64]) -> [u8; 32] {
+    let mut digest = [0u8; 32];
+    for i in 0..32 {
+        let high4 = ((p[i * 2] >> 10) & 0x0F) as u8;
+        let low4 = ((p[i * 2 + 1] >> 10) & 0x0F) as u8;
+        digest[i] = hash[i] ^ ((high4 << 4) | low4);
+    }
+    digest
+}
+
+/// AVX-512 VNNI: 16 VPDPBUSD per 16 rows (64 per hash)
+#[cfg(target_arch = "x86_64")]
+#[target_feature(enable = "avx512f,avx512bw,avx512vnni")]
+unsafe fn heavy_digest_vnni(matrix: &MatrixU8, hash: &[u8; 32]) -> [u8; 32] {
+    use std::arch::x86_64::*;
+    let v = nibbles_x4(hash);
+    let low = _mm512_set1_epi8(0x0F);
+    let mut p = [0u32; 64];
+    for g in 0..4 {
+        let mut acc_lo = _mm512_setzero_si512();
+        let mut acc_hi = _mm512_setzero_si512();
+        for c in 0..8 {
+            let m = _mm512_load_si512(matrix.nibbles[g][c].as_ptr() as *const _);
+            let m_lo = _mm512_and_si512(m, low);
+            let m_hi = _mm512_and_si512(_mm512_srli_epi16(m, 4), low);
+            acc_lo = _mm512_dpbusd_epi32(acc_lo, m_lo, _mm512_set1_epi32(v[c * 2] as i32));
+            acc_hi = _mm512_dpbusd_epi32(acc_hi, m_hi, _mm512_set1_epi32(v[c * 2 + 1] as i32));
+        }
+        _mm512_storeu_si512(p.as_mut_ptr().add(g * 16) as *mut _, _mm512_add_epi32(acc_lo, acc_hi));
+    }
+    xor_fold(hash, &p)
+}
+
+/// AVX2: VPMADDUBSW + VPMADDWD on 8 rows per ymm
+#[cfg(target_arch = "x86_64")]
+#[target_feature(enable = "avx2")]
+unsafe fn heavy_digest_avx2(matrix: &MatrixU8, hash: &[u8; 32]) -> [u8; 32] {
+    use std::arch::x86_64::*;
+    let v = nibbles_x4(hash);
+    let ones = _mm256_set1_epi16(1);
+    let low = _mm256_set1_epi8(0x0F);
+    let mut p = [0u32; 64];
+    for g in 0..4 {
+        let mut acc0 = _mm256_setzero_si256();
+        let mut acc1 = _mm256_setzero_si256();
+        for c in 0..8 {
+            let v_lo = _mm256_set1_epi32(v[c * 2] as i32);
+            let v_hi = _mm256_set1_epi32(v[c * 2 + 1] as i32);
+            let m = matrix.nibbles[g][c].as_ptr() as *const __m256i;
+            let (m0, m1) = (_mm256_load_si256(m), _mm256_load_si256(m.add(1)));
+            // 4 products of at most 15 * 15 per i16, well inside range
+            let s0 = _mm256_add_epi16(
+                _mm256_maddubs_epi16(_mm256_and_si256(m0, low), v_lo),
+                _mm256_maddubs_epi16(_mm256_and_si256(_mm256_srli_epi16(m0, 4), low), v_hi),
+            );
+            let s1 = _mm256_add_epi16(
+                _mm256_maddubs_epi16(_mm256_and_si256(m1, low), v_lo),
+                _mm256_maddubs_epi16(_mm256_and_si256(_mm256_srli_epi16(m1, 4), low), v_hi),
+            );
+            acc0 = _mm256_add_epi32(acc0, _mm256_madd_epi16(s0, ones));
+            acc1 = _mm256_add_epi32(acc1, _mm256_madd_epi16(s1, ones));
+        }
+        _mm256_storeu_si256(p.as_mut_ptr().add(g * 16) as *mut __m256i, acc0);
+        _mm256_storeu_si256(p.as_mut_ptr().add(g * 16 + 8) as *mut __m256i, acc1);
+    }
+    xor_fold(hash, &p)
+}
+
+/// heavy_digest on MatrixU8: VNNI, then AVX2, then the scalar heavy_digest
+#[inline]
+fn heavy_digest_u8(matrix: &MatrixU8, hash: &[u8; 32]) -> [u8; 32] {
+    #[cfg(target_arch = "x86_64")]
+    {
+        if is_x86_feature_detected!("avx512vnni") && is_x86_feature_detected!("avx512bw") {
+            return unsafe { heavy_digest_vnni(matrix, hash) };
+        }
+        if is_x86_feature_detected!("avx2") {
+            return unsafe { heavy_digest_avx2(matrix, hash) };
+        }
+    }
+    heavy_digest(&matrix.rows, hash)
+}
+
+#[inline]
+fn heavy_hash_internal(matrix: &Matrix, hash: &[u8; 32]) -> [u8; 32] {
+    let digest = heavy_digest(matrix, hash);
     
     // Final cSHAKE256
     let result = cshake256(b"HeavyHash", &digest, 32);
@@ -188,6 +564,88 @@ fn calculate_pow_internal(
     heavy_hash_internal(matrix, &pow_hash)
 }
 
+/// cSHAKE256 sponge states with the per-template constant input already absorbed.
+///
+/// The bytepad(custom) block is permuted once per template, and the 72 constant
+/// PoW bytes are XORed in (not permuted: the block is not full yet). Per nonce
+/// only the nonce lane and the padding are added, so each hash is one
+/// permutation: 2 per nonce instead of 4.
+struct PowHasher {
+    /// "ProofOfWorkHash" + pre_pow_hash || timestamp || zeros(32); lane 9 (nonce) is left
+    pow_state: [u64; 25],
+    /// "HeavyHash" with nothing absorbed yet
+    heavy_state: [u64; 25],
+}
+
+impl PowHasher {
+    fn new(pre_pow_hash: &[u8; 32], timestamp: u64) -> Self {
+        let mut pow_state = cshake256_init(b"ProofOfWorkHash");
+        for i in 0..4 {
+            pow_state[i] ^= u64::from_le_bytes(pre_pow_hash[i * 8..i * 8 + 8].try_into().unwrap());
+        }
+        pow_state[4] ^= timestamp;
+        // lanes 5..9 are the 32 zero bytes
+        pow_state[10] ^= CSHAKE_PAD;
+        pow_state[16] ^= RATE_END;
+        Self { pow_state, heavy_state: cshake256_init(b"HeavyHash") }
+    }
+    
+    /// Same result as calculate_pow_internal(pre_pow_hash, timestamp, nonce, matrix)
+    #[inline]
+    fn calculate_pow(&self, nonce: u64, matrix: &MatrixU8) -> [u8; 32] {
+        let mut st = self.pow_state;
+        st[9] ^= nonce;
+        keccak_f1600(&mut st);
+        let digest = heavy_digest_u8(matrix, &lanes_to_bytes([st[0], st[1], st[2], st[3]]));
+        
+        let mut st = self.heavy_state;
+        for i in 0..4 {
+            st[i] ^= u64::from_le_bytes(digest[i * 8..i * 8 + 8].try_into().unwrap());
+        }
+        st[4] ^= CSHAKE_PAD;
+        st[16] ^= RATE_END;
+        keccak_f1600(&mut st);
+        lanes_to_bytes([st[0], st[1], st[2], st[3]])
+    }
+    
+    /// calculate_pow for 4 nonces: both cSHAKE256 calls run as one 4-way permutation.
+    /// Returns each hash as four little-endian u64 lanes (least significant first), straight
+    /// from the sponge, so the target check needs no byte round-trip.
+    #[inline]
+    fn calculate_pow_x4(&self, nonces: &[u64; 4], matrix: &MatrixU8) -> [[u64; 4]; 4] {
+        let mut st = [[0u64; 4]; 25];
+        for i in 0..25 {
+            st[i] = [self.pow_state[i]; 4];
+        }
+        for w in 0..4 {
+            st[9][w] ^= nonces[w];
+        }
+        keccak_f1600_x4(&mut st);
+        
+        let mut heavy = [[0u64; 4]; 25];
+        for i in 0..25 {
+            heavy[i] = [self.heavy_state[i]; 4];
+        }
+        for w in 0..4 {
+            let digest = heavy_digest_u8(matrix, &lanes_to_bytes([st[0][w], st[1][w], st[2][w], st[3][w]]));
+            for i in 0..4 {
+                heavy[i][w] ^= u64::from_le_bytes(digest[i * 8..i * 8 + 8].try_into().unwrap());
+            }
+        }
+        for w in 0..4 {
+            heavy[4][w] ^= CSHAKE_PAD;
+            heavy[16][w] ^= RATE_END;
+        }
+        keccak_f1600_x4(&mut heavy);
+        
+        let mut out = [[0u64; 4]; 4];
+        for w in 0..4 {
+            out[w] = [heavy[0][w], heavy[1][w], heavy[2][w], heavy[3][w]];
+        }
+        out
+    }
+}
+
 #[inline]
 fn hash_to_u256_le(hash: &[u8; 32]) -> [u64; 4] {
     [
@@ -216,9 +674,9 @@ fn compare_u256(a: &[u64; 4], b: &[u64; 4]) -> std::cmp::Ordering {
 
 struct MiningState {
     pre_pow_hash: [u8; 32],
-    timestamp: u64,
+    hasher: PowHasher,
     target: [u64; 4],
-    matrix: Matrix,
+    matrix: MatrixU8,
 }
 
 lazy_static::lazy_static! {
@@ -249,18 +707,12 @@ fn gen_matrix(py: Python, pre_pow_hash: &[u8]) -> PyResult<PyObject> {
     Ok(PyBytes::new(py, &flat).into())
 }
 
-/// Single PoW computation (for compatibility and testing)
-#[pyfunction]
-fn compute_pow(py: Python, pre_pow_hash: &[u8], timestamp: u64, nonce: u64, matrix_bytes: &[u8]) -> PyResult<PyObject> {
-    if pre_pow_hash.len() != 32 {
-        return Err(pyo3::exceptions::PyValueError::new_err("pre_pow_hash must be 32 bytes"));
-    }
+/// Parse the gen_matrix() format (64*64 u16, little-endian)
+fn matrix_from_bytes(matrix_bytes: &[u8]) -> PyResult<Matrix> {
     if matrix_bytes.len() != 64 * 64 * 2 {
         return Err(pyo3::exceptions::PyValueError::new_err("matrix must be 64*64*2 bytes"));
     }
     
-    let hash: [u8; 32] = pre_pow_hash.try_into().unwrap();
-    
     let mut matrix = [[0u16; 64]; 64];
     for i in 0..64 {
         for j in 0..64 {
@@ -268,14 +720,30 @@ fn compute_pow(py: Python, pre_pow_hash: &[u8], timestamp: u64, nonce: u64, matr
             matrix[i][j] = u16::from_le_bytes([matrix_bytes[idx], matrix_bytes[idx + 1]]);
         }
     }
+    Ok(matrix)
+}
+
+/// Single PoW computation (for compatibility and testing)
+#[pyfunction]
+fn compute_pow(py: Python, pre_pow_hash: &[u8], timestamp: u64, nonce: u64, matrix_bytes: &[u8]) -> PyResult<PyObject> {
+    if pre_pow_hash.len() != 32 {
+        return Err(pyo3::exceptions::PyValueError::new_err("pre_pow_hash must be 32 bytes"));
+    }
+    
+    let hash: [u8; 32] = pre_pow_hash.try_into().unwrap();
+    let matrix = matrix_from_bytes(matrix_bytes)?;
     
     let result = calculate_pow_internal(&hash, timestamp, nonce, &matrix);
     Ok(PyBytes::new(py, &result).into())
 }
 
 /// Setup mining state (call once per template)
+///
+/// matrix_bytes (gen_matrix() format) skips generating the matrix again when
+/// the caller already has it, e.g. published once by the main process.
 #[pyfunction]
-fn setup_mining(pre_pow_hash: &[u8], timestamp: u64, target_bytes: &[u8]) -> PyResult<()> {
+#[pyo3(signature = (pre_pow_hash, timestamp, target_bytes, matrix_bytes = None))]
+fn setup_mining(pre_pow_hash: &[u8], timestamp: u64, target_bytes: &[u8], matrix_bytes: Option<&[u8]>) -> PyResult<()> {
     if pre_pow_hash.len() != 32 {
         return Err(pyo3::exceptions::PyValueError::new_err("pre_pow_hash must be 32 bytes"));
     }
@@ -284,15 +752,18 @@ fn setup_mining(pre_pow_hash: &[u8], timestamp: u64, target_bytes: &[u8]) -> PyR
     }
     
     let hash: [u8; 32] = pre_pow_hash.try_into().unwrap();
-    let matrix = generate_matrix_internal(&hash);
+    let matrix = match matrix_bytes {
+        Some(bytes) => matrix_from_bytes(bytes)?,
+        None => generate_matrix_internal(&hash),
+    };
     
     let target = hash_to_u256_le(&target_bytes.try_into().unwrap());
     
     let state = MiningState {
         pre_pow_hash: hash,
-        timestamp,
+        hasher: PowHasher::new(&hash, timestamp),
         target,
-        matrix,
+        matrix: MatrixU8::new(&matrix),
     };
     
     *MINING_STATE.lock().unwrap() = Some(state);
@@ -307,18 +778,16 @@ fn mine_batch(py: Python, nonces: Vec<u64>) -> PyResult<Option<(u64, PyObject)>>
     let state = state_guard.as_ref()
         .ok_or_else(|| pyo3::exceptions::PyRuntimeError::new_err("Call setup_mining first"))?;
     
-    for nonce in nonces {
-        let pow_hash = calculate_pow_internal(
-            &state.pre_pow_hash,
-            state.timestamp,
-            nonce,
-            &state.matrix,
-        );
+    // 4 nonces per 4-way hash; a short last chunk is padded and its extra ways ignored
+    for chunk in nonces.chunks(4) {
+        let mut group = [0u64; 4];
+        group[..chunk.len()].copy_from_slice(chunk);
+        let hashes = state.hasher.calculate_pow_x4(&group, &state.matrix);
         
-        let pow_value = hash_to_u256_le(&pow_hash);
-        
-        if compare_u256(&pow_value, &state.target) == std::cmp::Ordering::Less {
-            return Ok(Some((nonce, PyBytes::new(py, &pow_hash).into())));
+        for (w, &nonce) in chunk.iter().enumerate() {
+            if compare_u256(&hashes[w], &state.target) == std::cmp::Ordering::Less {
+                return Ok(Some((nonce, PyBytes::new(py, &lanes_to_bytes(hashes[w])).into())));
+            }
         }
     }
     
@@ -334,28 +803,32 @@ fn mine_range(py: Python, start_nonce: u64, count: u64, random_mode: bool) -> Py
         .ok_or_else(|| pyo3::exceptions::PyRuntimeError::new_err("Call setup_mining first"))?;
     
     let mut rng_state: u64 = start_nonce;
-    
-    for i in 0..count {
-        let nonce = if random_mode {
+    let mut next_nonce = |i: u64| -> u64 {
+        if random_mode {
             // Simple fast PRNG for random nonce
             rng_state = rng_state.wrapping_mul(6364136223846793005).wrapping_add(1442695040888963407);
             rng_state
         } else {
             start_nonce.wrapping_add(i)
-        };
-        
-        let pow_hash = calculate_pow_internal(
-            &state.pre_pow_hash,
-            state.timestamp,
-            nonce,
-            &state.matrix,
-        );
-        
-        let pow_value = hash_to_u256_le(&pow_hash);
+        }
+    };
+    
+    // 4 nonces per 4-way hash, checked in nonce order; ways past `count` are ignored
+    let mut i = 0;
+    while i < count {
+        let nonces = [next_nonce(i), next_nonce(i + 1), next_nonce(i + 2), next_nonce(i + 3)];
+        let hashes = state.hasher.calculate_pow_x4(&nonces, &state.matrix);
         
-        if compare_u256(&pow_value, &state.target) == std::cmp::Ordering::Less {
-            return Ok((Some(nonce), Some(PyBytes::new(py, &pow_hash).into()), i + 1));
+        for w in 0..4 {
+            let done = i + w as u64 + 1;
+            if done > count {
+                break;
+            }
+            if compare_u256(&hashes[w], &state.target) == std::cmp::Ordering::Less {
+                return Ok((Some(nonces[w]), Some(PyBytes::new(py, &lanes_to_bytes(hashes[w])).into()), done));
+            }
         }
+        i += 4;
     }
     
     Ok((None, None, count))
@@ -37,17 +37,9 @@ def write_var_bytes(hasher, data: bytes):
     hasher.update(data)
 
 def write_blue_work(hasher, blue_work: str):
-    if not blue_work:
-        write_var_bytes(hasher, b'')
-        return
-    hex_str = blue_work
-    if len(hex_str) % 2 == 1:
-        hex_str = '0' + hex_str
-    work_bytes = bytes.fromhex(hex_str)
-    start = 0
-    while start < len(work_bytes) and work_bytes[start] == 0:
-        start += 1
-    write_var_bytes(hasher, work_bytes[start:])
+    # bit_length 直接決定長度，int → bytes 在 C 層完成，不用逐 byte 去前導零
+    n = int(blue_work or '0', 16)
+    write_var_bytes(hasher, n.to_bytes((n.bit_length() + 7) // 8, 'big'))
 
 def calculate_pre_pow_hash(header) -> bytes:
     """計算 pre_pow_hash（timestamp 和 nonce 設為 0）"""
@@ -31,18 +31,11 @@ def write_len(hasher, length: int):
     hasher.update(struct.pack('<Q', length))
 
 def write_blue_work(hasher, blue_work: str):
-    if not blue_work:
-        hasher.update(struct.pack('<Q', 0))
-        return
-    hex_str = blue_work
-    if len(hex_str) % 2 == 1:
-        hex_str = '0' + hex_str
-    work_bytes = bytes.fromhex(hex_str)
-    start = 0
-    while start < len(work_bytes) and work_bytes[start] == 0:
-        start += 1
-    write_len(hasher, len(work_bytes) - start)
-    hasher.update(work_bytes[start:])
+    # bit_length 直接決定長度，int → bytes 在 C 層完成，不用逐 byte 去前導零
+    n = int(blue_work or '0', 16)
+    work_bytes = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    write_len(hasher, len(work_bytes))
+    hasher.update(work_bytes)
 
 def calculate_pre_pow_hash(header) -> bytes:
     hasher = hashlib.blake2b(digest_size=32)
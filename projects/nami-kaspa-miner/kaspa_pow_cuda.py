@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+═══════════════════════════════════════════════════════════════════════════════
+  🌊 Kaspa PoW - CUDA (CuPy RawKernel) 版
+═══════════════════════════════════════════════════════════════════════════════
+
+  By Nami 🌊 - 2026
+
+  一次 kernel launch 掃描 10⁵~10⁶ 個 nonce：
+  - 每個 thread 一個 nonce：cSHAKE256("ProofOfWorkHash") → 64x64 矩陣乘法
+    → XOR → cSHAKE256("HeavyHash") → 與 target 比較
+  - 80 bytes 的 PoW 輸入剛好一個 Keccak block（rate 136），
+    cSHAKE 的固定前綴 block 每個 template 只吸收一次（init_state）
+  - 每個 thread 一個完整的 sponge：Keccak 展開成 25 個暫存器變數，
+    不用 warp shuffle 交換 lane（一個 nonce 只要 2 次 permutation，thread 之間沒有資料相依）
+  - 矩陣每個 template 上傳一次，一個 byte 放兩個 nibble（2 KB，每列 8 個 uint32），
+    每個 block 合力載入 shared memory，內積用 __dp4a 一次 4 個 nibble 乘積
+  - 找到的 nonce 以區段內偏移量用 atomicMin 寫入單一結果槽（nonce 繞回 0 時仍是區段內第一個）
+
+  用法：
+    scanner = CudaScanner()
+    scanner.set_template(pre_pow_hash, timestamp, matrix, target)
+    nonce = scanner.scan(nonce_start, count)   # None = 沒找到
+    hashes = scanner.compute_batch(nonces)     # (N, 32) uint8，驗證用
+
+═══════════════════════════════════════════════════════════════════════════════
+"""
+
+import struct
+from typing import Optional
+
+import numpy as np
+import cupy as cp
+
+KECCAK_RATE = 136
+NO_NONCE = 0xFFFFFFFFFFFFFFFF
+
+def _left_encode(x: int) -> bytes:
+    """NIST SP 800-185 left_encode"""
+    n = max(1, (x.bit_length() + 7) // 8)
+    return bytes([n]) + x.to_bytes(n, 'big')
+
+def cshake256_prefix(custom: bytes) -> bytes:
+    """bytepad(encode_string(N) || encode_string(S), 136)，N 為空"""
+    body = _left_encode(KECCAK_RATE) + _left_encode(0) + _left_encode(len(custom) * 8) + custom
+    return body + b'\x00' * (-len(body) % KECCAK_RATE)
+
+POW_PREFIX = cshake256_prefix(b"ProofOfWorkHash")
+HEAVY_PREFIX = cshake256_prefix(b"HeavyHash")
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CUDA 原始碼
+# ═══════════════════════════════════════════════════════════════════════════════
+
+CUDA_SOURCE = r'''
+typedef unsigned long long u64;
+
+__device__ __constant__ u64 KECCAK_RC[24] = {
+    0x0000000000000001ULL, 0x0000000000008082ULL, 0x800000000000808aULL,
+    0x8000000080008000ULL, 0x000000000000808bULL, 0x0000000080000001ULL,
+    0x8000000080008081ULL, 0x8000000000008009ULL, 0x000000000000008aULL,
+    0x0000000000000088ULL, 0x0000000080008009ULL, 0x000000008000000aULL,
+    0x000000008000808bULL, 0x800000000000008bULL, 0x8000000000008089ULL,
+    0x8000000000008003ULL, 0x8000000000008002ULL, 0x8000000000000080ULL,
+    0x000000000000800aULL, 0x800000008000000aULL, 0x8000000080008081ULL,
+    0x8000000000008080ULL, 0x0000000080000001ULL, 0x8000000080008008ULL
+};
+
+__device__ __forceinline__ u64 rotl64(u64 x, int k) {
+    return (x << k) | (x >> (64 - k));
+}
+
+// 4 個 uint8 乘積和累加到 c（sm_61 以上是一條 dp4a 指令）
+__device__ __forceinline__ unsigned int dot4(unsigned int a, unsigned int b, unsigned int c) {
+#if defined(__CUDA_ARCH__) && __CUDA_ARCH__ < 610
+    for (int k = 0; k < 32; k += 8)
+        c += ((a >> k) & 0xFF) * ((b >> k) & 0xFF);
+    return c;
+#else
+    return __dp4a(a, b, c);
+#endif
+}
+
+// 每個 round 完全展開（lane i = x + 5y），25 個 lane 都留在暫存器；
+// 用查表的 rho/pi 迴圈會讓 st[] 動態索引而被放到 local memory
+__device__ __forceinline__ void keccak_f1600(u64 st[25]) {
+    u64 a0 = st[0], a1 = st[1], a2 = st[2], a3 = st[3], a4 = st[4];
+    u64 a5 = st[5], a6 = st[6], a7 = st[7], a8 = st[8], a9 = st[9];
+    u64 a10 = st[10], a11 = st[11], a12 = st[12], a13 = st[13], a14 = st[14];
+    u64 a15 = st[15], a16 = st[16], a17 = st[17], a18 = st[18], a19 = st[19];
+    u64 a20 = st[20], a21 = st[21], a22 = st[22], a23 = st[23], a24 = st[24];
+    for (int round = 0; round < 24; round++) {
+        u64 c0 = a0 ^ a5 ^ a10 ^ a15 ^ a20;
+        u64 c1 = a1 ^ a6 ^ a11 ^ a16 ^ a21;
+        u64 c2 = a2 ^ a7 ^ a12 ^ a17 ^ a22;
+        u64 c3 = a3 ^ a8 ^ a13 ^ a18 ^ a23;
+        u64 c4 = a4 ^ a9 ^ a14 ^ a19 ^ a24;
+        u64 d0 = c4 ^ rotl64(c1, 1);
+        u64 d1 = c0 ^ rotl64(c2, 1);
+        u64 d2 = c1 ^ rotl64(c3, 1);
+        u64 d3 = c2 ^ rotl64(c4, 1);
+        u64 d4 = c3 ^ rotl64(c0, 1);
+        u64 b0 = a0 ^ d0;
+        u64 b1 = rotl64(a6 ^ d1, 44);
+        u64 b2 = rotl64(a12 ^ d2, 43);
+        u64 b3 = rotl64(a18 ^ d3, 21);
+        u64 b4 = rotl64(a24 ^ d4, 14);
+        u64 b5 = rotl64(a3 ^ d3, 28);
+        u64 b6 = rotl64(a9 ^ d4, 20);
+        u64 b7 = rotl64(a10 ^ d0, 3);
+        u64 b8 = rotl64(a16 ^ d1, 45);
+        u64 b9 = rotl64(a22 ^ d2, 61);
+        u64 b10 = rotl64(a1 ^ d1, 1);
+        u64 b11 = rotl64(a7 ^ d2, 6);
+        u64 b12 = rotl64(a13 ^ d3, 25);
+        u64 b13 = rotl64(a19 ^ d4, 8);
+        u64 b14 = rotl64(a20 ^ d0, 18);
+        u64 b15 = rotl64(a4 ^ d4, 27);
+        u64 b16 = rotl64(a5 ^ d0, 36);
+        u64 b17 = rotl64(a11 ^ d1, 10);
+        u64 b18 = rotl64(a17 ^ d2, 15);
+        u64 b19 = rotl64(a23 ^ d3, 56);
+        u64 b20 = rotl64(a2 ^ d2, 62);
+        u64 b21 = rotl64(a8 ^ d3, 55);
+        u64 b22 = rotl64(a14 ^ d4, 39);
+        u64 b23 = rotl64(a15 ^ d0, 41);
+        u64 b24 = rotl64(a21 ^ d1, 2);
+        a0 = b0 ^ (~b1 & b2);
+        a1 = b1 ^ (~b2 & b3);
+        a2 = b2 ^ (~b3 & b4);
+        a3 = b3 ^ (~b4 & b0);
+        a4 = b4 ^ (~b0 & b1);
+        a5 = b5 ^ (~b6 & b7);
+        a6 = b6 ^ (~b7 & b8);
+        a7 = b7 ^ (~b8 & b9);
+        a8 = b8 ^ (~b9 & b5);
+        a9 = b9 ^ (~b5 & b6);
+        a10 = b10 ^ (~b11 & b12);
+        a11 = b11 ^ (~b12 & b13);
+        a12 = b12 ^ (~b13 & b14);
+        a13 = b13 ^ (~b14 & b10);
+        a14 = b14 ^ (~b10 & b11);
+        a15 = b15 ^ (~b16 & b17);
+        a16 = b16 ^ (~b17 & b18);
+        a17 = b17 ^ (~b18 & b19);
+        a18 = b18 ^ (~b19 & b15);
+        a19 = b19 ^ (~b15 & b16);
+        a20 = b20 ^ (~b21 & b22);
+        a21 = b21 ^ (~b22 & b23);
+        a22 = b22 ^ (~b23 & b24);
+        a23 = b23 ^ (~b24 & b20);
+        a24 = b24 ^ (~b20 & b21);
+        a0 ^= KECCAK_RC[round];
+    }
+    st[0] = a0; st[1] = a1; st[2] = a2; st[3] = a3; st[4] = a4;
+    st[5] = a5; st[6] = a6; st[7] = a7; st[8] = a8; st[9] = a9;
+    st[10] = a10; st[11] = a11; st[12] = a12; st[13] = a13; st[14] = a14;
+    st[15] = a15; st[16] = a16; st[17] = a17; st[18] = a18; st[19] = a19;
+    st[20] = a20; st[21] = a21; st[22] = a22; st[23] = a23; st[24] = a24;
+}
+
+// 吸收 cSHAKE 固定前綴（一個完整 block），輸出初始 state
+extern "C" __global__ void cshake_init_state(const u64* prefix, u64* out) {
+    u64 st[25];
+    for (int i = 0; i < 25; i++) st[i] = 0;
+    for (int i = 0; i < 17; i++) st[i] ^= prefix[i];
+    keccak_f1600(st);
+    for (int i = 0; i < 25; i++) out[i] = st[i];
+}
+
+// 整個 block 共用一份矩陣（2 KB），每個 thread 載入一部分
+__device__ __forceinline__ void load_matrix(unsigned int* sm_matrix, const unsigned int* matrix) {
+    for (int i = threadIdx.x; i < 64 * 8; i += blockDim.x)
+        sm_matrix[i] = matrix[i];
+    __syncthreads();
+}
+
+// 一個 nonce 的完整 HeavyHash，out = 最終 hash 的 4 個 little-endian lane
+//   pow_state:   吸收 "ProofOfWorkHash" 前綴後的 state (25 lanes)
+//   heavy_state: 吸收 "HeavyHash" 前綴後的 state (25 lanes)
+//   header:      pre_pow_hash || timestamp || zeros(32) = 9 lanes
+//   sm_matrix:   每列 8 個 uint32，word c 的 byte k：低 nibble = 第 8c+k 欄，高 nibble = 第 8c+4+k 欄
+__device__ __forceinline__ void heavyhash(
+    const u64* pow_state, const u64* heavy_state, const u64* header,
+    const unsigned int* sm_matrix, u64 nonce, u64 out[4])
+{
+    // ── cSHAKE256("ProofOfWorkHash")：80 bytes = 一個 block ──
+    u64 st[25];
+    #pragma unroll
+    for (int i = 0; i < 25; i++) st[i] = pow_state[i];
+    #pragma unroll
+    for (int i = 0; i < 9; i++) st[i] ^= header[i];
+    st[9] ^= nonce;
+    st[10] ^= 0x04ULL;                  // cSHAKE padding @ byte 80
+    st[16] ^= 0x8000000000000000ULL;    // 最後一個 byte 的 0x80
+    keccak_f1600(st);
+
+    // ── 展開成 64 個 nibble（每個 byte 高位先），每 4 個打包成一個 uint32 ──
+    unsigned char hash[32];
+    unsigned int v4[16];
+    #pragma unroll
+    for (int i = 0; i < 4; i++) {
+        u64 lane = st[i];
+        #pragma unroll
+        for (int b = 0; b < 8; b++)
+            hash[i * 8 + b] = (unsigned char)(lane >> (8 * b));
+    }
+    #pragma unroll
+    for (int j = 0; j < 16; j++) {
+        unsigned int b0 = hash[2 * j], b1 = hash[2 * j + 1];
+        v4[j] = (b0 >> 4) | ((b0 & 0x0F) << 8) | ((b1 >> 4) << 16) | ((b1 & 0x0F) << 24);
+    }
+
+    // ── 矩陣乘法（dp4a）+ XOR ──
+    u64 digest[4] = {0, 0, 0, 0};
+    #pragma unroll
+    for (int i = 0; i < 32; i++) {
+        unsigned int s1 = 0, s2 = 0;
+        const unsigned int* r1 = sm_matrix + (2 * i) * 8;
+        const unsigned int* r2 = r1 + 8;
+        #pragma unroll
+        for (int j = 0; j < 8; j++) {
+            unsigned int w1 = r1[j], w2 = r2[j];
+            s1 = dot4(w1 & 0x0F0F0F0Fu, v4[2 * j], s1);
+            s1 = dot4((w1 >> 4) & 0x0F0F0F0Fu, v4[2 * j + 1], s1);
+            s2 = dot4(w2 & 0x0F0F0F0Fu, v4[2 * j], s2);
+            s2 = dot4((w2 >> 4) & 0x0F0F0F0Fu, v4[2 * j + 1], s2);
+        }
+        unsigned char b = (unsigned char)((((s1 >> 10) & 0x0F) << 4) | ((s2 >> 10) & 0x0F));
+        digest[i / 8] |= (u64)(hash[i] ^ b) << (8 * (i % 8));
+    }
+
+    // ── cSHAKE256("HeavyHash")：32 bytes ──
+    #pragma unroll
+    for (int i = 0; i < 25; i++) st[i] = heavy_state[i];
+    #pragma unroll
+    for (int i = 0; i < 4; i++) st[i] ^= digest[i];
+    st[4] ^= 0x04ULL;
+    st[16] ^= 0x8000000000000000ULL;
+    keccak_f1600(st);
+
+    #pragma unroll
+    for (int i = 0; i < 4; i++) out[i] = st[i];
+}
+
+// 每個 thread 一個 nonce
+//   target:      256-bit little-endian = 4 lanes
+//   found:       atomicMin 結果槽，存 nonce 相對 nonce_start 的偏移（初始 0xFFFF...）
+extern "C" __global__ void heavyhash_scan(
+    const u64* pow_state, const u64* heavy_state, const u64* header,
+    const unsigned int* matrix, const u64* target,
+    u64 nonce_start, u64 count, u64* found)
+{
+    __shared__ unsigned int sm_matrix[64 * 8];
+    load_matrix(sm_matrix, matrix);
+
+    u64 idx = (u64)blockIdx.x * blockDim.x + threadIdx.x;
+    if (idx >= count) return;
+    u64 nonce = nonce_start + idx;
+
+    u64 h[4];
+    heavyhash(pow_state, heavy_state, header, sm_matrix, nonce, h);
+
+    // ── 256-bit little-endian 比較：hash < target ──
+    #pragma unroll
+    for (int i = 3; i >= 0; i--) {
+        if (h[i] < target[i]) { atomicMin(found, idx); return; }
+        if (h[i] > target[i]) return;
+    }
+}
+
+// 任意 nonce 陣列的完整 PoW hash（驗證 / 重建搜尋空間用），每個 nonce 寫 4 lanes 到 out
+extern "C" __global__ void heavyhash_batch(
+    const u64* pow_state, const u64* heavy_state, const u64* header,
+    const unsigned int* matrix, const u64* nonces, u64 count, u64* out)
+{
+    __shared__ unsigned int sm_matrix[64 * 8];
+    load_matrix(sm_matrix, matrix);
+
+    u64 idx = (u64)blockIdx.x * blockDim.x + threadIdx.x;
+    if (idx >= count) return;
+    heavyhash(pow_state, heavy_state, header, sm_matrix, nonces[idx], out + 4 * idx);
+}
+'''
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# Python 包裝
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class CudaScanner:
+    """GPU nonce 掃描器（每個 worker 進程一個，必須在 fork 之後建立）"""
+
+    def __init__(self, device: int = 0, threads_per_block: int = 256):
+        self.device = cp.cuda.Device(device)
+        self.device.use()
+        self.threads = threads_per_block
+
+        module = cp.RawModule(code=CUDA_SOURCE, options=('-std=c++11',))
+        self._init_kernel = module.get_function('cshake_init_state')
+        self._scan_kernel = module.get_function('heavyhash_scan')
+        self._batch_kernel = module.get_function('heavyhash_batch')
+
+        # 兩個 cSHAKE 前綴 state 每個進程只算一次
+        self.pow_state = self._init_state(POW_PREFIX)
+        self.heavy_state = self._init_state(HEAVY_PREFIX)
+
+        self.header = None
+        self.matrix = None
+        self.target = None
+        self.found = cp.empty(1, dtype=cp.uint64)
+
+    def _init_state(self, prefix: bytes) -> cp.ndarray:
+        lanes = cp.asarray(np.frombuffer(prefix, dtype='<u8'))
+        out = cp.empty(25, dtype=cp.uint64)
+        self._init_kernel((1,), (1,), (lanes, out))
+        return out
+
+    def set_template(self, pre_pow_hash: bytes, timestamp: int, matrix: np.ndarray, target: int):
+        """上傳 template（每個 template 一次）"""
+        header = pre_pow_hash + struct.pack('<Q', timestamp) + b'\x00' * 32
+        self.header = cp.asarray(np.frombuffer(header, dtype='<u8'))
+        # 元素 0..15：每 8 欄一組，第 k 與第 4+k 欄共用一個 byte（低/高 nibble），kernel 拆開後餵給 dp4a
+        m = np.ascontiguousarray(matrix, dtype=np.uint8).reshape(64, 8, 2, 4)
+        packed = m[:, :, 0, :] | (m[:, :, 1, :] << 4)
+        self.matrix = cp.asarray(np.ascontiguousarray(packed).view(np.uint32).reshape(64, 8))
+        self.target = cp.asarray(np.frombuffer(target.to_bytes(32, 'little'), dtype='<u8'))
+
+    def scan(self, nonce_start: int, count: int) -> Optional[int]:
+        """掃描 [nonce_start, nonce_start + count)（mod 2^64），回傳區段內第一個合格的 nonce 或 None"""
+        if count <= 0:
+            return None  # 0 個 block 的 grid 是無效的 launch 設定
+        self.found.fill(NO_NONCE)
+        blocks = (count + self.threads - 1) // self.threads
+        self._scan_kernel(
+            (blocks,), (self.threads,),
+            (self.pow_state, self.heavy_state, self.header, self.matrix, self.target,
+             np.uint64(nonce_start), np.uint64(count), self.found)
+        )
+        offset = int(self.found.get()[0])
+        return None if offset == NO_NONCE else (nonce_start + offset) & NO_NONCE
+
+    def compute_batch(self, nonces) -> np.ndarray:
+        """一次算多個 nonce 的完整 PoW hash，回傳 (N, 32) uint8（與 kaspa_pow_v3.compute_pow_batch 同格式）"""
+        nonces_dev = cp.asarray(np.ascontiguousarray(nonces, dtype=np.uint64).ravel())
+        count = nonces_dev.size
+        out = cp.empty((count, 4), dtype=cp.uint64)
+        if count:
+            blocks = (count + self.threads - 1) // self.threads
+            self._batch_kernel(
+                (blocks,), (self.threads,),
+                (self.pow_state, self.heavy_state, self.header, self.matrix,
+                 nonces_dev, np.uint64(count), out)
+            )
+        # lane 是 little-endian，直接看成 bytes 就是 hash
+        return cp.asnumpy(out).view(np.uint8).reshape(count, 32)
@@ -18,9 +18,10 @@
 """
 
 import cython
-from libc.stdint cimport uint8_t, uint16_t, uint64_t
+from libc.stdint cimport uint8_t, int16_t, uint16_t, uint32_t, uint64_t
 from libc.string cimport memcpy, memset
 
+import hashlib
 import numpy as np
 cimport numpy as np
 from Crypto.Hash import cSHAKE256
@@ -139,7 +140,31 @@ def generate_matrix(bytes pre_pow_hash):
 # HeavyHash Core（優化版 - 接受預算矩陣）
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def heavy_hash_with_matrix(np.ndarray[np.uint16_t, ndim=2] matrix, bytes pow_hash):
+# 矩陣元素只有 4 bits，int16 × int16 → int32 的內積剛好是 pmaddwd 的形狀；
+# 寫成普通迴圈讓 GCC 自動向量化（-march=native 下是 AVX2/AVX-512 vpmaddwd）
+cdef extern from *:
+    """
+    #include <stdint.h>
+    static void heavyhash_matvec16(const int16_t* m, const uint8_t* hash, uint8_t* p) {
+        int16_t v[64];
+        int i, j;
+        for (i = 0; i < 32; i++) {
+            v[2 * i] = hash[i] >> 4;
+            v[2 * i + 1] = hash[i] & 0x0F;
+        }
+        for (i = 0; i < 64; i++) {
+            const int16_t* row = m + i * 64;
+            int32_t acc = 0;
+            for (j = 0; j < 64; j++)
+                acc += (int32_t)row[j] * (int32_t)v[j];
+            p[i] = (uint8_t)((acc >> 10) & 0x0F);
+        }
+    }
+    """
+    void heavyhash_matvec16(const int16_t* m, const uint8_t* hash, uint8_t* p) nogil
+
+
+def heavy_hash_with_matrix(np.ndarray[np.uint16_t, ndim=2, mode="c"] matrix, bytes pow_hash):
     """
     HeavyHash 核心計算（使用預算矩陣）
     
@@ -150,36 +175,24 @@ def heavy_hash_with_matrix(np.ndarray[np.uint16_t, ndim=2] matrix, bytes pow_has
     返回:
         bytes(32) - 最終 PoW hash
     """
-    cdef int i, j
-    cdef uint64_t s
-    cdef np.ndarray[np.uint8_t, ndim=1] header_arr
-    cdef np.ndarray[np.uint16_t, ndim=1] v
-    cdef np.ndarray[np.uint64_t, ndim=1] p
+    cdef int i
+    cdef const uint8_t* h = pow_hash
+    cdef uint8_t p[64]
+    cdef uint8_t digest[32]
     
-    # 展開成 64 個 4-bit 值
-    header_arr = np.frombuffer(pow_hash, dtype=np.uint8)
-    v = np.zeros(64, dtype=np.uint16)
+    if matrix.shape[0] != 64 or matrix.shape[1] != 64 or len(pow_hash) != 32:
+        raise ValueError("matrix must be 64x64 and pow_hash 32 bytes")
     
-    for i in range(32):
-        v[i * 2] = (header_arr[i] >> 4) & 0x0F      # 高 4 bits
-        v[i * 2 + 1] = header_arr[i] & 0x0F         # 低 4 bits
-    
-    # 矩陣乘法
-    p = np.zeros(64, dtype=np.uint64)
-    for i in range(64):
-        s = 0
-        for j in range(64):
-            s += <uint64_t>matrix[i, j] * <uint64_t>v[j]
-        p[i] = (s >> 10) & 0x0F
+    # 矩陣乘法（值都 < 16，uint16 直接當 int16 用）
+    heavyhash_matvec16(<const int16_t*>matrix.data, h, p)
     
     # XOR 回原 hash
-    cdef bytearray digest = bytearray(32)
     for i in range(32):
-        digest[i] = pow_hash[i] ^ (((<uint8_t>p[i * 2] & 0x0F) << 4) | (<uint8_t>p[i * 2 + 1] & 0x0F))
+        digest[i] = h[i] ^ <uint8_t>((p[i * 2] << 4) | p[i * 2 + 1])
     
     # 最終 cSHAKE256
-    h = cSHAKE256.new(data=bytes(digest), custom=b"HeavyHash")
-    return h.read(32)
+    h2 = cSHAKE256.new(data=digest[:32], custom=b"HeavyHash")
+    return h2.read(32)
 
 
 def compute_pow(bytes pre_pow_hash, uint64_t timestamp, uint64_t nonce, 
@@ -219,3 +232,79 @@ def check_pow(bytes pow_hash, uint64_t target):
     cdef uint64_t hash_val = int.from_bytes(pow_hash[:8], 'little')
     # 簡化比較（只比前 8 bytes 通常夠了）
     return hash_val < target
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# Pre-PoW Hash（header 序列化）
+# ═══════════════════════════════════════════════════════════════════════════════
+
+cdef inline Py_ssize_t put_hash(uint8_t* buf, Py_ssize_t off, bytes h) except -1:
+    if len(h) != 32:
+        raise ValueError("hash must be 32 bytes")
+    memcpy(buf + off, <const char*>h, 32)
+    return off + 32
+
+
+_BLOCK_HASHER = hashlib.blake2b(digest_size=32, key=b"BlockHash")   # key block 只壓縮一次，每次 copy()
+
+def pre_pow_hash(int version, list parents, bytes hash_merkle_root, bytes accepted_id_merkle_root,
+                 bytes utxo_commitment, uint32_t bits, uint64_t daa_score, uint64_t blue_score,
+                 bytes blue_work, bytes pruning_point):
+    """
+    計算 pre-PoW hash（keyed blake2b，timestamp、nonce 填 0，與 rusty-kaspa 一致）
+    
+    參數（全部是已解碼的 bytes，不是 hex）:
+        parents: 每一層一個 bytes，該層所有 parent hash 接在一起（32 * n bytes）
+        blue_work: 去掉前導零的 big-endian bytes
+    
+    返回:
+        bytes(32)
+    """
+    cdef Py_ssize_t size = 2 + 8 + 3 * 32 + 8 + 4 + 8 + 8 + 8 + 8 + len(blue_work) + 32
+    cdef Py_ssize_t off, n
+    cdef uint64_t u64
+    cdef uint16_t u16 = <uint16_t>version
+    cdef bytes level
+    
+    for level in parents:
+        if len(level) % 32:
+            raise ValueError("parent level must be a multiple of 32 bytes")
+        size += 8 + len(level)
+    
+    # 整個 header 寫進一塊 buffer（x86 是 little-endian，整數直接 memcpy）
+    data = bytearray(size)
+    cdef uint8_t* buf = <uint8_t*>(<char*>data)
+    
+    memcpy(buf, &u16, 2)
+    u64 = len(parents)
+    memcpy(buf + 2, &u64, 8)
+    off = 10
+    for level in parents:
+        n = len(level)
+        u64 = n // 32
+        memcpy(buf + off, &u64, 8)
+        memcpy(buf + off + 8, <const char*>level, n)
+        off += 8 + n
+    
+    off = put_hash(buf, off, hash_merkle_root)
+    off = put_hash(buf, off, accepted_id_merkle_root)
+    off = put_hash(buf, off, utxo_commitment)
+    
+    u64 = 0                               # timestamp = 0
+    memcpy(buf + off, &u64, 8)
+    memcpy(buf + off + 8, &bits, 4)
+    memcpy(buf + off + 12, &u64, 8)       # nonce = 0
+    memcpy(buf + off + 20, &daa_score, 8)
+    memcpy(buf + off + 28, &blue_score, 8)
+    off += 36
+    
+    n = len(blue_work)
+    u64 = n
+    memcpy(buf + off, &u64, 8)
+    if n:
+        memcpy(buf + off + 8, <const char*>blue_work, n)
+    off = put_hash(buf, off + 8 + n, pruning_point)
+    
+    hasher = _BLOCK_HASHER.copy()
+    hasher.update(data)
+    return hasher.digest()
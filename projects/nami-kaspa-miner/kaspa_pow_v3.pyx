@@ -14,11 +14,13 @@
   - nogil 釋放 GIL（多線程更有效）
   - 純 C 陣列取代 NumPy（減少開銷）
   - 內層迴圈完全在 C 層執行
+  - scan()：整個 nonce 迴圈（Keccak + 矩陣乘法 + target 比較）都在 C 層
+  - scan() 每次 4 個 nonce 一起算，Keccak-f 用 4 路交錯的向量版（AVX2 一條指令 4 路）
 
 ═══════════════════════════════════════════════════════════════════════════════
 """
 
-from libc.stdint cimport uint8_t, uint16_t, uint32_t, uint64_t
+from libc.stdint cimport uint8_t, int16_t, int32_t, uint16_t, uint32_t, uint64_t
 from libc.string cimport memcpy, memset
 from libc.stdlib cimport malloc, free
 
@@ -47,6 +49,233 @@ cdef inline uint64_t xoshiro_next(uint64_t* s) noexcept nogil:
     
     return result
 
+# ═══════════════════════════════════════════════════════════════════════════════
+# Keccak-f[1600] / cSHAKE256 (nogil)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+cdef uint64_t KECCAK_RC[24]
+KECCAK_RC[:] = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808a,
+    0x8000000080008000, 0x000000000000808b, 0x0000000080000001,
+    0x8000000080008081, 0x8000000000008009, 0x000000000000008a,
+    0x0000000000000088, 0x0000000080008009, 0x000000008000000a,
+    0x000000008000808b, 0x800000000000008b, 0x8000000000008089,
+    0x8000000000008003, 0x8000000000008002, 0x8000000000000080,
+    0x000000000000800a, 0x800000008000000a, 0x8000000080008081,
+    0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+
+cdef int KECCAK_ROTC[24]
+KECCAK_ROTC[:] = [1, 3, 6, 10, 15, 21, 28, 36, 45, 55, 2, 14,
+                  27, 41, 56, 8, 25, 43, 62, 18, 39, 61, 20, 44]
+
+cdef int KECCAK_PILN[24]
+KECCAK_PILN[:] = [10, 7, 11, 17, 18, 3, 5, 16, 8, 21, 24, 4,
+                  15, 23, 19, 13, 12, 2, 20, 14, 22, 9, 6, 1]
+
+cdef void keccak_f1600(uint64_t* st) noexcept nogil:
+    """Keccak-f[1600] 24 rounds"""
+    cdef uint64_t bc[5]
+    cdef uint64_t t
+    cdef int r, i, j
+    
+    for r in range(24):
+        # Theta
+        for i in range(5):
+            bc[i] = st[i] ^ st[i + 5] ^ st[i + 10] ^ st[i + 15] ^ st[i + 20]
+        for i in range(5):
+            t = bc[(i + 4) % 5] ^ rotl(bc[(i + 1) % 5], 1)
+            for j in range(0, 25, 5):
+                st[j + i] ^= t
+        # Rho + Pi
+        t = st[1]
+        for i in range(24):
+            j = KECCAK_PILN[i]
+            bc[0] = st[j]
+            st[j] = rotl(t, KECCAK_ROTC[i])
+            t = bc[0]
+        # Chi
+        for j in range(0, 25, 5):
+            for i in range(5):
+                bc[i] = st[j + i]
+            for i in range(5):
+                st[j + i] ^= (~bc[(i + 1) % 5]) & bc[(i + 2) % 5]
+        # Iota
+        st[0] ^= KECCAK_RC[r]
+
+
+DEF LANES = 4   # scan_core 每次並行的 nonce 數（交錯 state 的路數）
+
+# 4 路交錯的 Keccak-f[1600]（GCC/Clang vector extension）
+cdef extern from *:
+    """
+    #include <stdint.h>
+
+    typedef uint64_t kv4 __attribute__((vector_size(32)));
+    typedef uint64_t kv4u __attribute__((vector_size(32), aligned(8)));  /* 不要求 32-byte 對齊 */
+
+    static const uint64_t keccak_x4_rc[24] = {
+        0x0000000000000001ULL, 0x0000000000008082ULL, 0x800000000000808aULL,
+        0x8000000080008000ULL, 0x000000000000808bULL, 0x0000000080000001ULL,
+        0x8000000080008081ULL, 0x8000000000008009ULL, 0x000000000000008aULL,
+        0x0000000000000088ULL, 0x0000000080008009ULL, 0x000000008000000aULL,
+        0x000000008000808bULL, 0x800000000000008bULL, 0x8000000000008089ULL,
+        0x8000000000008003ULL, 0x8000000000008002ULL, 0x8000000000000080ULL,
+        0x000000000000800aULL, 0x800000008000000aULL, 0x8000000080008081ULL,
+        0x8000000000008080ULL, 0x0000000080000001ULL, 0x8000000080008008ULL
+    };
+
+    #define KV4_ROTL(x, k) (((x) << (k)) | ((x) >> (64 - (k))))
+
+    /* 4 個獨立 Keccak-f[1600] state 交錯排列：st[lane * 4 + k] 是第 k 個 state 的 lane。
+       25 個 lane 全部放在向量暫存器裡展開一輪（AVX2 一條指令 4 路，SSE2 拆成 2x2 路）。 */
+    static void keccak_f1600_x4(uint64_t* st) {
+        kv4u* s = (kv4u*)st;
+        kv4 A00 = s[0], A01 = s[1], A02 = s[2], A03 = s[3], A04 = s[4],
+            A05 = s[5], A06 = s[6], A07 = s[7], A08 = s[8], A09 = s[9],
+            A10 = s[10], A11 = s[11], A12 = s[12], A13 = s[13], A14 = s[14],
+            A15 = s[15], A16 = s[16], A17 = s[17], A18 = s[18], A19 = s[19],
+            A20 = s[20], A21 = s[21], A22 = s[22], A23 = s[23], A24 = s[24];
+        kv4 C0, C1, C2, C3, C4, D0, D1, D2, D3, D4;
+        kv4 B00, B01, B02, B03, B04, B05, B06, B07, B08, B09, B10, B11, B12, B13, B14, B15, B16, B17, B18, B19, B20, B21, B22, B23, B24;
+        int r;
+        for (r = 0; r < 24; r++) {
+            /* Theta */
+            C0 = A00 ^ A05 ^ A10 ^ A15 ^ A20;
+            C1 = A01 ^ A06 ^ A11 ^ A16 ^ A21;
+            C2 = A02 ^ A07 ^ A12 ^ A17 ^ A22;
+            C3 = A03 ^ A08 ^ A13 ^ A18 ^ A23;
+            C4 = A04 ^ A09 ^ A14 ^ A19 ^ A24;
+            D0 = C4 ^ KV4_ROTL(C1, 1);
+            D1 = C0 ^ KV4_ROTL(C2, 1);
+            D2 = C1 ^ KV4_ROTL(C3, 1);
+            D3 = C2 ^ KV4_ROTL(C4, 1);
+            D4 = C3 ^ KV4_ROTL(C0, 1);
+            /* Rho + Pi */
+            B00 = A00 ^ D0;
+            B10 = KV4_ROTL(A01 ^ D1, 1);
+            B20 = KV4_ROTL(A02 ^ D2, 62);
+            B05 = KV4_ROTL(A03 ^ D3, 28);
+            B15 = KV4_ROTL(A04 ^ D4, 27);
+            B16 = KV4_ROTL(A05 ^ D0, 36);
+            B01 = KV4_ROTL(A06 ^ D1, 44);
+            B11 = KV4_ROTL(A07 ^ D2, 6);
+            B21 = KV4_ROTL(A08 ^ D3, 55);
+            B06 = KV4_ROTL(A09 ^ D4, 20);
+            B07 = KV4_ROTL(A10 ^ D0, 3);
+            B17 = KV4_ROTL(A11 ^ D1, 10);
+            B02 = KV4_ROTL(A12 ^ D2, 43);
+            B12 = KV4_ROTL(A13 ^ D3, 25);
+            B22 = KV4_ROTL(A14 ^ D4, 39);
+            B23 = KV4_ROTL(A15 ^ D0, 41);
+            B08 = KV4_ROTL(A16 ^ D1, 45);
+            B18 = KV4_ROTL(A17 ^ D2, 15);
+            B03 = KV4_ROTL(A18 ^ D3, 21);
+            B13 = KV4_ROTL(A19 ^ D4, 8);
+            B14 = KV4_ROTL(A20 ^ D0, 18);
+            B24 = KV4_ROTL(A21 ^ D1, 2);
+            B09 = KV4_ROTL(A22 ^ D2, 61);
+            B19 = KV4_ROTL(A23 ^ D3, 56);
+            B04 = KV4_ROTL(A24 ^ D4, 14);
+            /* Chi */
+            A00 = B00 ^ (~B01 & B02);
+            A01 = B01 ^ (~B02 & B03);
+            A02 = B02 ^ (~B03 & B04);
+            A03 = B03 ^ (~B04 & B00);
+            A04 = B04 ^ (~B00 & B01);
+            A05 = B05 ^ (~B06 & B07);
+            A06 = B06 ^ (~B07 & B08);
+            A07 = B07 ^ (~B08 & B09);
+            A08 = B08 ^ (~B09 & B05);
+            A09 = B09 ^ (~B05 & B06);
+            A10 = B10 ^ (~B11 & B12);
+            A11 = B11 ^ (~B12 & B13);
+            A12 = B12 ^ (~B13 & B14);
+            A13 = B13 ^ (~B14 & B10);
+            A14 = B14 ^ (~B10 & B11);
+            A15 = B15 ^ (~B16 & B17);
+            A16 = B16 ^ (~B17 & B18);
+            A17 = B17 ^ (~B18 & B19);
+            A18 = B18 ^ (~B19 & B15);
+            A19 = B19 ^ (~B15 & B16);
+            A20 = B20 ^ (~B21 & B22);
+            A21 = B21 ^ (~B22 & B23);
+            A22 = B22 ^ (~B23 & B24);
+            A23 = B23 ^ (~B24 & B20);
+            A24 = B24 ^ (~B20 & B21);
+            /* Iota */
+            A00 ^= (kv4){keccak_x4_rc[r], keccak_x4_rc[r], keccak_x4_rc[r], keccak_x4_rc[r]};
+        }
+        s[0] = A00; s[1] = A01; s[2] = A02; s[3] = A03; s[4] = A04;
+        s[5] = A05; s[6] = A06; s[7] = A07; s[8] = A08; s[9] = A09;
+        s[10] = A10; s[11] = A11; s[12] = A12; s[13] = A13; s[14] = A14;
+        s[15] = A15; s[16] = A16; s[17] = A17; s[18] = A18; s[19] = A19;
+        s[20] = A20; s[21] = A21; s[22] = A22; s[23] = A23; s[24] = A24;
+    }
+
+    /* 64x64 矩陣 × 64 個 nibble（高位先）→ p[i] = (row_i · v >> 10) & 0x0F，每列最大 14400。
+       有 VNNI（-march=native 定義 __AVX512VNNI__ / __AVXVNNI__）：uint8 矩陣 × int8 向量、int32 累加，
+       GCC 會向量化成 vpdpbusd。沒有 VNNI 時 uint8 版反而慢約 4 倍，改用 int16 內積（pmaddwd）。 */
+    #if defined(__AVX512VNNI__) || defined(__AVXVNNI__)
+    #define HEAVYHASH_MATVEC_VNNI 1
+    typedef int8_t matvec_vec_t;
+    #else
+    #define HEAVYHASH_MATVEC_VNNI 0
+    typedef int16_t matvec_vec_t;
+    #endif
+
+    static void heavyhash_matvec(const int16_t* m16, const uint8_t* m8, const uint8_t* hash, uint8_t* p) {
+        matvec_vec_t v[64];
+        int i, j;
+        for (i = 0; i < 32; i++) {
+            v[2 * i] = hash[i] >> 4;
+            v[2 * i + 1] = hash[i] & 0x0F;
+        }
+        for (i = 0; i < 64; i++) {
+    #if HEAVYHASH_MATVEC_VNNI
+            const uint8_t* row = m8 + i * 64;
+    #else
+            const int16_t* row = m16 + i * 64;
+    #endif
+            int32_t acc = 0;
+            for (j = 0; j < 64; j++)
+                acc += (int32_t)row[j] * (int32_t)v[j];
+            p[i] = (uint8_t)((acc >> 10) & 0x0F);
+        }
+    }
+    """
+    void keccak_f1600_x4(uint64_t* st) nogil
+    void heavyhash_matvec(const int16_t* m16, const uint8_t* m8, const uint8_t* hash, uint8_t* p) nogil
+    int HEAVYHASH_MATVEC_VNNI
+
+MATVEC_VNNI = bool(HEAVYHASH_MATVEC_VNNI)   # scan() 的矩陣乘法是否編成 VNNI 版
+
+
+def _left_encode(x):
+    n = max(1, (x.bit_length() + 7) // 8)
+    return bytes([n]) + x.to_bytes(n, 'big')
+
+def _cshake256_prefix(custom):
+    """bytepad(encode_string(N) || encode_string(S), 136)，N 為空"""
+    body = _left_encode(136) + _left_encode(0) + _left_encode(len(custom) * 8) + custom
+    return body + b'\x00' * ((136 - len(body) % 136) % 136)   # cdivision: 不能用負數取餘
+
+cdef uint64_t PAD_LAST = (<uint64_t>1) << 63   # rate 最後一個 byte 的 0x80
+
+# 吸收 cSHAKE 固定前綴 block 之後的 state（模組載入時算一次）
+cdef uint64_t POW_INIT[25]
+cdef uint64_t HEAVY_INIT[25]
+
+cdef void _absorb_prefix(bytes prefix, uint64_t* st):
+    cdef const uint8_t* p = prefix
+    memset(st, 0, 25 * sizeof(uint64_t))
+    for i in range(17):
+        st[i] ^= (<const uint64_t*>p)[i]   # little-endian host（x86/ARM）
+    keccak_f1600(st)
+
+_absorb_prefix(_cshake256_prefix(b"ProofOfWorkHash"), POW_INIT)
+_absorb_prefix(_cshake256_prefix(b"HeavyHash"), HEAVY_INIT)
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # Matrix Operations (nogil)
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -142,10 +371,166 @@ cdef void heavy_hash_core(uint16_t* matrix, uint8_t* pow_hash, uint8_t* digest)
         digest[i] = pow_hash[i] ^ (((<uint8_t>p[i * 2] & 0x0F) << 4) | (<uint8_t>p[i * 2 + 1] & 0x0F))
 
 
+cdef inline void pow_x4(const int16_t* matrix, const uint8_t* matrix8, const uint64_t* header,
+                        const uint64_t* nonces, uint64_t* st) noexcept nogil:
+    """LANES 個 nonce 的完整 PoW（純 C，nogil）
+    
+    80 bytes PoW 輸入 < rate 136，一個 block 一次 permutation；
+    HeavyHash 的 32 bytes 也是一次 permutation。
+    結果留在 st（交錯 state）：第 k 個 nonce 的 hash 是 st[i * LANES + k]，i = 0..3（little-endian lanes）
+    """
+    cdef uint64_t hashes[4 * LANES]
+    cdef uint8_t p[64]
+    cdef uint8_t* h
+    cdef uint64_t digest[4 * LANES]
+    cdef uint8_t* d
+    cdef int i, k
+    
+    # cSHAKE256("ProofOfWorkHash")，4 路
+    for i in range(25):
+        for k in range(LANES):
+            st[i * LANES + k] = POW_INIT[i]
+    for i in range(9):
+        for k in range(LANES):
+            st[i * LANES + k] ^= header[i]
+    for k in range(LANES):
+        st[9 * LANES + k] ^= nonces[k]
+        st[10 * LANES + k] ^= 0x04           # cSHAKE padding @ byte 80
+        st[16 * LANES + k] ^= PAD_LAST       # 0x80 @ byte 135
+    keccak_f1600_x4(st)
+    for k in range(LANES):
+        for i in range(4):
+            hashes[k * 4 + i] = st[i * LANES + k]
+    
+    for k in range(LANES):
+        h = <uint8_t*>&hashes[k * 4]
+        d = <uint8_t*>&digest[k * 4]
+        
+        # 展開 nibble + 矩陣乘法（VNNI / int16 兩種版本見 heavyhash_matvec）
+        heavyhash_matvec(matrix, matrix8, h, p)
+        for i in range(32):
+            d[i] = h[i] ^ <uint8_t>((p[2 * i] << 4) | p[2 * i + 1])
+    
+    # cSHAKE256("HeavyHash")，4 路
+    for i in range(25):
+        for k in range(LANES):
+            st[i * LANES + k] = HEAVY_INIT[i]
+    for i in range(4):
+        for k in range(LANES):
+            st[i * LANES + k] ^= digest[k * 4 + i]
+    for k in range(LANES):
+        st[4 * LANES + k] ^= 0x04
+        st[16 * LANES + k] ^= PAD_LAST
+    keccak_f1600_x4(st)
+
+
+cdef bint scan_core(const int16_t* matrix, const uint8_t* matrix8, const uint64_t* header,
+                    const uint64_t* target, uint64_t nonce_start, uint64_t count,
+                    uint64_t* found) noexcept nogil:
+    """整個 nonce 迴圈（純 C，nogil）
+    
+    每次 4 個 nonce 一起走 pow_x4；count 不是 4 的倍數時，多出來的 lane 照算但不比較。
+    """
+    cdef uint64_t st[25 * LANES]
+    cdef uint64_t nonces[LANES]
+    cdef uint64_t n
+    cdef int i, k
+    
+    n = 0
+    while n < count:
+        for k in range(LANES):
+            nonces[k] = nonce_start + n + k
+        pow_x4(matrix, matrix8, header, nonces, st)
+        
+        # 256-bit little-endian 比較：hash < target（依 nonce 順序，回傳第一個）
+        for k in range(LANES):
+            if n + k >= count:
+                break
+            for i in range(3, -1, -1):
+                if st[i * LANES + k] != target[i]:
+                    break
+            if st[i * LANES + k] < target[i]:
+                found[0] = nonce_start + n + k
+                return True
+        n += LANES
+    
+    return False
+
+
+cdef void pow_batch_core(const int16_t* matrix, const uint8_t* matrix8, const uint64_t* header,
+                         const uint64_t* nonces, Py_ssize_t count, uint64_t* out) noexcept nogil:
+    """任意 nonce 列表的 PoW：nonces[j] 的 hash 寫進 out[4 j .. 4 j + 3]（純 C，nogil）"""
+    cdef uint64_t st[25 * LANES]
+    cdef uint64_t group[LANES]
+    cdef Py_ssize_t n = 0
+    cdef int i, k
+    
+    while n < count:
+        for k in range(LANES):
+            group[k] = nonces[n + k] if n + k < count else 0
+        pow_x4(matrix, matrix8, header, group, st)
+        for k in range(LANES):
+            if n + k >= count:
+                break
+            for i in range(4):
+                out[(n + k) * 4 + i] = st[i * LANES + k]
+        n += LANES
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # Python 接口
 # ═══════════════════════════════════════════════════════════════════════════════
 
+cdef class ScanMatrix:
+    """scan() / compute_pow_batch() 用的矩陣：C-contiguous int16 與 uint8 兩份，每個 template 準備一次"""
+    cdef const int16_t[:, ::1] m16
+    cdef const uint8_t[:, ::1] m8
+    
+    def __init__(self, matrix):
+        if np.shape(matrix) != (64, 64):
+            raise ValueError("matrix must be 64x64")
+        self.m16 = np.ascontiguousarray(matrix, dtype=np.int16)
+        self.m8 = np.ascontiguousarray(matrix, dtype=np.uint8)
+
+
+cdef inline ScanMatrix _scan_matrix(matrix):
+    """已經準備好的直接用；傳 ndarray 的舊呼叫方式每次轉一次"""
+    if isinstance(matrix, ScanMatrix):
+        return <ScanMatrix>matrix
+    return ScanMatrix(matrix)
+
+
+def scan(matrix, bytes prefix, uint64_t nonce_start, uint64_t count, bytes target):
+    """
+    掃描 [nonce_start, nonce_start + count)，整個迴圈在 C 層（nogil）
+    
+    參數:
+        matrix: ScanMatrix（每個 template 建一次），或 64x64 整數矩陣（每次呼叫都要轉型複製）
+        prefix: 72 bytes = pre_pow_hash (32) || timestamp LE (8) || zeros (32)
+        nonce_start, count: 掃描範圍（uint64 wrap）
+        target: 32 bytes little-endian
+    
+    返回:
+        第一個 hash < target 的 nonce，沒有則 None
+    """
+    if len(prefix) != 72 or len(target) != 32:
+        raise ValueError("prefix must be 72 bytes and target 32 bytes")
+    
+    cdef ScanMatrix sm = _scan_matrix(matrix)
+    cdef uint64_t header[9]
+    cdef uint64_t target_c[4]
+    cdef uint64_t found = 0
+    cdef bint ok
+    
+    memcpy(header, <const uint8_t*>prefix, 72)
+    memcpy(target_c, <const uint8_t*>target, 32)
+    
+    with nogil:
+        ok = scan_core(&sm.m16[0, 0], &sm.m8[0, 0], header, target_c, nonce_start, count, &found)
+    
+    return found if ok else None
+
+
 def generate_matrix(bytes pre_pow_hash):
     """
     生成 64x64 滿秩矩陣（Python 接口）
@@ -246,60 +631,38 @@ def compute_pow(bytes pre_pow_hash, uint64_t timestamp, uint64_t nonce,
         free(matrix_c)
 
 
-def compute_pow_batch(bytes pre_pow_hash, uint64_t timestamp, 
-                      list nonces, np.ndarray[np.uint16_t, ndim=2] matrix):
+def compute_pow_batch(bytes pre_pow_hash, uint64_t timestamp, nonces, matrix):
     """
-    批次計算多個 nonce 的 PoW（減少 function call 開銷）
+    批次計算多個 nonce 的 PoW（整個迴圈在 C 層，nogil；矩陣與 header 只準備一次）
+    
+    參數:
+        pre_pow_hash: 32 bytes
+        timestamp: 時間戳
+        nonces: uint64 序列（內部轉成 C-contiguous uint64 陣列）
+        matrix: ScanMatrix 或 64x64 矩陣（任何整數 dtype）
     
     返回:
-        list of (nonce, pow_hash) tuples
+        (N, 32) uint8 陣列，第 j 列是 nonces[j] 的 PoW hash
     """
-    import struct
+    if len(pre_pow_hash) != 32:
+        raise ValueError("pre_pow_hash must be 32 bytes")
     
-    cdef uint16_t* matrix_c
-    cdef uint8_t pow_hash_c[32]
-    cdef uint8_t digest_c[32]
-    cdef int i, j, n
-    cdef uint64_t nonce
+    cdef ScanMatrix sm = _scan_matrix(matrix)
+    cdef const uint64_t[::1] n = np.ascontiguousarray(nonces, dtype=np.uint64)
+    cdef Py_ssize_t count = n.shape[0]
+    cdef uint64_t header[9]
     
-    results = []
+    # pre_pow_hash || timestamp || zeros(32)
+    memset(header, 0, sizeof(header))
+    memcpy(header, <const uint8_t*>pre_pow_hash, 32)
+    header[4] = timestamp
     
-    # 複製矩陣到 C
-    matrix_c = <uint16_t*>malloc(64 * 64 * sizeof(uint16_t))
-    if matrix_c == NULL:
-        raise MemoryError("Failed to allocate matrix")
+    out = np.empty((count, 32), dtype=np.uint8)
+    if count == 0:
+        return out
+    cdef uint8_t[:, ::1] o = out
     
-    try:
-        for i in range(64):
-            for j in range(64):
-                matrix_c[i * 64 + j] = matrix[i, j]
-        
-        for nonce in nonces:
-            # 構建 header
-            data = (
-                pre_pow_hash + 
-                struct.pack('<Q', timestamp) + 
-                (b'\x00' * 32) + 
-                struct.pack('<Q', nonce)
-            )
-            
-            # 第一次 hash
-            h = cSHAKE256.new(data=data, custom=b"ProofOfWorkHash")
-            pow_hash = h.read(32)
-            
-            for i in range(32):
-                pow_hash_c[i] = pow_hash[i]
-            
-            # 核心計算（nogil）
-            with nogil:
-                heavy_hash_core(matrix_c, pow_hash_c, digest_c)
-            
-            # 最終 hash
-            digest = bytes(digest_c[i] for i in range(32))
-            h2 = cSHAKE256.new(data=digest, custom=b"HeavyHash")
-            results.append((nonce, h2.read(32)))
-        
-        return results
+    with nogil:
+        pow_batch_core(&sm.m16[0, 0], &sm.m8[0, 0], header, &n[0], count, <uint64_t*>&o[0, 0])
     
-    finally:
-        free(matrix_c)
+    return out
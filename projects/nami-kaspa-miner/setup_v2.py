@@ -3,16 +3,19 @@
 
 用法:
     python setup_v2.py build_ext --inplace
+
+-O3 -march=native 讓 heavy_hash 的矩陣乘法向量化成 vpmaddwd（只在本機跑，不分發）
 """
 
-from setuptools import setup
+from setuptools import setup, Extension
 from Cython.Build import cythonize
 import numpy as np
 
 setup(
     name="kaspa_pow_v2",
     ext_modules=cythonize(
-        "kaspa_pow_v2.pyx",
+        Extension("kaspa_pow_v2", ["kaspa_pow_v2.pyx"],
+                  extra_compile_args=['-O3', '-march=native']),
         compiler_directives={
             'language_level': 3,
             'boundscheck': False,
@@ -18,6 +18,7 @@
 
 【用法】
   python3 shiokaze_v4.py --testnet --wallet kaspatest:qq... --workers 4
+  python3 shiokaze_v4.py --testnet --wallet kaspatest:qq... --gpu   # CUDA（需要 cupy）
 
 ═══════════════════════════════════════════════════════════════════════════════
   📍 執行流程 (Execution Flow)
@@ -63,16 +64,46 @@ import struct
 import argparse
 import signal
 import random
+import ctypes
+import functools
+import threading
 import multiprocessing as mp
-from multiprocessing import Process, Value, Array, Manager
-from typing import Optional, Tuple
-from datetime import datetime
+from multiprocessing import Process, Value, RawValue, RawArray, Event
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Tuple
 from collections import deque
 
+# BLAS 單線程：每個 worker 本身就佔一個核心，BLAS 再開線程只會互搶（必須在 import numpy 之前）
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
+
 import numpy as np
 from Crypto.Hash import cSHAKE256
 import grpc
 
+# PyCryptodome 的 C Keccak sponge（直接呼叫，跳過 cSHAKE256.new 的 Python 包裝）
+try:
+    from Crypto.Hash.keccak import _raw_keccak_lib
+    from Crypto.Util._raw_api import (VoidPointer, SmartPointer, create_string_buffer,
+                                      get_raw_buffer, c_size_t, c_ubyte, c_uint8_ptr)
+    RAW_KECCAK = True
+except ImportError:
+    RAW_KECCAK = False
+
+# 可選：Numba JIT（矩陣生成、單次 HeavyHash fold）
+try:
+    from numba import njit, types as nb_types
+    USE_NUMBA = True
+except ImportError:
+    USE_NUMBA = False
+
+# 可選：Cython v3 的 C 層整段 nonce 掃描（python setup_v3.py build_ext --inplace）
+try:
+    import kaspa_pow_v3
+    USE_CYTHON = hasattr(kaspa_pow_v3, 'scan')
+except ImportError:
+    USE_CYTHON = False
+
 sys.path.insert(0, os.path.expanduser("~/kaspa-pminer"))
 import kaspa_pb2
 import kaspa_pb2_grpc
@@ -90,74 +121,286 @@ BANNER = """
 ╚═══════════════════════════════════════════════════════════════════════════════╝
 """
 
+GPU_BATCH = 1 << 20      # --gpu：每次 kernel launch 掃描的 nonce 數
+SCAN_BATCH = 80000       # Cython scan：每批 nonce 數（4 路 Keccak 約 40ms，之後檢查 template）
+PY_BATCH = 1000          # Python 後端：每批 nonce 數
+NONCE_LANE_BITS = 48     # 區段模式：worker_id 佔 nonce 最高 16 bits，低 48 bits 是該 worker 的區段
+SUBMIT_RETRIES = 5       # 提交沒送到節點（斷線 / 重連中）時的重送次數，每次間隔 1 秒
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# cSHAKE256（Keccak sponge）
+# ═══════════════════════════════════════════════════════════════════════════════
+
+KECCAK_RATE = 136        # cSHAKE256 rate (bytes)
+CSHAKE_PADDING = 0x04    # cSHAKE domain separation (SHAKE 是 0x1F)
+
+# 為什麼不用 hashlib.shake_256().copy()：前綴雖然可以手動 bytepad，
+# 但 hashlib 的 padding 固定是 SHAKE 的 0x1F，cSHAKE 需要 0x04，結果會不同。
+# 所以 sponge state 的複製改走 PyCryptodome 底層的 keccak C 函式。
+
+def _left_encode(x: int) -> bytes:
+    """NIST SP 800-185 left_encode"""
+    n = max(1, (x.bit_length() + 7) // 8)
+    return bytes([n]) + x.to_bytes(n, 'big')
+
+def cshake256_prefix(custom: bytes) -> bytes:
+    """cSHAKE256 的固定前綴 bytepad(encode_string(N) || encode_string(S), 136)，N 為空"""
+    body = _left_encode(KECCAK_RATE) + _left_encode(0) + _left_encode(len(custom) * 8) + custom
+    return body + b'\x00' * (-len(body) % KECCAK_RATE)
+
+# 每個 custom string 的前綴只算一次（原本每次 cSHAKE256.new 都在 Python 層重算）
+POW_PREFIX = cshake256_prefix(b"ProofOfWorkHash")
+HEAVY_PREFIX = cshake256_prefix(b"HeavyHash")
+
+if RAW_KECCAK:
+    def _new_keccak_state():
+        state = VoidPointer()
+        _raw_keccak_lib.keccak_init(state.address_of(), c_size_t(64), c_ubyte(24))
+        return SmartPointer(state.get(), _raw_keccak_lib.keccak_destroy)
+
+    def cshake256_absorbed(prefix: bytes, data: bytes = b''):
+        """回傳已吸收 prefix (+ 固定 data) 的 sponge state，交給 cshake256_resume 複製續算"""
+        state = _new_keccak_state()
+        _raw_keccak_lib.keccak_absorb(state.get(), prefix, c_size_t(len(prefix)))
+        if data:
+            _raw_keccak_lib.keccak_absorb(state.get(), data, c_size_t(len(data)))
+        return state
+
+    # 熱路徑的 C 函式綁成 module 名稱，每次呼叫省掉 _raw_keccak_lib 的屬性查找
+    _keccak_copy = _raw_keccak_lib.keccak_copy
+    _keccak_absorb = _raw_keccak_lib.keccak_absorb
+    _keccak_squeeze = _raw_keccak_lib.keccak_squeeze
+
+    # scratch state / 輸出 buffer / 固定參數每個進程只建一次，resume 裡不再配置任何東西
+    _SCRATCH_STATE = _new_keccak_state()
+    _SCRATCH_PTR = _SCRATCH_STATE.get()
+    _SCRATCH_OUT = create_string_buffer(32)
+    _OUT_LEN = c_size_t(32)
+    _PADDING = c_ubyte(CSHAKE_PADDING)
+
+    def cshake256_resume(state, data: bytes) -> bytes:
+        """複製 state 到 scratch（200 bytes memcpy），吸收剩下的 data 後 squeeze 32 bytes"""
+        _keccak_copy(state.get(), _SCRATCH_PTR)
+        _keccak_absorb(_SCRATCH_PTR, data, c_size_t(len(data)))
+        _keccak_squeeze(_SCRATCH_PTR, _SCRATCH_OUT, _OUT_LEN, _PADDING)
+        return get_raw_buffer(_SCRATCH_OUT)
+
+    # 兩個 custom string 的前綴 block 每個進程只吸收（permute）一次
+    _INIT_STATES = {prefix: cshake256_absorbed(prefix) for prefix in (POW_PREFIX, HEAVY_PREFIX)}
+
+    def cshake256(data: bytes, prefix: bytes) -> bytes:
+        """cSHAKE256 → 32 bytes：從已吸收前綴的初始 state 複製續算"""
+        return cshake256_resume(_INIT_STATES[prefix], data)
+
+    # nonce 的 8-byte buffer：pack_into 寫 bytearray，C sponge 讀它的指標 view（同一塊記憶體）
+    # PyCryptodome 裝了 cffi 就改用 cffi backend：create_string_buffer 不能 pack_into、
+    # bytearray 也不能直接當指標；c_uint8_ptr 在兩種 backend 下都是 live view（但沒有 len）
+    _NONCE_BUF = bytearray(8)
+    _NONCE_PTR = c_uint8_ptr(_NONCE_BUF)
+    _NONCE_LEN = c_size_t(8)
+
+    def cshake256_resume_nonce(state) -> bytes:
+        """cshake256_resume(state, _NONCE_BUF)：nonce 已用 pack_into 寫進 _NONCE_BUF"""
+        _keccak_copy(state.get(), _SCRATCH_PTR)
+        _keccak_absorb(_SCRATCH_PTR, _NONCE_PTR, _NONCE_LEN)
+        _keccak_squeeze(_SCRATCH_PTR, _SCRATCH_OUT, _OUT_LEN, _PADDING)
+        return get_raw_buffer(_SCRATCH_OUT)
+
+    def _raw_keccak_ok() -> bool:
+        """啟動自檢：手動 bytepad + 複製 state 的結果要和 cSHAKE256.new 一致（80 + 32 bytes 測試向量）"""
+        vector = bytes(range(80))
+        try:
+            for custom, prefix in ((b"ProofOfWorkHash", POW_PREFIX), (b"HeavyHash", HEAVY_PREFIX)):
+                expected = cSHAKE256.new(data=vector, custom=custom).read(32)
+                if cshake256(vector, prefix) != expected:
+                    return False
+                if cshake256_resume(cshake256_absorbed(prefix, vector[:72]), vector[72:]) != expected:
+                    return False
+            _NONCE_BUF[:] = vector[72:]
+            return cshake256_resume_nonce(cshake256_absorbed(POW_PREFIX, vector[:72])) == \
+                cSHAKE256.new(data=vector, custom=b"ProofOfWorkHash").read(32)
+        except Exception:
+            return False
+
+    if not _raw_keccak_ok():
+        print("⚠️ raw keccak 自檢失敗，改用 cSHAKE256.new", file=sys.stderr, flush=True)
+        RAW_KECCAK = False
+
+if not RAW_KECCAK:
+    _CUSTOM_BY_PREFIX = {POW_PREFIX: b"ProofOfWorkHash", HEAVY_PREFIX: b"HeavyHash"}
+
+    def cshake256(data: bytes, prefix: bytes) -> bytes:
+        """cSHAKE256 → 32 bytes（PyCryptodome 公開 API fallback）"""
+        return cSHAKE256.new(data=data, custom=_CUSTOM_BY_PREFIX[prefix]).read(32)
+
+    def cshake256_absorbed(prefix: bytes, data: bytes = b''):
+        """公開 API 沒有 copy()，只能把固定部分存起來"""
+        return (prefix, data)
+
+    def cshake256_resume(state, data: bytes) -> bytes:
+        prefix, head = state
+        return cshake256(head + data, prefix)
+
+    _NONCE_BUF = bytearray(8)
+
+    def cshake256_resume_nonce(state) -> bytes:
+        return cshake256_resume(state, _NONCE_BUF)
+
+# 熱迴圈直接用（省掉 cshake256 的 dict 查表）
+HEAVY_INIT_STATE = cshake256_absorbed(HEAVY_PREFIX)
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # HeavyHash 核心
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def xoshiro256_next(state: np.ndarray) -> int:
-    """xoshiro256++ PRNG - 用於矩陣生成"""
-    result = np.uint64((np.uint64(state[0]) + np.uint64(state[3])))
-    result = np.uint64((result << 23 | result >> 41) + state[0])
-    t = np.uint64(state[1] << 17)
-    state[2] ^= state[0]
-    state[3] ^= state[1]
-    state[1] ^= state[2]
-    state[0] ^= state[3]
-    state[2] ^= t
-    state[3] = np.uint64(state[3] << 45 | state[3] >> 19)
-    return int(result)
+U64_MASK = 0xFFFFFFFFFFFFFFFF
+
+def xoshiro256_next(state: list) -> int:
+    """xoshiro256++ PRNG - 用於矩陣生成
+
+    state 是 4 個 Python int 的 list；用 & U64_MASK 模擬 Rust 的 wrapping 運算，
+    避免每一步都產生 np.uint64 物件（以及 NumPy 的溢位警告）
+    """
+    s0, s1, s2, s3 = state
+    result = (s0 + s3) & U64_MASK
+    result = ((((result << 23) | (result >> 41)) & U64_MASK) + s0) & U64_MASK
+    t = (s1 << 17) & U64_MASK
+    s2 ^= s0
+    s3 ^= s1
+    s1 ^= s2
+    s0 ^= s3
+    s2 ^= t
+    s3 = ((s3 << 45) | (s3 >> 19)) & U64_MASK
+    state[0], state[1], state[2], state[3] = s0, s1, s2, s3
+    return result
+
+def _fill_matrix_py(state: list, out: np.ndarray):
+    """用 xoshiro256++ 填一個候選矩陣（每個 u64 拆成 16 個 4-bit，低位先）"""
+    for i in range(64):
+        for j in range(0, 64, 16):
+            value = xoshiro256_next(state)
+            for k in range(16):
+                out[i, j + k] = (value >> (4 * k)) & 0x0F
+
+if USE_NUMBA:
+    # 有明確 signature，import 時就編譯好（cache=True 之後直接讀快取）；
+    # workers 是 fork 出來的，直接繼承主進程編譯好的 kernel，不會各自再編一次。
+    # signature 全部標成 C-contiguous（::1），LLVM 才能用固定 stride 展開/向量化
+    _NB_OPTS = dict(cache=True, boundscheck=False, error_model='numpy')
+
+    @njit('uint64(uint64[::1])', **_NB_OPTS)
+    def _xoshiro256_next_nb(s):
+        result = s[0] + s[3]
+        result = ((result << np.uint64(23)) | (result >> np.uint64(41))) + s[0]
+        t = s[1] << np.uint64(17)
+        s[2] ^= s[0]
+        s[3] ^= s[1]
+        s[1] ^= s[2]
+        s[0] ^= s[3]
+        s[2] ^= t
+        s[3] = (s[3] << np.uint64(45)) | (s[3] >> np.uint64(19))
+        return result
+
+    @njit('void(uint64[::1], int16[:, ::1])', **_NB_OPTS)
+    def _fill_matrix_nb(state, out):
+        for i in range(64):
+            for j in range(0, 64, 16):
+                value = _xoshiro256_next_nb(state)
+                for k in range(16):
+                    out[i, j + k] = (value >> np.uint64(4 * k)) & np.uint64(0x0F)
+
+    @njit(nb_types.void(nb_types.int16[:, ::1],
+                        nb_types.Array(nb_types.uint8, 2, 'C', readonly=True),
+                        nb_types.uint8[:, ::1]), **_NB_OPTS)
+    def _heavyhash_fold_nb(matrix, pow_hashes, out):
+        """(N, 32) pow_hash → (N, 32) digest：nibble 展開、矩陣乘法、>>10、XOR（不含最後 cSHAKE）
+        
+        全程 uint16：元素與 nibble 都是 0..15，每列最大 64 × 225 = 14400 < 65536，不會溢位；
+        16-bit lanes 是 32-bit 的兩倍寬（AVX2 vpmullw/vpaddw 一次 16 路）
+        """
+        vec = np.empty(64, dtype=np.uint16)
+        p = np.empty(64, dtype=np.uint16)
+        for n in range(pow_hashes.shape[0]):
+            for i in range(32):
+                b = np.uint16(pow_hashes[n, i])
+                vec[2 * i] = b >> np.uint16(4)
+                vec[2 * i + 1] = b & np.uint16(0x0F)
+            for i in range(64):
+                s = np.uint16(0)
+                for j in range(64):
+                    s += np.uint16(matrix[i, j]) * vec[j]
+                p[i] = (s >> np.uint16(10)) & np.uint16(0x0F)
+            for i in range(32):
+                out[n, i] = pow_hashes[n, i] ^ np.uint8((p[2 * i] << np.uint16(4)) | p[2 * i + 1])
 
 def compute_matrix_rank(matrix: np.ndarray) -> int:
-    """計算矩陣的秩（使用高斯消元，參考 rusty-kaspa）"""
+    """計算矩陣的秩（使用高斯消元，參考 rusty-kaspa）
+
+    消元步驟與 rusty-kaspa 完全相同（同樣的 pivot 選擇與 EPS），
+    但每個 pivot 的歸一化/消元都用 NumPy 整列廣播，不再是三層 Python 迴圈。
+    不用 np.linalg.matrix_rank：SVD 的容差與共識規則的 EPS 不同。
+    """
     EPS = 1e-9
-    mat = matrix.astype(np.float64).copy()
+    mat = matrix.astype(np.float64)
     rank = 0
-    row_selected = [False] * 64
+    row_selected = np.zeros(64, dtype=bool)
     
     for i in range(64):
         # 找到第一個未選擇且 mat[j][i] 非零的行
-        j = 0
-        while j < 64:
-            if not row_selected[j] and abs(mat[j, i]) > EPS:
-                break
-            j += 1
+        nonzero = np.abs(mat[:, i]) > EPS
+        candidates = np.flatnonzero(nonzero & ~row_selected)
+        if candidates.size == 0:
+            continue
+        j = candidates[0]
         
-        if j != 64:
-            rank += 1
-            row_selected[j] = True
-            # 歸一化
-            for p in range(i + 1, 64):
-                mat[j, p] /= mat[j, i]
-            # 消元
-            for k in range(64):
-                if k != j and abs(mat[k, i]) > EPS:
-                    for p in range(i + 1, 64):
-                        mat[k, p] -= mat[j, p] * mat[k, i]
+        rank += 1
+        row_selected[j] = True
+        # 歸一化
+        mat[j, i + 1:] /= mat[j, i]
+        # 消元（所有 k != j 且 mat[k][i] 非零的行一次完成）
+        nonzero[j] = False
+        rows = np.flatnonzero(nonzero)
+        if rows.size:
+            mat[rows, i + 1:] -= mat[j, i + 1:] * mat[rows, i:i + 1]
     
     return rank
 
 def generate_matrix(hash_bytes: bytes) -> np.ndarray:
-    """生成 64x64 HeavyHash 矩陣
+    """生成 64x64 HeavyHash 矩陣（int16）
     
     參考 rusty-kaspa: 必須檢查 rank == 64，否則重新生成！
+    元素與向量都是 4-bit，每列內積最大 64*15*15 = 14400，int16 不會溢位，
+    矩陣只佔 8 KB，C-contiguous（每 16 列 = 2 KB 一塊，C kernel 直接線性讀取）。
     """
-    state = np.zeros(4, dtype=np.uint64)
-    for i in range(4):
-        state[i] = int.from_bytes(hash_bytes[i*8:(i+1)*8], 'little')
+    if USE_NUMBA:
+        state = np.frombuffer(hash_bytes, dtype='<u8', count=4).copy()
+        fill = _fill_matrix_nb
+    else:
+        state = [int.from_bytes(hash_bytes[i*8:(i+1)*8], 'little') for i in range(4)]
+        fill = _fill_matrix_py
     
     while True:
-        matrix = np.zeros((64, 64), dtype=np.uint16)
-        for i in range(64):
-            for j in range(0, 64, 16):
-                value = xoshiro256_next(state)
-                for k in range(16):
-                    matrix[i, j + k] = (value >> (4 * k)) & 0x0F
+        matrix = np.empty((64, 64), dtype=np.int16)
+        fill(state, matrix)
         
         # 必須是滿秩矩陣！
         if compute_matrix_rank(matrix) == 64:
             return matrix
         # 否則繼續用同一個 PRNG 狀態生成下一個矩陣
 
+_matrix_cache = (None, None)  # (pre_pow_hash, matrix)：header 沒變時 poll 回來的 pre_pow_hash 相同
+
+def cached_matrix(pre_pow_hash: bytes) -> np.ndarray:
+    """同一個 pre_pow_hash 只生成一次矩陣（回傳的矩陣不可修改）"""
+    global _matrix_cache
+    if pre_pow_hash != _matrix_cache[0]:
+        _matrix_cache = (pre_pow_hash, generate_matrix(pre_pow_hash))
+    return _matrix_cache[1]
+
+_HEAVY_DIGEST = np.empty((1, 32), dtype=np.uint8)  # heavy_hash 的 fold 輸出（tobytes 會複製，可重用）
+# byte → (高 4 bits, 低 4 bits)；只給單次 heavy_hash 用，批次路徑的 (N, 32) fancy-index 反而比兩次切片賦值慢
+_NIBBLE_LUT = np.stack([np.arange(256) >> 4, np.arange(256) & 0x0F], axis=1).astype(np.int16)
+
 def heavy_hash(matrix: np.ndarray, hash_bytes: bytes) -> bytes:
     """HeavyHash 核心計算
     
@@ -167,43 +410,177 @@ def heavy_hash(matrix: np.ndarray, hash_bytes: bytes) -> bytes:
     3. 合併成 32 bytes，XOR 原始 hash
     4. 最後 cSHAKE256("HeavyHash")
     """
+    if USE_NUMBA:
+        # 單次呼叫時 NumPy 的 dispatch 開銷比運算本身大，整段 fold 交給 Numba，寫進預先配置的 scratch
+        digest = _HEAVY_DIGEST
+        _heavyhash_fold_nb(matrix, np.frombuffer(hash_bytes, dtype=np.uint8).reshape(1, 32), digest)
+        return cshake256_resume(HEAVY_INIT_STATE, digest.tobytes())
+    
     # 展開成 64 個 4-bit 值 (Rust: vec[2*i] = hash[i] >> 4, vec[2*i+1] = hash[i] & 0x0F)
+    # 查表一次 fancy-index，不產生位移/遮罩的暫存陣列
     header_arr = np.frombuffer(hash_bytes, dtype=np.uint8)
-    v = np.zeros(64, dtype=np.uint16)
-    v[0::2] = (header_arr >> 4) & 0x0F  # 偶數位 = 高 4 bits
-    v[1::2] = header_arr & 0x0F         # 奇數位 = 低 4 bits
+    v = _NIBBLE_LUT[header_arr].reshape(64)
     
-    # 矩陣乘法（NumPy 加速）
+    # 矩陣乘法：int16 @ int16 直接算（最大 14400，不需要轉 uint64）
     # Rust: sum = Σ(matrix[row][j] * vec[j]) for j in 0..64
-    p = np.dot(matrix.astype(np.uint64), v.astype(np.uint64))
+    p = matrix @ v
     # Rust: (sum >> 10) 取低 4 bits
     p = (p >> 10) & 0x0F  # 修復：確保只取 4 bits！
     
-    # XOR 回原 hash
+    # XOR 回原 hash（整段向量化，不再逐 byte 產生 Python int）
     # Rust: ((sum1 >> 10) << 4) | (sum2 >> 10) ^ hash[i]
-    digest = bytearray(32)
-    for i in range(32):
-        high4 = int(p[i * 2]) & 0x0F
-        low4 = int(p[i * 2 + 1]) & 0x0F
-        digest[i] = hash_bytes[i] ^ ((high4 << 4) | low4)
+    digest = header_arr ^ ((p[0::2] << 4) | p[1::2]).astype(np.uint8)
+    return cshake256_resume(HEAVY_INIT_STATE, digest.tobytes())
+
+def gemm_operand(matrix: np.ndarray) -> np.ndarray:
+    """heavy_hash_batch 用的矩陣運算元（每個 template 算一次）
     
-    # 最終 cSHAKE256
-    h = cSHAKE256.new(data=bytes(digest), custom=b"HeavyHash")
-    return h.read(32)
+    Numba：原本的 int16 矩陣（C-contiguous），交給 uint16 fold kernel；
+    否則：matrix.T 轉 float32、C-contiguous，走 BLAS
+    """
+    if USE_NUMBA:
+        return np.ascontiguousarray(matrix, dtype=np.int16)
+    return np.ascontiguousarray(matrix.T, dtype=np.float32)
 
-def compute_pow(pre_pow_hash: bytes, timestamp: int, nonce: int, matrix: np.ndarray) -> bytes:
-    """計算完整 PoW hash
+def heavy_hash_batch(matrix_t: np.ndarray, pow_hashes: np.ndarray) -> np.ndarray:
+    """批次 HeavyHash（不含最後的 cSHAKE256）：(N, 32) uint8 → (N, 32) uint8
+    
+    matrix_t 來自 gemm_operand()。
+    Numba：uint16 fold kernel（比 BLAS 快，約 0.27 vs 0.35 µs/hash）。
+    否則 N 個 nonce 的矩陣乘法合成一次 (N,64) x (64,64) GEMM，
+    用 float32 走 BLAS sgemm：每個和最大 14400 < 2^24，float32 完全精確
+    （NumPy 的整數 matmul 不走 BLAS）。
+    """
+    if USE_NUMBA:
+        out = np.empty(pow_hashes.shape, dtype=np.uint8)
+        _heavyhash_fold_nb(matrix_t, pow_hashes, out)
+        return out
+    v = np.empty((pow_hashes.shape[0], 64), dtype=np.float32)
+    v[:, 0::2] = pow_hashes >> 4
+    v[:, 1::2] = pow_hashes & 0x0F
+    p = (v @ matrix_t).astype(np.uint16)
+    p = (p >> 10) & 0x0F
+    return pow_hashes ^ ((p[:, 0::2] << 4) | p[:, 1::2]).astype(np.uint8)
+
+def pow_prefix(pre_pow_hash: bytes, timestamp: int) -> bytes:
+    """PoW 輸入的固定 72 bytes：pre_pow_hash (32) || timestamp LE (8) || zeros (32)"""
+    return pre_pow_hash + struct.pack('<Q', timestamp) + (b'\x00' * 32)
+
+def make_pow_state(pre_pow_hash: bytes, timestamp: int):
+    """每個 template 一次：吸收 cSHAKE 前綴 + 72 bytes 固定部分的 sponge state
     
     格式: pre_pow_hash (32) || timestamp (8) || zeros (32) || nonce (8) = 80 bytes
-    經過 cSHAKE256("ProofOfWorkHash") 再做 HeavyHash
+    只有最後 8 bytes 的 nonce 會變（參考 rusty-kaspa test_pow_hash: 32 個零字節是正確的！）
+    """
+    return cshake256_absorbed(POW_PREFIX, pow_prefix(pre_pow_hash, timestamp))
+
+_pack_u64_into = struct.Struct('<Q').pack_into
+
+def compute_pow_from_state(pow_state, nonce: int, matrix: np.ndarray) -> bytes:
+    """從 make_pow_state 的 state 續算：吸收 nonce → cSHAKE256("ProofOfWorkHash") → HeavyHash"""
+    _pack_u64_into(_NONCE_BUF, 0, nonce)
+    return heavy_hash(matrix, cshake256_resume_nonce(pow_state))
+
+def compute_pow(pre_pow_hash: bytes, timestamp: int, nonce: int, matrix: np.ndarray) -> bytes:
+    """計算完整 PoW hash（單次用；挖礦迴圈用 make_pow_state + compute_pow_from_state）"""
+    return compute_pow_from_state(make_pow_state(pre_pow_hash, timestamp), nonce, matrix)
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# 批次掃描：scan_batch(start, count) -> [(nonce, pow_hash), ...]
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+def scan_batch_python(pow_state, matrix_t: np.ndarray, target_bytes: bytes, start: int, count: int) -> list:
+    """Python 後端：逐個 cSHAKE256("ProofOfWorkHash") → 一次 GEMM → 逐個 cSHAKE256("HeavyHash")
+    
+    matrix_t 是 gemm_operand(matrix)，每個 template 準備一次，批次內不再轉型/複製矩陣
+    target_bytes 與 Cython 後端相同：32 bytes little-endian
+    """
+    nonces = [(start + i) & U64_MASK for i in range(count)]
+    # nonce 寫進同一個預先配置的 8-byte buffer，不再每個 nonce 產生新的 bytes
+    # 迴圈內用到的函式先綁成 local（LOAD_FAST，不走 global / 屬性查找）
+    nonce_buf, pack_into, resume_nonce = _NONCE_BUF, _pack_u64_into, cshake256_resume_nonce
+    pow_hashes = []
+    append = pow_hashes.append
+    for nonce in nonces:
+        pack_into(nonce_buf, 0, nonce)
+        append(resume_nonce(pow_state))
+    pow_hashes = b''.join(pow_hashes)
+    digests = heavy_hash_batch(matrix_t, np.frombuffer(pow_hashes, dtype=np.uint8).reshape(-1, 32)).tobytes()
+    
+    heavy_state, resume = HEAVY_INIT_STATE, cshake256_resume
+    final = b''.join([resume(heavy_state, digests[i:i + 32]) for i in range(0, count * 32, 32)])
+    
+    # SoA 比較：整批 hash 當 (N, 4) uint64 lanes，最高 64 bits 一次向量比較，
+    # 只有通過的（實際 difficulty 下幾乎沒有）才做完整 256-bit 比較
+    # 完整比較用反轉後的 bytes（big-endian 字典序 = 數值大小，C 層 memcmp，不建 256-bit int）
+    top = np.frombuffer(final, dtype='<u8').reshape(-1, 4)[:, 3]
+    target_hi = np.frombuffer(target_bytes, dtype='<u8')[3]
+    target_be = target_bytes[::-1]
+    found = []
+    for i in np.flatnonzero(top <= target_hi).tolist():
+        pow_hash = final[i * 32:(i + 1) * 32]
+        if pow_hash[::-1] < target_be:
+            found.append((nonces[i], pow_hash))
+    return found
+
+def scan_operand(matrix: np.ndarray):
+    """kaspa_pow_v3.scan 的矩陣運算元：每個 template 轉一次 ScanMatrix（舊的編譯版沒有，只收 ndarray）"""
+    return kaspa_pow_v3.ScanMatrix(matrix) if hasattr(kaspa_pow_v3, 'ScanMatrix') else matrix
+
+def scan_batch_cython(pow_state, matrix: np.ndarray, scan_matrix, prefix: bytes, target_bytes: bytes,
+                      start: int, count: int) -> list:
+    """Cython 後端：整段在 kaspa_pow_v3.scan（C 層）；合格的 nonce 再用 Python 算一次 hash 回報
     
-    參考 rusty-kaspa test_pow_hash: 32 個零字節是正確的！
+    scan_matrix 是 scan_operand(matrix)，每個 template 準備一次
     """
-    # 正確格式: 80 bytes total (32 zeros 是必要的！)
-    data = pre_pow_hash + struct.pack('<Q', timestamp) + (b'\x00' * 32) + struct.pack('<Q', nonce)
-    h = cSHAKE256.new(data=data, custom=b"ProofOfWorkHash")
-    pow_hash = h.read(32)
-    return heavy_hash(matrix, pow_hash)
+    found = []
+    while count > 0:
+        nonce = kaspa_pow_v3.scan(scan_matrix, prefix, start, count, target_bytes)
+        if nonce is None:
+            break
+        found.append((nonce, compute_pow_from_state(pow_state, nonce, matrix)))
+        count -= ((nonce - start) & U64_MASK) + 1
+        start = (nonce + 1) & U64_MASK
+    return found
+
+def self_test_cython_scan() -> bool:
+    """Workers 走的是 kaspa_pow_v3.scan（4 路交錯 + 編譯期選的 matvec），
+    與 compute_pow（Python 路徑）是兩套實作，開挖前在本機 CPU 上對一次
+    """
+    pre_pow_hash = bytes(range(32))
+    timestamp = 1700000000000
+    test_nonce = 0x1234567890
+    matrix = generate_matrix(pre_pow_hash)
+    scan_matrix = scan_operand(matrix)
+    prefix = pow_prefix(pre_pow_hash, timestamp)
+    
+    def scan(start: int, count: int, target: int):
+        return kaspa_pow_v3.scan(scan_matrix, prefix, start, count, target.to_bytes(32, 'little'))
+    
+    def pow_int(nonce: int) -> int:
+        return hash_to_int(compute_pow(pre_pow_hash, timestamp, nonce, matrix))
+    
+    # target = hash + 1：第一個 nonce 就是 test_nonce（strict <）；target = hash：只掃 1 個，不能過
+    expected = pow_int(test_nonce)
+    ok = scan(test_nonce, 4, expected + 1) == test_nonce and scan(test_nonce, 1, expected) is None
+    
+    # 4 路的每一個位置都要驗：target = 這 4 個 nonce hash 的最小值 (+1)，只有最小的那個能過；
+    # target = 最小值時 4 個都不能過（某一路算錯偏小也會被抓到）
+    lanes_checked = set()
+    start = test_nonce
+    while ok and len(lanes_checked) < 4 and start < test_nonce + 256:
+        ints = [pow_int(start + k) for k in range(4)]
+        lane = ints.index(min(ints))
+        ok = scan(start, 4, ints[lane] + 1) == start + lane and scan(start, 4, ints[lane]) is None
+        lanes_checked.add(lane)
+        start += 4
+    
+    if ok:
+        print("[Test] ✅ kaspa_pow_v3.scan 與 compute_pow 一致", flush=True)
+    else:
+        print("[Test] ❌ kaspa_pow_v3.scan 結果與 compute_pow 不一致！", flush=True)
+    return ok
 
 def hash_to_int(hash_bytes: bytes) -> int:
     """Hash 轉為大整數（用於比較 target）"""
@@ -225,147 +602,405 @@ def bits_to_target(bits: int) -> int:
 
 import hashlib
 
+# 格式字串只解析一次
+_pack_u64 = struct.Struct('<Q').pack
+_pack_header_head = struct.Struct('<HQ').pack      # version, parents 層數
+_pack_header_tail = struct.Struct('<QIQQQ').pack   # timestamp = 0, bits, nonce = 0, daaScore, blueScore
+
 def hash_from_hex(hex_str: str) -> bytes:
     """將十六進制字串轉為 32 bytes"""
     if not hex_str:
         return b'\x00' * 32
     return bytes.fromhex(hex_str)
 
-def write_len(hasher, length: int):
-    """寫入變長整數 (u64 little-endian)"""
-    hasher.update(struct.pack('<Q', length))
+def hashes_from_hex(hex_list) -> bytes:
+    """多個 hash 一次解碼（空字串仍是 32 bytes 的 0）"""
+    joined = ''.join(hex_list)
+    if len(joined) == 64 * len(hex_list):
+        return bytes.fromhex(joined)
+    return b''.join(hash_from_hex(h) for h in hex_list)
 
-def write_var_bytes(hasher, data: bytes):
-    """寫入變長 bytes"""
-    write_len(hasher, len(data))
-    hasher.update(data)
-
-def write_blue_work(hasher, blue_work: str):
-    """序列化 blue_work (BigInt)"""
+def blue_work_bytes(blue_work: str) -> bytes:
+    """blue_work (BigInt hex) → 去掉前導零的 big-endian bytes"""
     if not blue_work:
-        write_var_bytes(hasher, b'')
-        return
+        return b''
+    n = int(blue_work, 16)
+    return n.to_bytes((n.bit_length() + 7) // 8, 'big')
+
+def serialize_pre_pow(header) -> bytes:
+    """pre-PoW hash 的完整 blake2b 輸入（timestamp、nonce 填 0，與 rusty-kaspa 一致）"""
+    parents = header.parents
+    buf = bytearray(_pack_header_head(header.version, len(parents)))  # 1. Version, 2. Parents 數
     
-    hex_str = blue_work
-    if len(hex_str) % 2 == 1:
-        hex_str = '0' + hex_str
+    # 3. Parents
+    for level in parents:
+        hashes = level.parentHashes
+        buf += _pack_u64(len(hashes))
+        buf += hashes_from_hex(hashes)
+    
+    # 4-6. Merkle roots
+    buf += hash_from_hex(header.hashMerkleRoot)
+    buf += hash_from_hex(header.acceptedIdMerkleRoot)
+    buf += hash_from_hex(header.utxoCommitment)
     
-    work_bytes = bytes.fromhex(hex_str)
-    start = 0
-    while start < len(work_bytes) and work_bytes[start] == 0:
-        start += 1
+    # 7-11. timestamp=0, bits, nonce=0, DAA score, blue score
+    buf += _pack_header_tail(0, header.bits, 0, header.daaScore, header.blueScore)
     
-    write_var_bytes(hasher, work_bytes[start:])
+    # 12. Blue work (var bytes)
+    work = blue_work_bytes(header.blueWork)
+    buf += _pack_u64(len(work))
+    buf += work
+    
+    # 13. Pruning point
+    buf += hash_from_hex(header.pruningPoint)
+    
+    return bytes(buf)
+
+def _pre_pow_key(header) -> tuple:
+    """pre-PoW 用到的所有欄位（不含 timestamp/nonce）"""
+    return (header.version, tuple(tuple(level.parentHashes) for level in header.parents),
+            header.hashMerkleRoot, header.acceptedIdMerkleRoot, header.utxoCommitment,
+            header.bits, header.daaScore, header.blueScore, header.blueWork, header.pruningPoint)
+
+# keyed blake2b 的 key block 只壓縮一次，每個 header 從這裡 copy()
+_BLOCK_HASHER = hashlib.blake2b(digest_size=32, key=b"BlockHash")
+
+_pre_pow_cache = (None, None)  # (key, pre_pow_hash)：每 0.5 秒 poll 通常拿到同一個 header
 
 def calculate_pre_pow_hash(header) -> bytes:
-    """計算 pre-PoW hash（與 rusty-kaspa 一致）"""
-    hasher = hashlib.blake2b(digest_size=32, key=b"BlockHash")
+    """計算 pre-PoW hash（與 rusty-kaspa 一致，同一個 header 只算一次）"""
+    global _pre_pow_cache
+    key = _pre_pow_key(header)
+    if key == _pre_pow_cache[0]:
+        return _pre_pow_cache[1]
+    # 留在 hashlib：CPython 的 _blake2 本身就有 SIMD，pynacl/libsodium 經 cffi 呼叫
+    # 在 0.3~20 KB 的 header 上反而慢（300 B 約 2 µs vs 15 µs），blake3 又與 Kaspa 不相容
+    hasher = _BLOCK_HASHER.copy()
+    hasher.update(serialize_pre_pow(header))
+    pre_pow_hash = hasher.digest()
+    _pre_pow_cache = (key, pre_pow_hash)
+    return pre_pow_hash
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# 共享 Template（SharedMemory + seqlock）
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TemplateBlob(ctypes.Structure):
+    """SharedMemory 裡的 template：矩陣、PoW prefix、target 連續排在同一塊"""
+    _fields_ = [
+        ('matrix', (ctypes.c_int16 * 64) * 64),  # 8 KB
+        ('prefix', ctypes.c_uint8 * 72),         # pre_pow_hash (32) || timestamp LE (8) || zeros (32)
+        ('target', ctypes.c_uint8 * 32),         # little-endian
+        ('template_id', ctypes.c_uint64),
+    ]
+
+class SharedTemplate:
+    """主進程寫、workers 讀的 template（取代 Manager dict，沒有任何 IPC round-trip）
     
-    # 1. Version
-    hasher.update(struct.pack('<H', header.version))
+    seq 是 seqlock：奇數 = 主進程寫入中；worker 讀前後 seq 相同才算讀到完整的一份。
+    只有主進程寫，所以 seq 用 RawValue（不需要鎖），worker 比對 seq.value 就知道 template 有沒有換。
+    ready 在第一個 template 寫入後 set，worker 啟動時等它，不用 sleep 輪詢。
+    TemplateBlob 每次用完就丟，不在 shm.buf 上留 export（否則 close() 會失敗）。
+    matrix 是每個進程自己的一塊 buffer，read() 每次都複製進同一塊，不重新配置。
+    """
     
-    # 2-3. Parents
-    parents = list(header.parents)
-    write_len(hasher, len(parents))
-    for level in parents:
-        parent_hashes = list(level.parentHashes)
-        write_len(hasher, len(parent_hashes))
-        for h in parent_hashes:
-            hasher.update(hash_from_hex(h))
+    def __init__(self):
+        self.shm = SharedMemory(create=True, size=ctypes.sizeof(TemplateBlob))
+        self.seq = RawValue('Q', 0)
+        self.ready = Event()
+        self.matrix = np.empty((64, 64), dtype=np.int16)
     
-    # 4-6. Merkle roots
-    hasher.update(hash_from_hex(header.hashMerkleRoot))
-    hasher.update(hash_from_hex(header.acceptedIdMerkleRoot))
-    hasher.update(hash_from_hex(header.utxoCommitment))
+    def publish(self, template: dict):
+        """主進程：寫入新 template（prefix / target_bytes 已在 get_block_template 算好）"""
+        blob = TemplateBlob.from_buffer(self.shm.buf)
+        self.seq.value += 1
+        np.ctypeslib.as_array(blob.matrix)[:] = template['matrix']
+        ctypes.memmove(blob.prefix, template['prefix'], 72)
+        ctypes.memmove(blob.target, template['target_bytes'], 32)
+        blob.template_id = template['id']
+        self.seq.value += 1
+        del blob
+        self.ready.set()
     
-    # 7-9. timestamp=0, bits, nonce=0 (for pre-pow)
-    hasher.update(struct.pack('<Q', 0))  # timestamp = 0
-    hasher.update(struct.pack('<I', header.bits))
-    hasher.update(struct.pack('<Q', 0))  # nonce = 0
+    def read(self) -> Tuple[int, Optional[dict]]:
+        """Worker：讀取目前 template，回傳 (seq, template)；還沒有 template 時是 (0, None)"""
+        while True:
+            seq = self.seq.value
+            if seq == 0:
+                return 0, None
+            if seq & 1:
+                time.sleep(0.001)
+                continue
+            blob = TemplateBlob.from_buffer(self.shm.buf)
+            prefix = bytes(blob.prefix)
+            target_bytes = bytes(blob.target)
+            template_id = blob.template_id
+            np.copyto(self.matrix, np.ctypeslib.as_array(blob.matrix))
+            del blob
+            if self.seq.value == seq:
+                return seq, {
+                    'prefix': prefix,
+                    'pre_pow_hash': prefix[:32],
+                    'timestamp': struct.unpack_from('<Q', prefix, 32)[0],
+                    'target': int.from_bytes(target_bytes, 'little'),
+                    'target_bytes': target_bytes,
+                    'id': template_id,
+                    'matrix': self.matrix,
+                }
     
-    # 10-12. DAA score, blue score, blue work
-    hasher.update(struct.pack('<Q', header.daaScore))
-    hasher.update(struct.pack('<Q', header.blueScore))
-    write_blue_work(hasher, header.blueWork)
+    def release(self):
+        """主進程：關閉並刪除共享記憶體"""
+        self.shm.close()
+        self.shm.unlink()
+
+class FoundRing:
+    """Workers 寫、主進程讀的結果 ring（取代 mp.Queue：不 pickle、沒有 feeder thread）
     
-    # 13. Pruning point
-    hasher.update(hash_from_hex(header.pruningPoint))
+    head 是所有 worker 共用的寫入計數（帶鎖）；tail 只有主進程用，不共享。
+    posted 在每次 push 後 set，主進程的 submitter thread 阻塞在 wait() 上，不用輪詢。
+    主進程落後超過 SIZE 筆時最舊的會被覆蓋（實際 difficulty 下幾乎不可能）。
+    """
+    
+    SIZE = 128
+    
+    def __init__(self):
+        self.nonces = RawArray('Q', self.SIZE)
+        self.template_ids = RawArray('Q', self.SIZE)
+        self.worker_ids = RawArray('i', self.SIZE)
+        self.head = Value('Q', 0)
+        self.posted = Event()
+        self.tail = 0
+    
+    def push(self, worker_id: int, nonce: int, template_id: int):
+        """Worker：寫入一筆結果（slot 寫完才推進 head）"""
+        with self.head.get_lock():
+            idx = self.head.value % self.SIZE
+            self.nonces[idx] = nonce
+            self.template_ids[idx] = template_id
+            self.worker_ids[idx] = worker_id
+            self.head.value += 1
+        self.posted.set()
+    
+    def wait(self, timeout: float) -> List[Tuple[int, int, int]]:
+        """主進程：等到有新結果（或 timeout）再 drain；先 clear 再 drain，不會漏掉 push"""
+        self.posted.wait(timeout)
+        self.posted.clear()
+        return self.drain()
     
-    return hasher.digest()
+    def drain(self) -> List[Tuple[int, int, int]]:
+        """主進程：取出所有新結果 [(worker_id, nonce, template_id), ...]"""
+        head = self.head.value
+        if head == self.tail:
+            return []
+        start = max(self.tail, head - self.SIZE)
+        results = []
+        for i in range(start, head):
+            idx = i % self.SIZE
+            results.append((self.worker_ids[idx], self.nonces[idx], self.template_ids[idx]))
+        self.tail = head
+        return results
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # Worker 進程
 # ═══════════════════════════════════════════════════════════════════════════════
 
+def physical_cpus() -> List[int]:
+    """可用的 CPU 排序：每個實體核心先取一個，SMT sibling 排在最後
+    
+    拓撲來自 /proc/cpuinfo 的 (physical id, core id)；讀不到就照 CPU 編號。
+    worker 數不超過實體核心數時，兩個 worker 不會共用同一顆核心的 L1/L2。
+    """
+    cpus = sorted(os.sched_getaffinity(0))
+    topology = {}
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu, package = None, 0
+            for line in f:
+                key, _, value = line.partition(':')
+                key = key.strip()
+                if key == 'processor':
+                    cpu = int(value)
+                elif key == 'physical id':
+                    package = int(value)
+                elif key == 'core id' and cpu is not None:
+                    topology[cpu] = (package, int(value))
+    except (OSError, ValueError):
+        return cpus
+    
+    seen = set()
+    primary, siblings = [], []
+    for cpu in cpus:
+        core = topology.get(cpu, ('cpu', cpu))
+        if core in seen:
+            siblings.append(cpu)
+        else:
+            seen.add(core)
+            primary.append(cpu)
+    return primary + siblings
+
+def pin_worker(worker_id: int) -> Optional[int]:
+    """把 worker 綁在固定 CPU 上（矩陣留在同一顆核心的 L1/L2），回傳 CPU 編號；不支援的平台就略過
+    
+    順便試著 nice(-5)，沒有權限就維持原本的優先權。
+    """
+    try:
+        os.nice(-5)
+    except (AttributeError, OSError):
+        pass
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+    cpus = physical_cpus()
+    cpu = cpus[worker_id % len(cpus)]
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except OSError:
+        return None
+    return cpu
+
+def pin_main(num_workers: int) -> Optional[int]:
+    """主進程（gRPC、統計、提交）綁在 workers 沒用到的第一個 CPU 上，不和 hasher 搶核心
+    
+    必須在 workers fork 之後呼叫（子進程繼承 fork 當下的 affinity）；沒有空的 CPU 就不綁。
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+    cpus = physical_cpus()
+    if num_workers >= len(cpus):
+        return None
+    cpu = cpus[num_workers]
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except OSError:
+        return None
+    return cpu
+
+def lane_nonce(worker_id: int) -> int:
+    """區段模式的起點：每個 template 隨機一次，之後循序（worker 之間不會重疊，與 worker 數無關）"""
+    return (worker_id << NONCE_LANE_BITS) | random.getrandbits(NONCE_LANE_BITS)
+
 def worker_process(
     worker_id: int,
-    shared_state: dict,
-    result_queue: mp.Queue,
-    stats_array: mp.Array,
-    running: mp.Value
+    shared_template: SharedTemplate,
+    found_ring: FoundRing,
+    stats_array: ctypes.Array,
+    running: mp.Value,
+    num_workers: int,
+    random_nonce: bool
 ):
     """Worker 進程 - 負責實際挖礦"""
     
     log_prefix = f"[Worker {worker_id}]"
-    local_hashes = 0
-    last_report = time.time()
+    cpu = pin_worker(worker_id)
+    print(f"{log_prefix} 📌 CPU {cpu if cpu is not None else '-'}", flush=True)
+    total_hashes = 0  # 單調累加，每批直接寫進 stats_array（RawArray，無鎖），主進程自己算差值
+    rng = np.random.default_rng()  # fork 之後才建立，每個 worker 各自的 OS entropy 種子
+    batch_size = SCAN_BATCH if USE_CYTHON else PY_BATCH
+    # 每批都會用到的屬性先綁成 local
+    seq_value = shared_template.seq
+    push = found_ring.push
     
     while running.value:
         # 取得當前 template
-        template_data = shared_state.get('template')
+        template_seq, template_data = shared_template.read()
         if not template_data:
-            time.sleep(0.1)
+            shared_template.ready.wait(timeout=0.1)
             continue
         
-        pre_pow_hash = template_data['pre_pow_hash']
-        timestamp = template_data['timestamp']
-        target = template_data['target']
         template_id = template_data['id']
         matrix = template_data['matrix']
+        # 每個 template 只做一次的 specialization：吸收好的 sponge state、矩陣運算元、target 都綁進 scan_batch。
+        # 不為每個 template 重新 njit 一個把矩陣當常數的 kernel：編譯約 430 ms（比 template 壽命還長），
+        # 而且常數矩陣反而打斷向量化（實測 0.76 vs 0.29 µs/hash）
+        pow_state = cshake256_absorbed(POW_PREFIX, template_data['prefix'])
+        target_be = template_data['target_bytes'][::-1]
+        if USE_CYTHON:
+            scan_batch = functools.partial(scan_batch_cython, pow_state, matrix, scan_operand(matrix),
+                                           template_data['prefix'], template_data['target_bytes'])
+        else:
+            scan_batch = functools.partial(scan_batch_python, pow_state, gemm_operand(matrix),
+                                           template_data['target_bytes'])
         
         # Nonce 策略
-        random_nonce = shared_state.get('random_nonce', False)
-        num_workers = shared_state.get('num_workers', 4)
+        if not random_nonce:
+            # 區段模式：每個 worker 負責自己的 2^48 區段
+            nonce_base = lane_nonce(worker_id)
         
-        if random_nonce:
-            # 完全隨機模式：每次都隨機選 nonce
-            pass  # nonce 在循環內生成
-        else:
-            # 區段模式：每個 worker 負責不同區段
-            chunk_size = 0xFFFFFFFFFFFFFFFF // num_workers
-            nonce_start = worker_id * chunk_size
-            nonce = nonce_start + random.randint(0, chunk_size // 1000)
-        
-        # 挖礦循環
-        batch_size = 1000
-        while running.value and shared_state.get('template', {}).get('id') == template_id:
-            for _ in range(batch_size):
-                if random_nonce:
-                    nonce = random.randint(0, 0xFFFFFFFFFFFFFFFF)  # 完全隨機
-                # 計算 PoW
-                pow_hash = compute_pow(pre_pow_hash, timestamp, nonce, matrix)
-                hash_val = hash_to_int(pow_hash)
-                local_hashes += 1
-                
-                # 檢查是否符合難度
-                if hash_val < target:
-                    result_queue.put({
-                        'type': 'found',
-                        'worker_id': worker_id,
-                        'nonce': nonce,
-                        'hash': pow_hash.hex(),
-                        'template_id': template_id
-                    })
+        # 挖礦循環：所有 bookkeeping（template 檢查、計數、統計）都是每批一次
+        while running.value and seq_value.value == template_seq:
+            if random_nonce:
+                # 完全隨機模式：每批一個隨機起點
+                start = int(rng.integers(0, U64_MASK, dtype=np.uint64, endpoint=True))
+            else:
+                start = nonce_base
+                nonce_base += batch_size
+            
+            for nonce, pow_hash in scan_batch(start, batch_size):
+                # 回報的 hash 是 Python 重算的；scan（C 層）算錯的 nonce 在這裡擋下，不送出無效區塊
+                if pow_hash[::-1] < target_be:
+                    push(worker_id, nonce, template_id)
                     print(f"{log_prefix} 💎 FOUND nonce={nonce}", flush=True)
-                
-                nonce += 1
+                else:
+                    print(f"{log_prefix} ❌ scan nonce={nonce} 重算未達 target，丟棄", flush=True)
+            total_hashes += batch_size
+            stats_array[worker_id] = total_hashes  # 每批一次 ctypes 寫入，不讀時鐘
+    
+    print(f"{log_prefix} 停止", flush=True)
+
+def gpu_worker_process(
+    worker_id: int,
+    shared_template: SharedTemplate,
+    found_ring: FoundRing,
+    stats_array: ctypes.Array,
+    running: mp.Value,
+    num_workers: int,
+    random_nonce: bool
+):
+    """GPU Worker 進程 - 每次 kernel launch 掃描 GPU_BATCH 個 nonce"""
+    
+    log_prefix = f"[GPU {worker_id}]"
+    # CUDA context 不能跨 fork，必須在子進程內 import/初始化
+    from kaspa_pow_cuda import CudaScanner
+    scanner = CudaScanner()
+    rng = np.random.default_rng()  # fork 之後才建立，每個 worker 各自的 OS entropy 種子
+    print(f"{log_prefix} 🎮 CUDA 就緒", flush=True)
+    
+    total_hashes = 0
+    
+    while running.value:
+        template_seq, template_data = shared_template.read()
+        if not template_data:
+            shared_template.ready.wait(timeout=0.1)
+            continue
+        
+        template_id = template_data['id']
+        scanner.set_template(template_data['pre_pow_hash'], template_data['timestamp'],
+                             template_data['matrix'], template_data['target'])
+        
+        nonce = lane_nonce(worker_id)
+        
+        while running.value and shared_template.seq.value == template_seq:
+            if random_nonce:
+                nonce = int(rng.integers(0, U64_MASK, dtype=np.uint64, endpoint=True))
+            found = scanner.scan(nonce, GPU_BATCH)
+            total_hashes += GPU_BATCH
+            stats_array[worker_id] = total_hashes
             
-            # 更新統計（每秒）
-            now = time.time()
-            if now - last_report >= 1.0:
-                stats_array[worker_id] = local_hashes
-                local_hashes = 0
-                last_report = now
+            # kernel 只回報區段內第一個合格的 nonce：找到後從 found+1 接著掃剩下的部分，直到沒有為止
+            start, remaining = nonce, GPU_BATCH
+            while found is not None:
+                # GPU 的結果在 CPU 上重算一次才提交：submit_block 不再檢查 PoW，kernel 算錯就會送出無效區塊
+                pow_hash = compute_pow(template_data['pre_pow_hash'], template_data['timestamp'],
+                                       found, template_data['matrix'])
+                if hash_to_int(pow_hash) < template_data['target']:
+                    found_ring.push(worker_id, found, template_id)
+                    print(f"{log_prefix} 💎 FOUND nonce={found}", flush=True)
+                else:
+                    print(f"{log_prefix} ❌ GPU nonce={found} CPU 驗證失敗，丟棄", flush=True)
+                remaining -= ((found - start) & U64_MASK) + 1
+                start = (found + 1) & U64_MASK
+                found = scanner.scan(start, remaining)
+            
+            nonce = (nonce + GPU_BATCH) & U64_MASK
     
     print(f"{log_prefix} 停止", flush=True)
 
@@ -376,29 +1011,31 @@ def worker_process(
 class ShioKazeMiner:
     """ShioKaze v4 主礦工"""
     
-    def __init__(self, address: str, wallet: str, num_workers: int = 4, random_nonce: bool = False):
+    def __init__(self, address: str, wallet: str, num_workers: int = 4, random_nonce: bool = False,
+                 use_gpu: bool = False):
         self.address = address
         self.wallet = wallet
         self.num_workers = num_workers
         self.random_nonce = random_nonce
+        self.use_gpu = use_gpu
         
         # 共享狀態
-        self.manager = Manager()
-        self.shared_state = self.manager.dict()
-        self.shared_state['num_workers'] = num_workers
-        self.shared_state['random_nonce'] = random_nonce
+        self.shared_template = SharedTemplate()
         
         # 統計
-        self.stats_array = Array('d', num_workers)  # 每個 worker 的 hash 數
+        self.stats_array = RawArray('Q', num_workers)  # 每個 worker 累計的 hash 數（只有該 worker 寫）
         self.running = Value('b', True)
-        self.result_queue = mp.Queue()
+        self.found_ring = FoundRing()
         
         # 進程
         self.workers = []
         
-        # gRPC
+        # gRPC：主循環輪詢 template、submitter thread 提交區塊，共用同一個 channel
+        # conn_lock 保護 channel/stub 的替換；重連期間另一個 thread 會在鎖上等到重連完成
         self.channel = None
         self.stub = None
+        self.conn_lock = threading.RLock()
+        self.conn_gen = 0  # 每次 connect +1，避免兩個 thread 為同一次斷線各重連一次
         
         # 統計追蹤
         self.start_time = None
@@ -417,22 +1054,24 @@ class ShioKazeMiner:
     def connect(self):
         """連接到 Kaspa 節點"""
         print(f"[Main] 🔗 連接到 {self.address}...", flush=True)
-        self.channel = grpc.insecure_channel(
-            self.address,
-            options=[
-                ('grpc.keepalive_time_ms', 10000),
-                ('grpc.keepalive_timeout_ms', 5000),
-                ('grpc.keepalive_permit_without_calls', True),
-            ]
-        )
-        self.stub = kaspa_pb2_grpc.RPCStub(self.channel)
+        with self.conn_lock:
+            self.channel = grpc.insecure_channel(
+                self.address,
+                options=[
+                    ('grpc.keepalive_time_ms', 10000),
+                    ('grpc.keepalive_timeout_ms', 5000),
+                    ('grpc.keepalive_permit_without_calls', True),
+                ]
+            )
+            self.stub = kaspa_pb2_grpc.RPCStub(self.channel)
+            self.conn_gen += 1
         
-        # 測試連接
+        # 測試連接（失敗不在這裡重連，由呼叫端決定）
         try:
             request = kaspa_pb2.KaspadMessage(
                 getInfoRequest=kaspa_pb2.GetInfoRequestMessage()
             )
-            response = self._call_rpc(request)
+            response = self._call_rpc(request, reconnect=False)
             
             if response and response.HasField('getInfoResponse'):
                 info = response.getInfoResponse
@@ -444,16 +1083,22 @@ class ShioKazeMiner:
             print(f"[Main] ❌ 連接失敗: {e}", flush=True)
             return False
     
-    def _call_rpc(self, request, timeout=10):
+    def _call_rpc(self, request, timeout=10, reconnect=True):
         """發送 RPC 請求（使用 MessageStream，帶 timeout）"""
+        # 只在鎖內取 stub，RPC 本身不持鎖（提交不用等 template 輪詢）；重連中會在這裡等
+        with self.conn_lock:
+            stub, gen = self.stub, self.conn_gen
+        if stub is None:
+            return None
         try:
             # 🔧 修復：加入 timeout 避免永久卡住
-            responses = self.stub.MessageStream(iter([request]), timeout=timeout)
+            responses = stub.MessageStream(iter([request]), timeout=timeout)
             for response in responses:
                 return response
         except grpc.RpcError as e:
             print(f"[Main] gRPC error: {e.code()} - {e.details()}", flush=True)
-            self._handle_disconnect()
+            if reconnect:
+                self._handle_disconnect(gen)
             return None
         except Exception as e:
             print(f"[Main] RPC error: {e}", flush=True)
@@ -461,35 +1106,41 @@ class ShioKazeMiner:
     
     def disconnect(self):
         """斷開連接"""
-        if self.channel:
+        with self.conn_lock:
+            if self.channel:
+                try:
+                    self.channel.close()
+                except:
+                    pass
+                self.channel = None
+                self.stub = None
+    
+    def _handle_disconnect(self, gen: Optional[int] = None):
+        """處理斷線，嘗試重連（gen：出錯時用的連線代數，已被別的 thread 重連過就跳過）"""
+        with self.conn_lock:
+            if gen is not None and gen != self.conn_gen:
+                return
+            print("[Main] ⚠️ 連接中斷，嘗試重連...", flush=True)
+            self.disconnect()
+            time.sleep(2)
             try:
-                self.channel.close()
-            except:
-                pass
-            self.channel = None
-            self.stub = None
-    
-    def _handle_disconnect(self):
-        """處理斷線，嘗試重連"""
-        print("[Main] ⚠️ 連接中斷，嘗試重連...", flush=True)
-        self.disconnect()
-        time.sleep(2)
-        try:
-            if self.connect():
-                print("[Main] ✅ 重連成功！", flush=True)
-            else:
-                print("[Main] ❌ 重連失敗", flush=True)
-        except Exception as e:
-            print(f"[Main] ❌ 重連失敗: {e}", flush=True)
+                if self.connect():
+                    print("[Main] ✅ 重連成功！", flush=True)
+                else:
+                    print("[Main] ❌ 重連失敗", flush=True)
+            except Exception as e:
+                print(f"[Main] ❌ 重連失敗: {e}", flush=True)
     
     def start_workers(self):
         """啟動 worker 進程"""
         print(f"[Main] 🚀 啟動 {self.num_workers} 個 workers...", flush=True)
         
+        target = gpu_worker_process if self.use_gpu else worker_process
         for i in range(self.num_workers):
             p = Process(
-                target=worker_process,
-                args=(i, self.shared_state, self.result_queue, self.stats_array, self.running)
+                target=target,
+                args=(i, self.shared_template, self.found_ring, self.stats_array, self.running,
+                      self.num_workers, self.random_nonce)
             )
             p.daemon = True
             p.start()
@@ -538,8 +1189,9 @@ class ShioKazeMiner:
             target = bits_to_target(bits)
             
             # 生成矩陣（緩存）
-            matrix = generate_matrix(pre_pow_hash)
+            matrix = cached_matrix(pre_pow_hash)
             
+            # workers 需要的 bytes 形式每個 template 只算一次，publish 直接搬進 shared memory
             return {
                 'block': block,
                 'pre_pow_hash': pre_pow_hash,
@@ -547,15 +1199,17 @@ class ShioKazeMiner:
                 'bits': bits,
                 'target': target,
                 'matrix': matrix,
-                'id': time.time()  # 用於識別 template
+                'prefix': pow_prefix(pre_pow_hash, timestamp),
+                'target_bytes': min(target, (1 << 256) - 1).to_bytes(32, 'little'),
+                'id': time.time_ns()  # 用於識別 template（u64，放得進 TemplateBlob）
             }
             
         except Exception as e:
             print(f"[Main] ❌ Template error: {e}", flush=True)
             return None
     
-    def submit_block(self, template: dict, nonce: int) -> bool:
-        """提交區塊"""
+    def submit_block(self, template: dict, nonce: int) -> Optional[bool]:
+        """提交區塊（None = 沒送到節點，可以重試）"""
         try:
             block = template['block']
             block.header.nonce = nonce
@@ -570,7 +1224,7 @@ class ShioKazeMiner:
             
             if not response or not response.HasField('submitBlockResponse'):
                 print(f"[Main] ⚠️ No response for submit", flush=True)
-                return False
+                return None
             
             resp = response.submitBlockResponse
             if resp.error and resp.error.message:
@@ -588,21 +1242,39 @@ class ShioKazeMiner:
             print(f"[Main] ❌ Submit error: {e}", flush=True)
             return False
     
-    def print_stats(self):
-        """輸出統計"""
-        # 計算 hashrate
-        current_hashes = sum(self.stats_array)
-        self.total_hashes += current_hashes
+    def _submit_loop(self):
+        """Submitter thread：worker 一 push 就醒來提交，不等主循環的 template 輪詢"""
+        while self.running.value:
+            for worker_id, nonce, template_id in self.found_ring.wait(1.0):
+                self.blocks_found += 1
+                print(f"[Main] ✨ 💎 Found nonce: {nonce} (worker {worker_id})", flush=True)
+                
+                # 提交 - 從緩存中查找對應的 template
+                submit_template = self.template_cache.get(template_id)
+                if submit_template:
+                    # 沒送到（斷線 / 重連中）就等重連後再送，不丟掉 nonce
+                    for attempt in range(SUBMIT_RETRIES):
+                        accepted = self.submit_block(submit_template, nonce)
+                        if accepted is not None:
+                            break
+                        print(f"[Main] 🔁 重送 nonce {nonce} ({attempt + 1}/{SUBMIT_RETRIES})", flush=True)
+                        time.sleep(1)
+                    if accepted:
+                        self.blocks_accepted += 1
+                else:
+                    print(f"[Main] ⚠️ Template {template_id} expired (too old)", flush=True)
+    
+    def print_stats(self, elapsed: float):
+        """輸出統計（elapsed：距上次呼叫的秒數）"""
+        # 計算 hashrate：workers 的計數器是累計值，取差值
+        total = sum(self.stats_array)
+        current_hashes = int((total - self.total_hashes) / max(elapsed, 1e-6))
+        self.total_hashes = total
         self.hashrate_history.append(current_hashes)
         
-        # 重置計數器
-        for i in range(self.num_workers):
-            self.stats_array[i] = 0
-        
         avg_hashrate = sum(self.hashrate_history) / max(len(self.hashrate_history), 1)
-        runtime = time.time() - self.start_time
         
-        now = datetime.now().strftime("%H:%M:%S")
+        now = time.strftime("%H:%M:%S")
         print(f"[{now}] 🌊 ⚡ {current_hashes:,} H/s (avg: {avg_hashrate:,.0f} H/s) | "
               f"Templates: {self.template_count} | Found: {self.blocks_found} | "
               f"Accepted: {self.blocks_accepted}", flush=True)
@@ -612,30 +1284,45 @@ class ShioKazeMiner:
         print(BANNER, flush=True)
         print(f"[Main] 🌊 ShioKaze v{__version__}", flush=True)
         print(f"[Main] 💰 Wallet: {self.wallet[:20]}...{self.wallet[-10:]}", flush=True)
-        print(f"[Main] 👷 Workers: {self.num_workers}", flush=True)
+        print(f"[Main] 👷 Workers: {self.num_workers}{' (GPU)' if self.use_gpu else ''}", flush=True)
+        backend = 'GPU' if self.use_gpu else 'Cython scan' if USE_CYTHON else 'Python'
+        if backend == 'Cython scan' and getattr(kaspa_pow_v3, 'MATVEC_VNNI', False):
+            backend += ' (VNNI)'
+        print(f"[Main] ⚙️ Backend: {backend}", flush=True)
         print(f"[Main] 🎲 Nonce: {'Random' if self.random_nonce else 'Sequential'}", flush=True)
         print("", flush=True)
         
+        if backend.startswith('Cython') and not self_test_cython_scan():
+            print("[Main] ❌ 自檢失敗，停止挖礦！", flush=True)
+            self.shared_template.release()
+            return
+        
         # 連接
         if not self.connect():
+            self.shared_template.release()
             return
         
         # 啟動 workers
         self.start_workers()
+        if not self.use_gpu:
+            cpu = pin_main(self.num_workers)
+            if cpu is not None:
+                print(f"[Main] 📌 CPU {cpu}", flush=True)
         self.start_time = time.time()
+        threading.Thread(target=self._submit_loop, daemon=True).start()
         
         # 當前 template
         current_template = None
         last_template_time = 0
-        last_stats_time = time.time()
+        last_stats_time = time.monotonic()
         
         try:
             consecutive_failures = 0
             max_failures = 10
             
             while self.running.value:
-                # 定期取得新 template（每 0.5 秒）
-                now = time.time()
+                # 定期取得新 template（每 0.5 秒）；間隔用 monotonic，不受系統校時影響
+                now = time.monotonic()
                 if now - last_template_time >= 0.5:
                     new_template = self.get_block_template()
                     
@@ -665,42 +1352,20 @@ class ShioKazeMiner:
                                 old_id = self.template_ids.popleft()
                                 self.template_cache.pop(old_id, None)
                             
-                            # 更新共享狀態
-                            self.shared_state['template'] = {
-                                'pre_pow_hash': new_template['pre_pow_hash'],
-                                'timestamp': new_template['timestamp'],
-                                'target': new_template['target'],
-                                'matrix': new_template['matrix'],
-                                'id': new_template['id']
-                            }
+                            # 更新共享 template（SharedMemory，workers 看 seq 變化）
+                            self.shared_template.publish(new_template)
                             
                             bits_hex = f"0x{new_template['bits']:08x}"
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] 🌊 "
+                            print(f"[{time.strftime('%H:%M:%S')}] 🌊 "
                                   f"Template #{self.template_count}: bits={bits_hex}", flush=True)
                     
                     last_template_time = now
                 
-                # 檢查結果
-                while not self.result_queue.empty():
-                    try:
-                        result = self.result_queue.get_nowait()
-                        if result['type'] == 'found':
-                            self.blocks_found += 1
-                            print(f"[Main] ✨ 💎 Found nonce: {result['nonce']}", flush=True)
-                            
-                            # 提交 - 從緩存中查找對應的 template
-                            submit_template = self.template_cache.get(result['template_id'])
-                            if submit_template:
-                                if self.submit_block(submit_template, result['nonce']):
-                                    self.blocks_accepted += 1
-                            else:
-                                print(f"[Main] ⚠️ Template {result['template_id']} expired (too old)", flush=True)
-                    except:
-                        break
+                # 結果由 _submit_loop 處理
                 
                 # 定期輸出統計（每秒）
                 if now - last_stats_time >= 1.0:
-                    self.print_stats()
+                    self.print_stats(now - last_stats_time)
                     last_stats_time = now
                 
                 time.sleep(0.05)
@@ -710,6 +1375,8 @@ class ShioKazeMiner:
         
         finally:
             self.stop_workers()
+            self.shared_template.release()
+            self.total_hashes = sum(self.stats_array)
             print(f"\n[Main] 📊 總結:", flush=True)
             print(f"       運行時間: {time.time() - self.start_time:.1f} 秒", flush=True)
             print(f"       總 Hash: {self.total_hashes:,}", flush=True)
@@ -724,10 +1391,12 @@ def main():
     parser = argparse.ArgumentParser(description="ShioKaze v4 - Nami's Kaspa Miner")
     parser.add_argument('--testnet', action='store_true', help='Use testnet')
     parser.add_argument('--wallet', '-w', required=True, help='Kaspa wallet address')
-    parser.add_argument('--workers', '-n', type=int, default=4, help='Number of workers')
+    parser.add_argument('--workers', '-n', type=int, default=None, help='Number of workers (default: 4, --gpu: 1)')
     parser.add_argument('--address', '-a', help='gRPC address (auto-detect if not set)')
     parser.add_argument('--random-nonce', '-r', action='store_true', 
                         help='Use completely random nonce (better luck for slow miners)')
+    parser.add_argument('--gpu', action='store_true',
+                        help='Mine on CUDA GPU via CuPy (kaspa_pow_cuda.py)')
     
     args = parser.parse_args()
     
@@ -743,8 +1412,9 @@ def main():
     miner = ShioKazeMiner(
         address=address,
         wallet=args.wallet,
-        num_workers=args.workers,
-        random_nonce=args.random_nonce
+        num_workers=args.workers or (1 if args.gpu else 4),
+        random_nonce=args.random_nonce,
+        use_gpu=args.gpu
     )
     
     # 運行
@@ -68,10 +68,11 @@ import struct
 import argparse
 import signal
 import random
+import ctypes
 import multiprocessing as mp
-from multiprocessing import Process, Value, Array, Manager
+from multiprocessing import Process, Value, RawValue, RawArray, Event
+from multiprocessing.shared_memory import SharedMemory
 from typing import Optional, Tuple, List
-from datetime import datetime
 from collections import deque
 
 import numpy as np
@@ -105,6 +106,37 @@ except ImportError:
         from Crypto.Hash import cSHAKE256
         print("⚠️ 加速模組未找到，使用純 Python（較慢）", flush=True)
 
+# 純 Python 路徑：有 numba 就把整個 PoW（兩次 cSHAKE256 + 矩陣乘法）JIT 成原生迴圈
+USE_NUMBA = False
+if not (USE_RUST or USE_CYTHON):
+    try:
+        from numba import njit
+        USE_NUMBA = True
+        BACKEND = "numba"
+        print("⚡ Numba HeavyHash 已載入（JIT）！", flush=True)
+    except ImportError:
+        pass
+
+# Rust 的 setup_mining 新版多一個 matrix_bytes 參數；舊的編譯版（含 target/wheels 裡的 wheel）只收 3 個，
+# 多傳會讓每個 worker 在第一個 template 就 TypeError 退出
+RUST_SETUP_MATRIX = USE_RUST and 'matrix_bytes' in (getattr(kaspa_pow_py.setup_mining, '__text_signature__', None) or '')
+
+# Cython v2 有 pre_pow_hash() 就把 header 序列化交給它（舊的編譯版沒有）
+CYTHON_PRE_POW = USE_CYTHON and hasattr(kaspa_pow_v2, 'pre_pow_hash')
+
+# Cython 後端：有編譯 v3 就用它的 scan()，整批 nonce 在 C 層掃描，不再每個 nonce 呼叫一次 compute_pow
+USE_CYTHON_SCAN = False
+if USE_CYTHON:
+    try:
+        import kaspa_pow_v3
+        USE_CYTHON_SCAN = hasattr(kaspa_pow_v3, 'scan')
+    except ImportError:
+        pass
+
+def scan_operand(matrix: np.ndarray):
+    """kaspa_pow_v3.scan 的矩陣運算元：每個 template 轉一次 ScanMatrix（舊的編譯版沒有，只收 ndarray）"""
+    return kaspa_pow_v3.ScanMatrix(matrix) if hasattr(kaspa_pow_v3, 'ScanMatrix') else matrix
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # 啟動自檢（驗證 PoW 計算正確性）
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -117,12 +149,7 @@ def run_self_test() -> bool:
     print("[Test] 🔍 執行 PoW 自檢...", flush=True)
     
     # 測試向量：固定的 pre_pow_hash
-    test_hash = bytes([
-        0x01, 0x23, 0x45, 0x67, 0x89, 0xab, 0xcd, 0xef,
-        0x01, 0x23, 0x45, 0x67, 0x89, 0xab, 0xcd, 0xef,
-        0x01, 0x23, 0x45, 0x67, 0x89, 0xab, 0xcd, 0xef,
-        0x01, 0x23, 0x45, 0x67, 0x89, 0xab, 0xcd, 0xef,
-    ])
+    test_hash = bytes.fromhex("0123456789abcdef" * 4)
     test_timestamp = 1234567890
     test_nonce = 99999
     
@@ -131,6 +158,8 @@ def run_self_test() -> bool:
         matrix = kaspa_pow_py.gen_matrix(test_hash)
     elif USE_CYTHON:
         matrix = kaspa_pow_v2.generate_matrix(test_hash)
+    elif USE_NUMBA:
+        matrix = generate_matrix_python(test_hash)
     else:
         print("[Test] ⚠️ 無加速模組，跳過自檢", flush=True)
         return True
@@ -138,8 +167,10 @@ def run_self_test() -> bool:
     # 計算 PoW
     if USE_RUST:
         pow_hash = kaspa_pow_py.compute_pow(test_hash, test_timestamp, test_nonce, matrix)
-    else:
+    elif USE_CYTHON:
         pow_hash = kaspa_pow_v2.compute_pow(test_hash, test_timestamp, test_nonce, matrix)
+    else:
+        pow_hash = compute_pow_python(test_hash, test_timestamp, test_nonce, matrix)
     
     # 預期結果（使用 Cython v2 作為參考，已驗證正確）
     expected_hex = "d2154c1435c99a4ea58ca81dc35829ebd1513b67b0bdec12ba15fb27fefadc82"
@@ -148,6 +179,8 @@ def run_self_test() -> bool:
     if pow_hash == expected:
         print(f"[Test] ✅ PoW 計算正確！", flush=True)
         print(f"[Test]    Hash: {pow_hash.hex()[:32]}...", flush=True)
+        if USE_RUST:
+            return _self_test_rust_mining(test_hash, test_timestamp, test_nonce, matrix, expected)
         return True
     else:
         print(f"[Test] ❌ PoW 計算錯誤！", flush=True)
@@ -155,6 +188,51 @@ def run_self_test() -> bool:
         print(f"[Test]    實際: {pow_hash.hex()[:32]}...", flush=True)
         return False
 
+def _self_test_rust_mining(test_hash: bytes, test_timestamp: int, test_nonce: int,
+                           matrix: bytes, expected: bytes) -> bool:
+    """Workers 走的是 setup_mining + mine_range（4 路 x4 + 執行時選 VNNI/AVX2），
+    compute_pow 是另一條純量路徑，所以這條也要在本機 CPU 上驗一次
+    """
+    expected_int = int.from_bytes(expected, 'little')
+    
+    def setup(target: int):
+        target_bytes = target.to_bytes(32, 'little')
+        if RUST_SETUP_MATRIX:
+            kaspa_pow_py.setup_mining(test_hash, test_timestamp, target_bytes, matrix)
+        else:
+            kaspa_pow_py.setup_mining(test_hash, test_timestamp, target_bytes)
+    
+    # target = hash + 1：第一個 nonce 就是 test_nonce（strict <）
+    setup(expected_int + 1)
+    found, found_hash, _ = kaspa_pow_py.mine_range(test_nonce, 4, False)
+    ok = found == test_nonce and found_hash == expected
+    # target = hash：test_nonce 本身不能過（只掃 1 個，後面的 nonce 本來就可能低於 target）
+    setup(expected_int)
+    found_eq, _, _ = kaspa_pow_py.mine_range(test_nonce, 1, False)
+    ok = ok and found_eq is None
+    
+    # 4 路的每一個位置都要驗：target = 這 4 個 nonce 純量 hash 的最小值 (+1)，
+    # 只有最小的那個 nonce 能過；target = 最小值時 4 個都不能過（某一路算錯偏小也會被抓到）
+    lanes_checked = set()
+    start = test_nonce
+    while ok and len(lanes_checked) < 4 and start < test_nonce + 256:
+        hashes = [kaspa_pow_py.compute_pow(test_hash, test_timestamp, start + w, matrix) for w in range(4)]
+        ints = [int.from_bytes(h, 'little') for h in hashes]
+        lane = ints.index(min(ints))
+        setup(ints[lane] + 1)
+        found_lane, found_lane_hash, _ = kaspa_pow_py.mine_range(start, 4, False)
+        setup(ints[lane])
+        found_none, _, _ = kaspa_pow_py.mine_range(start, 4, False)
+        ok = found_lane == start + lane and found_lane_hash == hashes[lane] and found_none is None
+        lanes_checked.add(lane)
+        start += 4
+    
+    if ok:
+        print(f"[Test] ✅ mine_range（4 路）與 compute_pow 一致", flush=True)
+    else:
+        print(f"[Test] ❌ mine_range（4 路）結果與 compute_pow 不一致！", flush=True)
+    return ok
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # 常數
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -172,75 +250,236 @@ BANNER = """
 # HeavyHash（純 Python fallback）
 # ═══════════════════════════════════════════════════════════════════════════════
 
+U64_MASK = 0xFFFFFFFFFFFFFFFF
+NONCE_LANE_BITS = 48  # 區段模式：worker_id 佔 nonce 最高 16 bits，低 48 bits 是該 worker 的區段
+BATCH_SECONDS = 0.05  # worker 每批目標耗時：太大換 template 反應慢，太小每批的 Python 開銷變明顯
+_NIBBLE_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)  # 每個 u64 拆 16 個 nibble，低位先
+# byte → (高 4 bits, 低 4 bits)，float32 直接當 heavy_hash 的向量
+_NIBBLE_LUT = np.stack([np.arange(256) >> 4, np.arange(256) & 0x0F], axis=1).astype(np.float32)
+
 if not USE_CYTHON:
-    def xoshiro256_next(state: np.ndarray) -> int:
-        result = np.uint64((np.uint64(state[0]) + np.uint64(state[3])))
-        result = np.uint64((result << 23 | result >> 41) + state[0])
-        t = np.uint64(state[1] << 17)
-        state[2] ^= state[0]
-        state[3] ^= state[1]
-        state[1] ^= state[2]
-        state[0] ^= state[3]
-        state[2] ^= t
-        state[3] = np.uint64(state[3] << 45 | state[3] >> 19)
-        return int(result)
+    def xoshiro256_bulk(state: list, n_words: int) -> np.ndarray:
+        """xoshiro256++ 連續產生 n_words 個 u64（state 是 4 個 Python int，原地推進）
+        
+        矩陣必須是同一條 stream 依序產生（rusty-kaspa 的定義），不能拆成多條並行 lane；
+        所以這裡只去掉每步的 np.uint64 物件，改用 Python int + & U64_MASK。
+        """
+        s0, s1, s2, s3 = state
+        out = [0] * n_words
+        for i in range(n_words):
+            result = (s0 + s3) & U64_MASK
+            out[i] = ((((result << 23) | (result >> 41)) & U64_MASK) + s0) & U64_MASK
+            t = (s1 << 17) & U64_MASK
+            s2 ^= s0
+            s3 ^= s1
+            s1 ^= s2
+            s0 ^= s3
+            s2 ^= t
+            s3 = ((s3 << 45) | (s3 >> 19)) & U64_MASK
+        state[0], state[1], state[2], state[3] = s0, s1, s2, s3
+        return np.array(out, dtype=np.uint64)
 
     def compute_matrix_rank(matrix: np.ndarray) -> int:
+        """高斯消元求秩：pivot 選擇與 EPS 同 rusty-kaspa，每個 pivot 的歸一化/消元用整列廣播"""
         EPS = 1e-9
-        mat = matrix.astype(np.float64).copy()
+        mat = matrix.astype(np.float64)
         rank = 0
-        row_selected = [False] * 64
+        row_selected = np.zeros(64, dtype=bool)
         for i in range(64):
-            j = 0
-            while j < 64:
-                if not row_selected[j] and abs(mat[j, i]) > EPS:
-                    break
-                j += 1
-            if j != 64:
-                rank += 1
-                row_selected[j] = True
-                for p in range(i + 1, 64):
-                    mat[j, p] /= mat[j, i]
-                for k in range(64):
-                    if k != j and abs(mat[k, i]) > EPS:
-                        for p in range(i + 1, 64):
-                            mat[k, p] -= mat[j, p] * mat[k, i]
+            nonzero = np.abs(mat[:, i]) > EPS
+            candidates = np.flatnonzero(nonzero & ~row_selected)
+            if candidates.size == 0:
+                continue
+            j = candidates[0]
+            rank += 1
+            row_selected[j] = True
+            mat[j, i + 1:] /= mat[j, i]
+            # 所有 k != j 且 mat[k][i] 非零的行一次消元
+            nonzero[j] = False
+            rows = np.flatnonzero(nonzero)
+            if rows.size:
+                mat[rows, i + 1:] -= mat[j, i + 1:] * mat[rows, i:i + 1]
         return rank
 
-    def generate_matrix(hash_bytes: bytes) -> np.ndarray:
-        state = np.zeros(4, dtype=np.uint64)
-        for i in range(4):
-            state[i] = int.from_bytes(hash_bytes[i*8:(i+1)*8], 'little')
+    def generate_matrix_python(hash_bytes: bytes) -> np.ndarray:
+        """64x64 矩陣（float32：元素 0..15，heavy_hash 直接走 BLAS sgemv）"""
+        state = bytes_to_hash_values(hash_bytes)
         while True:
-            matrix = np.zeros((64, 64), dtype=np.uint16)
-            for i in range(64):
-                for j in range(0, 64, 16):
-                    value = xoshiro256_next(state)
-                    for k in range(16):
-                        matrix[i, j + k] = (value >> (4 * k)) & 0x0F
+            # 每列 4 個 u64，一次產生 256 個再整批拆 nibble（取代 i/j/k 三層迴圈）
+            words = xoshiro256_bulk(state, 256)
+            matrix = ((words[:, None] >> _NIBBLE_SHIFTS) & 0x0F).astype(np.float32).reshape(64, 64)
             if compute_matrix_rank(matrix) == 64:
                 return matrix
 
+    # heavy_hash 的 scratch：nibble 向量與 sgemv 結果每個 nonce 重用（worker 是單執行緒）
+    _HH_VEC = np.empty(64, dtype=np.float32)
+    _HH_PROD = np.empty(64, dtype=np.float32)
+
     def heavy_hash(matrix: np.ndarray, hash_bytes: bytes) -> bytes:
         header_arr = np.frombuffer(hash_bytes, dtype=np.uint8)
-        v = np.zeros(64, dtype=np.uint16)
-        v[0::2] = (header_arr >> 4) & 0x0F
-        v[1::2] = header_arr & 0x0F
-        p = np.dot(matrix.astype(np.uint64), v.astype(np.uint64))
+        np.take(_NIBBLE_LUT, header_arr, axis=0, out=_HH_VEC.reshape(32, 2))
+        # float32 sgemv：每列內積最大 64*15*15 = 14400 < 2^24，結果是精確整數
+        np.dot(matrix, _HH_VEC, out=_HH_PROD)
+        p = _HH_PROD.astype(np.int32)
         p = (p >> 10) & 0x0F
-        digest = bytearray(32)
-        for i in range(32):
-            high4 = int(p[i * 2]) & 0x0F
-            low4 = int(p[i * 2 + 1]) & 0x0F
-            digest[i] = hash_bytes[i] ^ ((high4 << 4) | low4)
-        h = cSHAKE256.new(data=bytes(digest), custom=b"HeavyHash")
+        digest = header_arr ^ ((p[0::2] << 4) | p[1::2]).astype(np.uint8)
+        h = cSHAKE256.new(data=digest.tobytes(), custom=b"HeavyHash")
         return h.read(32)
 
+    def compute_pow_input(pow_input, matrix: np.ndarray) -> bytes:
+        """pow_input 是完整的 80 bytes（worker 重用同一塊 bytearray，每個 nonce 只改最後 8 bytes）
+        
+        傳進來前先轉成 bytes：pycryptodome 的 cffi 後端吃 bytearray 反而每次多約 3 µs
+        """
+        h = cSHAKE256.new(data=pow_input, custom=b"ProofOfWorkHash")
+        return heavy_hash(matrix, h.read(32))
+
     def compute_pow_python(pre_pow_hash: bytes, timestamp: int, nonce: int, matrix: np.ndarray) -> bytes:
+        if USE_NUMBA:
+            return pow_hash_numba(*numba_template(pre_pow_hash, timestamp, matrix), np.uint64(nonce)).tobytes()
         data = pre_pow_hash + struct.pack('<Q', timestamp) + (b'\x00' * 32) + struct.pack('<Q', nonce)
-        h = cSHAKE256.new(data=data, custom=b"ProofOfWorkHash")
-        pow_hash = h.read(32)
-        return heavy_hash(matrix, pow_hash)
+        return compute_pow_input(data, matrix)
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# HeavyHash（Numba JIT fallback）
+# ═══════════════════════════════════════════════════════════════════════════════
+
+KECCAK_RATE = 136
+
+def _left_encode(x: int) -> bytes:
+    """NIST SP 800-185 left_encode"""
+    n = max(1, (x.bit_length() + 7) // 8)
+    return bytes([n]) + x.to_bytes(n, 'big')
+
+def cshake256_prefix(custom: bytes) -> bytes:
+    """bytepad(encode_string(N) || encode_string(S), 136)，N 為空"""
+    body = _left_encode(KECCAK_RATE) + _left_encode(0) + _left_encode(len(custom) * 8) + custom
+    return body + b'\x00' * (-len(body) % KECCAK_RATE)
+
+if USE_NUMBA:
+    # 有明確 signature，import 時就編譯好（cache=True 之後直接讀快取），fork 出來的 worker 直接沿用
+    _NB_OPTS = dict(cache=True, boundscheck=False, error_model='numpy')
+
+    _KECCAK_RC = np.array([
+        0x0000000000000001, 0x0000000000008082, 0x800000000000808a, 0x8000000080008000,
+        0x000000000000808b, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+        0x000000000000008a, 0x0000000000000088, 0x0000000080008009, 0x000000008000000a,
+        0x000000008000808b, 0x800000000000008b, 0x8000000000008089, 0x8000000000008003,
+        0x8000000000008002, 0x8000000000000080, 0x000000000000800a, 0x800000008000000a,
+        0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+    ], dtype=np.uint64)
+    _KECCAK_ROTC = np.array([1, 3, 6, 10, 15, 21, 28, 36, 45, 55, 2, 14,
+                             27, 41, 56, 8, 25, 43, 62, 18, 39, 61, 20, 44], dtype=np.uint64)
+    _KECCAK_PILN = np.array([10, 7, 11, 17, 18, 3, 5, 16, 8, 21, 24, 4,
+                             15, 23, 19, 13, 12, 2, 20, 14, 22, 9, 6, 1], dtype=np.int64)
+
+    @njit('void(uint64[::1])', **_NB_OPTS)
+    def _keccak_f(st):
+        bc = np.empty(5, dtype=np.uint64)
+        one = np.uint64(1)
+        u64 = np.uint64(64)
+        for r in range(24):
+            for i in range(5):
+                bc[i] = st[i] ^ st[i + 5] ^ st[i + 10] ^ st[i + 15] ^ st[i + 20]
+            for i in range(5):
+                x = bc[(i + 1) % 5]
+                t = bc[(i + 4) % 5] ^ ((x << one) | (x >> (u64 - one)))
+                for j in range(0, 25, 5):
+                    st[j + i] ^= t
+            t = st[1]
+            for i in range(24):
+                j = _KECCAK_PILN[i]
+                n = _KECCAK_ROTC[i]
+                x = st[j]
+                st[j] = (t << n) | (t >> (u64 - n))
+                t = x
+            for j in range(0, 25, 5):
+                for i in range(5):
+                    bc[i] = st[j + i]
+                for i in range(5):
+                    st[j + i] ^= ~bc[(i + 1) % 5] & bc[(i + 2) % 5]
+            st[0] ^= _KECCAK_RC[r]
+
+    @njit('void(uint64[::1], uint64[::1], uint64[::1], uint16[:, ::1], uint64, '
+          'uint64[::1], uint16[::1], uint64[::1])', **_NB_OPTS)
+    def _heavy_pow(pow_state, heavy_state, header, matrix, nonce, st, vec, out):
+        """單一 nonce 的 PoW，結果寫進 out（4 lanes，little-endian）"""
+        # cSHAKE256("ProofOfWorkHash")：80 bytes 一個 block
+        st[:] = pow_state
+        for i in range(9):
+            st[i] ^= header[i]
+        st[9] ^= nonce
+        st[10] ^= np.uint64(0x04)
+        st[16] ^= np.uint64(0x8000000000000000)
+        _keccak_f(st)
+        # 32 bytes → 64 個 nibble（每個 byte 高 4 bits 先）
+        for i in range(32):
+            b = (st[i >> 3] >> np.uint64((i & 7) * 8)) & np.uint64(0xFF)
+            vec[2 * i] = np.uint16(b >> np.uint64(4))
+            vec[2 * i + 1] = np.uint16(b & np.uint64(0x0F))
+        # 64x64 乘法 + (sum >> 10) & 0xF，兩列合成一個 byte 後 XOR 回 hash
+        # 全程 uint16：每列最大 64 × 225 = 14400 < 65536
+        for i in range(4):
+            out[i] = st[i]
+        for i in range(32):
+            hi = np.uint16(0)
+            lo = np.uint16(0)
+            for c in range(64):
+                hi += matrix[2 * i, c] * vec[c]
+                lo += matrix[2 * i + 1, c] * vec[c]
+            d = np.uint64((((hi >> np.uint16(10)) & np.uint16(0x0F)) << np.uint16(4))
+                          | ((lo >> np.uint16(10)) & np.uint16(0x0F)))
+            out[i >> 3] ^= d << np.uint64((i & 7) * 8)
+        # cSHAKE256("HeavyHash")：32 bytes
+        st[:] = heavy_state
+        for i in range(4):
+            st[i] ^= out[i]
+        st[4] ^= np.uint64(0x04)
+        st[16] ^= np.uint64(0x8000000000000000)
+        _keccak_f(st)
+        for i in range(4):
+            out[i] = st[i]
+
+    @njit('uint64[::1](uint64[::1], uint64[::1], uint64[::1], uint16[:, ::1], uint64)', **_NB_OPTS)
+    def pow_hash_numba(pow_state, heavy_state, header, matrix, nonce):
+        st = np.empty(25, dtype=np.uint64)
+        vec = np.empty(64, dtype=np.uint16)
+        out = np.empty(4, dtype=np.uint64)
+        _heavy_pow(pow_state, heavy_state, header, matrix, nonce, st, vec, out)
+        return out
+
+    @njit('int64(uint64[::1], uint64[::1], uint64[::1], uint16[:, ::1], uint64, int64, uint64[::1])',
+          **_NB_OPTS)
+    def scan_numba(pow_state, heavy_state, header, matrix, nonce_start, count, target):
+        """掃描 [nonce_start, nonce_start + count)，回傳第一個 hash < target 的偏移，沒有就 -1"""
+        st = np.empty(25, dtype=np.uint64)
+        vec = np.empty(64, dtype=np.uint16)
+        out = np.empty(4, dtype=np.uint64)
+        for k in range(count):
+            _heavy_pow(pow_state, heavy_state, header, matrix, nonce_start + np.uint64(k), st, vec, out)
+            # 256-bit little-endian 比較：最高 lane 先
+            for i in range(3, -1, -1):
+                if out[i] != target[i]:
+                    if out[i] < target[i]:
+                        return k
+                    break
+        return -1
+
+    @njit('uint64[::1](uint64[::1])', **_NB_OPTS)
+    def _absorb_prefix(prefix):
+        st = np.zeros(25, dtype=np.uint64)
+        for i in range(17):
+            st[i] ^= prefix[i]
+        _keccak_f(st)
+        return st
+
+    POW_STATE = _absorb_prefix(np.frombuffer(cshake256_prefix(b"ProofOfWorkHash"), dtype='<u8').copy())
+    HEAVY_STATE = _absorb_prefix(np.frombuffer(cshake256_prefix(b"HeavyHash"), dtype='<u8').copy())
+
+    def numba_template(pre_pow_hash: bytes, timestamp: int, matrix) -> tuple:
+        """每個 template 一次：(pow_state, heavy_state, header 9 lanes, uint16 矩陣)，都是可寫的 C-contiguous"""
+        header = np.frombuffer(pre_pow_hash + struct.pack('<Q', timestamp) + b'\x00' * 32, dtype='<u8').copy()
+        return POW_STATE, HEAVY_STATE, header, np.array(matrix_u16(matrix), dtype=np.uint16)
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # PoW 計算（Cython 或 Python）
@@ -272,7 +511,13 @@ def generate_matrix(pre_pow_hash: bytes):
         return kaspa_pow_py.gen_matrix(pre_pow_hash)
     elif USE_CYTHON:
         return kaspa_pow_v2.generate_matrix(pre_pow_hash)
-    return None
+    return generate_matrix_python(pre_pow_hash)
+
+def matrix_u16(matrix) -> np.ndarray:
+    """任何後端生成的矩陣 → 64x64 uint16（Rust 的是 little-endian u16 bytes）"""
+    if isinstance(matrix, (bytes, bytearray)):
+        return np.frombuffer(matrix, dtype='<u2').reshape(64, 64)
+    return np.asarray(matrix).astype(np.uint16, copy=False)
 
 def hash_to_int(hash_bytes: bytes) -> int:
     return int.from_bytes(hash_bytes, 'little')
@@ -301,156 +546,424 @@ def target_to_bytes(target: int) -> bytes:
 
 import hashlib
 
+# 格式字串只解析一次
+_pack_u64 = struct.Struct('<Q').pack
+_pack_header_head = struct.Struct('<HQ').pack      # version, parents 層數
+_pack_header_tail = struct.Struct('<QIQQQ').pack   # timestamp = 0, bits, nonce = 0, daaScore, blueScore
+
 def hash_from_hex(hex_str: str) -> bytes:
     if not hex_str:
         return b'\x00' * 32
     return bytes.fromhex(hex_str)
 
-def write_len(hasher, length: int):
-    hasher.update(struct.pack('<Q', length))
-
-def write_var_bytes(hasher, data: bytes):
-    write_len(hasher, len(data))
-    hasher.update(data)
+def hashes_from_hex(hex_list) -> bytes:
+    """多個 hash 一次解碼（空字串仍是 32 bytes 的 0）"""
+    joined = ''.join(hex_list)
+    if len(joined) == 64 * len(hex_list):
+        return bytes.fromhex(joined)
+    return b''.join(hash_from_hex(h) for h in hex_list)
 
-def write_blue_work(hasher, blue_work: str):
+def blue_work_bytes(blue_work: str) -> bytes:
+    """blue_work (BigInt hex) → 去掉前導零的 big-endian bytes"""
     if not blue_work:
-        write_var_bytes(hasher, b'')
-        return
-    hex_str = blue_work
-    if len(hex_str) % 2 == 1:
-        hex_str = '0' + hex_str
-    work_bytes = bytes.fromhex(hex_str)
-    start = 0
-    while start < len(work_bytes) and work_bytes[start] == 0:
-        start += 1
-    write_var_bytes(hasher, work_bytes[start:])
+        return b''
+    n = int(blue_work, 16)
+    return n.to_bytes((n.bit_length() + 7) // 8, 'big')
+
+def serialize_pre_pow(header) -> bytes:
+    """pre-PoW hash 的完整 blake2b 輸入（timestamp、nonce 填 0，與 rusty-kaspa 一致）"""
+    parents = header.parents
+    buf = bytearray(_pack_header_head(header.version, len(parents)))
+    for level in parents:
+        hashes = level.parentHashes
+        buf += _pack_u64(len(hashes))
+        buf += hashes_from_hex(hashes)
+    buf += hash_from_hex(header.hashMerkleRoot)
+    buf += hash_from_hex(header.acceptedIdMerkleRoot)
+    buf += hash_from_hex(header.utxoCommitment)
+    buf += _pack_header_tail(0, header.bits, 0, header.daaScore, header.blueScore)
+    work = blue_work_bytes(header.blueWork)
+    buf += _pack_u64(len(work))
+    buf += work
+    buf += hash_from_hex(header.pruningPoint)
+    return bytes(buf)
+
+def _pre_pow_key(header) -> tuple:
+    """pre-PoW 用到的所有欄位（不含 timestamp/nonce）"""
+    return (header.version, tuple(tuple(level.parentHashes) for level in header.parents),
+            header.hashMerkleRoot, header.acceptedIdMerkleRoot, header.utxoCommitment,
+            header.bits, header.daaScore, header.blueScore, header.blueWork, header.pruningPoint)
+
+# keyed blake2b 的 key block 只壓縮一次，每個 header 從這裡 copy()
+_BLOCK_HASHER = hashlib.blake2b(digest_size=32, key=b"BlockHash")
+
+_pre_pow_cache = (None, None)  # (key, pre_pow_hash)：每 0.5 秒 poll 通常拿到同一個 header
 
 def calculate_pre_pow_hash(header) -> bytes:
     # 🔑 重要：必須使用帶 key 的 blake2b！key="BlockHash"
     # 參考 rusty-kaspa/crypto/hashes/src/hashers.rs
-    hasher = hashlib.blake2b(digest_size=32, key=b"BlockHash")
-    hasher.update(struct.pack('<H', header.version))
-    parents = list(header.parents)
-    write_len(hasher, len(parents))
-    for level in parents:
-        parent_hashes = list(level.parentHashes)
-        write_len(hasher, len(parent_hashes))
-        for h in parent_hashes:
-            hasher.update(hash_from_hex(h))
-    hasher.update(hash_from_hex(header.hashMerkleRoot))
-    hasher.update(hash_from_hex(header.acceptedIdMerkleRoot))
-    hasher.update(hash_from_hex(header.utxoCommitment))
-    hasher.update(struct.pack('<Q', 0))
-    hasher.update(struct.pack('<I', header.bits))
-    hasher.update(struct.pack('<Q', 0))
-    hasher.update(struct.pack('<Q', header.daaScore))
-    hasher.update(struct.pack('<Q', header.blueScore))
-    write_blue_work(hasher, header.blueWork)
-    hasher.update(hash_from_hex(header.pruningPoint))
-    return hasher.digest()
+    # 整個 header 先序列化成一個 buffer，blake2b 一次算完；同一個 header 只算一次
+    global _pre_pow_cache
+    key = _pre_pow_key(header)
+    if key == _pre_pow_cache[0]:
+        return _pre_pow_cache[1]
+    if CYTHON_PRE_POW:
+        # hex 在這裡解碼，序列化 + blake2b 在 C 層一次完成
+        pre_pow_hash = kaspa_pow_v2.pre_pow_hash(
+            header.version, [hashes_from_hex(level.parentHashes) for level in header.parents],
+            hash_from_hex(header.hashMerkleRoot), hash_from_hex(header.acceptedIdMerkleRoot),
+            hash_from_hex(header.utxoCommitment), header.bits, header.daaScore, header.blueScore,
+            blue_work_bytes(header.blueWork), hash_from_hex(header.pruningPoint))
+    else:
+        hasher = _BLOCK_HASHER.copy()
+        hasher.update(serialize_pre_pow(header))
+        pre_pow_hash = hasher.digest()
+    _pre_pow_cache = (key, pre_pow_hash)
+    return pre_pow_hash
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# 共享 Template（SharedMemory + seqlock）
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class TemplateBlob(ctypes.Structure):
+    """SharedMemory 裡的 template：矩陣由主進程生成一次，workers 直接複製"""
+    _fields_ = [
+        ('matrix', (ctypes.c_uint16 * 64) * 64),  # 8 KB，與 gen_matrix() 的 bytes 同格式
+        ('pre_pow_hash', ctypes.c_uint8 * 32),
+        ('timestamp', ctypes.c_uint64),
+        ('target', ctypes.c_uint8 * 32),     # little-endian
+        ('template_id', ctypes.c_double),    # 主進程 template_cache 的 key（time.time()）
+    ]
+
+class SharedTemplate:
+    """主進程寫、workers 讀的 template（取代 Manager dict，沒有任何 IPC round-trip）
+    
+    seq 是 seqlock：奇數 = 主進程寫入中；worker 讀前後 seq 相同才算讀到完整的一份。
+    只有主進程寫，所以 seq 用 RawValue（不需要鎖），worker 每批比對 seq.value 就知道 template 有沒有換。
+    ready 在第一個 template 寫入後 set，worker 啟動時等它，不用 sleep 輪詢。
+    """
+    
+    def __init__(self):
+        self.shm = SharedMemory(create=True, size=ctypes.sizeof(TemplateBlob))
+        self.seq = RawValue('Q', 0)
+        self.ready = Event()
+        self.matrix = np.empty((64, 64), dtype=np.uint16)
+    
+    def publish(self, template: dict):
+        """主進程：寫入新 template"""
+        blob = TemplateBlob.from_buffer(self.shm.buf)
+        self.seq.value += 1
+        np.ctypeslib.as_array(blob.matrix)[:] = matrix_u16(template['matrix'])
+        ctypes.memmove(blob.pre_pow_hash, template['pre_pow_hash'], 32)
+        blob.timestamp = template['timestamp']
+        ctypes.memmove(blob.target, template['target_bytes'], 32)
+        blob.template_id = template['id']
+        self.seq.value += 1
+        del blob
+        self.ready.set()
+    
+    def read(self) -> Tuple[int, Optional[dict]]:
+        """Worker：讀取目前 template，回傳 (seq, template)；還沒有 template 時是 (0, None)"""
+        while True:
+            seq = self.seq.value
+            if seq == 0:
+                return 0, None
+            if seq & 1:
+                time.sleep(0.001)
+                continue
+            blob = TemplateBlob.from_buffer(self.shm.buf)
+            pre_pow_hash = bytes(blob.pre_pow_hash)
+            timestamp = blob.timestamp
+            target_bytes = bytes(blob.target)
+            template_id = blob.template_id
+            np.copyto(self.matrix, np.ctypeslib.as_array(blob.matrix))
+            del blob
+            if self.seq.value == seq:
+                return seq, {
+                    'pre_pow_hash': pre_pow_hash,
+                    'timestamp': timestamp,
+                    'target': int.from_bytes(target_bytes, 'little'),
+                    'target_bytes': target_bytes,
+                    'id': template_id,
+                    'matrix': self.matrix,
+                }
+    
+    def release(self):
+        """主進程：關閉並刪除共享記憶體"""
+        self.shm.close()
+        self.shm.unlink()
+
+class FoundRing:
+    """Workers 寫、主進程讀的結果 ring（取代 mp.Queue：不 pickle、沒有 feeder thread）
+    
+    head 是所有 worker 共用的寫入計數（帶鎖）；tail 只有主進程用，不共享。
+    posted 在每次 push 後 set，主循環阻塞在 wait() 上，找到就醒來，不用 sleep 輪詢。
+    主進程落後超過 SIZE 筆時最舊的會被覆蓋（實際 difficulty 下幾乎不可能）。
+    """
+    
+    SIZE = 128
+    
+    def __init__(self):
+        self.nonces = RawArray('Q', self.SIZE)
+        self.template_ids = RawArray('d', self.SIZE)
+        self.worker_ids = RawArray('i', self.SIZE)
+        self.head = Value('Q', 0)
+        self.posted = Event()
+        self.tail = 0
+    
+    def push(self, worker_id: int, nonce: int, template_id: float):
+        """Worker：寫入一筆結果（slot 寫完才推進 head）"""
+        with self.head.get_lock():
+            idx = self.head.value % self.SIZE
+            self.nonces[idx] = nonce
+            self.template_ids[idx] = template_id
+            self.worker_ids[idx] = worker_id
+            self.head.value += 1
+        self.posted.set()
+    
+    def wait(self, timeout: float) -> List[Tuple[int, int, float]]:
+        """主進程：等到有新結果（或 timeout）再 drain；先 clear 再 drain，不會漏掉 push"""
+        self.posted.wait(timeout)
+        self.posted.clear()
+        return self.drain()
+    
+    def drain(self) -> List[Tuple[int, int, float]]:
+        """主進程：取出所有新結果 [(worker_id, nonce, template_id), ...]"""
+        head = self.head.value
+        if head == self.tail:
+            return []
+        start = max(self.tail, head - self.SIZE)
+        results = []
+        for i in range(start, head):
+            idx = i % self.SIZE
+            results.append((self.worker_ids[idx], self.nonces[idx], self.template_ids[idx]))
+        self.tail = head
+        return results
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # Worker 進程
 # ═══════════════════════════════════════════════════════════════════════════════
 
+def physical_cpus() -> List[int]:
+    """可用的 CPU 排序：每個實體核心先取一個，SMT sibling 排在最後
+    
+    拓撲來自 /proc/cpuinfo 的 (physical id, core id)；讀不到就照 CPU 編號。
+    worker 數不超過實體核心數時，兩個 worker 不會共用同一顆核心的 L1/L2。
+    """
+    cpus = sorted(os.sched_getaffinity(0))
+    topology = {}
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu, package = None, 0
+            for line in f:
+                key, _, value = line.partition(':')
+                key = key.strip()
+                if key == 'processor':
+                    cpu = int(value)
+                elif key == 'physical id':
+                    package = int(value)
+                elif key == 'core id' and cpu is not None:
+                    topology[cpu] = (package, int(value))
+    except (OSError, ValueError):
+        return cpus
+    
+    seen = set()
+    primary, siblings = [], []
+    for cpu in cpus:
+        core = topology.get(cpu, ('cpu', cpu))
+        if core in seen:
+            siblings.append(cpu)
+        else:
+            seen.add(core)
+            primary.append(cpu)
+    return primary + siblings
+
+def pin_worker(worker_id: int) -> Optional[int]:
+    """把 worker 綁在固定 CPU 上（矩陣留在同一顆核心的 L1/L2），回傳 CPU 編號；不支援的平台就略過
+    
+    順便試著 nice(-5)，沒有權限就維持原本的優先權。
+    """
+    try:
+        os.nice(-5)
+    except (AttributeError, OSError):
+        pass
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+    cpus = physical_cpus()
+    cpu = cpus[worker_id % len(cpus)]
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except OSError:
+        return None
+    return cpu
+
+def pin_main(num_workers: int) -> Optional[int]:
+    """主進程（gRPC、統計、提交）綁在 workers 沒用到的第一個 CPU 上，不和 hasher 搶核心
+    
+    必須在 workers fork 之後呼叫（子進程繼承 fork 當下的 affinity）；沒有空的 CPU 就不綁。
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+    cpus = physical_cpus()
+    if num_workers >= len(cpus):
+        return None
+    cpu = cpus[num_workers]
+    try:
+        os.sched_setaffinity(0, {cpu})
+    except OSError:
+        return None
+    return cpu
+
+def lane_nonce(worker_id: int) -> int:
+    """區段模式的起點：每個 template 隨機一次，之後循序（worker 之間不會重疊，與 worker 數無關）"""
+    return (worker_id << NONCE_LANE_BITS) | random.getrandbits(NONCE_LANE_BITS)
+
 def worker_process(
     worker_id: int,
-    shared_state: dict,
-    result_queue: mp.Queue,
-    stats_array: mp.Array,
-    running: mp.Value
+    shared_template: SharedTemplate,
+    found_ring: FoundRing,
+    stats_array: ctypes.Array,
+    running: mp.Value,
+    num_workers: int,
+    random_nonce: bool
 ):
     """Worker 進程 - Rust 優化版"""
     
     log_prefix = f"[Worker {worker_id}]"
-    local_hashes = 0
-    last_report = time.time()
+    cpu = pin_worker(worker_id)
+    print(f"{log_prefix} 📌 CPU {cpu if cpu is not None else '-'}", flush=True)
+    total_hashes = 0        # 單調累加，每批直接寫進 stats_array（RawArray，無鎖），主進程自己算差值
+    batch_size = None       # 第一批量時間後校準成 ~BATCH_SECONDS
+    calibrate_start = None
+    seq_value = shared_template.seq
+    push = found_ring.push
     
     # Worker 自己的模板緩存
     cached_pre_pow_hash = None
     cached_matrix = None  # for non-Rust fallback
+    pow_input = None      # 純 Python：每個 template 一塊 80 bytes 輸入
+    pack_into = struct.pack_into
     
     while running.value:
-        template_data = shared_state.get('template')
+        template_seq, template_data = shared_template.read()
         if not template_data:
-            time.sleep(0.1)
+            shared_template.ready.wait(timeout=0.1)
             continue
         
         pre_pow_hash = template_data['pre_pow_hash']
         timestamp = template_data['timestamp']
-        target = template_data['target']
         template_id = template_data['id']
-        target_bytes = template_data.get('target_bytes', b'\xff' * 32)
-        
-        num_workers = shared_state.get('num_workers', 4)
-        random_nonce = shared_state.get('random_nonce', False)
+        target_bytes = template_data['target_bytes']
+        matrix = template_data['matrix']  # 主進程生成好的 uint16 矩陣
+        # fallback 比較用：最高 byte 先篩，通過的才用反轉後的 bytes 比（big-endian 字典序 = 數值大小）
+        target_top = target_bytes[31]
+        target_be = target_bytes[::-1]
         
         # 當 template 改變時，更新 Rust 狀態
         if pre_pow_hash != cached_pre_pow_hash:
             if USE_RUST:
-                # 使用新 API: setup_mining 會生成矩陣並保存狀態
-                kaspa_pow_py.setup_mining(pre_pow_hash, timestamp, target_bytes)
+                # setup_mining 保存狀態；新版直接用主進程的矩陣，不在每個 worker 重新生成
+                if RUST_SETUP_MATRIX:
+                    kaspa_pow_py.setup_mining(pre_pow_hash, timestamp, target_bytes, matrix.tobytes())
+                else:
+                    kaspa_pow_py.setup_mining(pre_pow_hash, timestamp, target_bytes)
             elif USE_CYTHON:
-                cached_matrix = kaspa_pow_v2.generate_matrix(pre_pow_hash)
+                cached_matrix = scan_operand(matrix) if USE_CYTHON_SCAN else matrix
+                # scan() 的固定 72 bytes：pre_pow_hash || timestamp || zeros(32)
+                scan_prefix = pre_pow_hash + struct.pack('<Q', timestamp) + (b'\x00' * 32)
+            elif USE_NUMBA:
+                numba_args = numba_template(pre_pow_hash, timestamp, matrix)
+                target_words = np.frombuffer(target_bytes, dtype='<u8').copy()
             else:
-                cached_matrix = generate_matrix_python(pre_pow_hash)
+                cached_matrix = matrix.astype(np.float32)
+                # pre_pow_hash || timestamp || zeros(32) || nonce：前 72 bytes 整個 template 不變
+                pow_input = bytearray(pre_pow_hash + struct.pack('<Q', timestamp) + bytes(40))
             cached_pre_pow_hash = pre_pow_hash
         
         # 計算起始 nonce
         if random_nonce:
             start_nonce = random.randint(0, 0xFFFFFFFFFFFFFFFF)
         else:
-            chunk_size = 0xFFFFFFFFFFFFFFFF // num_workers
-            start_nonce = worker_id * chunk_size + random.randint(0, chunk_size // 1000)
+            start_nonce = lane_nonce(worker_id)
         
-        # 挖礦循環
-        if USE_RUST:
-            batch_size = 50000  # 新 API 可以用更大 batch
-        elif USE_CYTHON:
-            batch_size = 5000
-        else:
-            batch_size = 1000
+        # 挖礦循環（batch 大小只在第一批前給初值）
+        if batch_size is None:
+            if USE_RUST or USE_CYTHON_SCAN:
+                batch_size = 50000  # 整批在原生層跑，可以用更大 batch
+            elif USE_NUMBA:
+                batch_size = 10000
+            elif USE_CYTHON:
+                batch_size = 5000
+            else:
+                batch_size = 1000
+            calibrate_start = time.perf_counter()
+            calibrate_hashes = total_hashes
         
         nonce = start_nonce
         
-        while running.value and shared_state.get('template', {}).get('id') == template_id:
+        while running.value and seq_value.value == template_seq:
             if USE_RUST:
                 # 使用新 API: mine_range 在 Rust 內部迴圈
-                found_nonce, pow_hash, hashes_done = kaspa_pow_py.mine_range(
+                found_nonce, _, hashes_done = kaspa_pow_py.mine_range(
                     nonce, batch_size, random_nonce
                 )
-                local_hashes += hashes_done
+                total_hashes += hashes_done
                 
                 if found_nonce is not None:
-                    result_queue.put({
-                        'type': 'found',
-                        'worker_id': worker_id,
-                        'nonce': found_nonce,
-                        'hash': pow_hash.hex() if pow_hash else '',
-                        'template_id': template_id
-                    })
+                    push(worker_id, found_nonce, template_id)
                     print(f"{log_prefix} 💎 FOUND nonce={found_nonce}", flush=True)
                 
                 if random_nonce:
                     nonce = random.randint(0, 0xFFFFFFFFFFFFFFFF)
                 else:
                     nonce += batch_size
+            elif USE_CYTHON_SCAN:
+                # 整批在 C 層（nogil）掃描，找到時回報後從下一個 nonce 續掃
+                start, count = nonce, batch_size
+                while count > 0:
+                    found_nonce = kaspa_pow_v3.scan(cached_matrix, scan_prefix, start, count, target_bytes)
+                    if found_nonce is None:
+                        break
+                    push(worker_id, found_nonce, template_id)
+                    print(f"{log_prefix} 💎 FOUND nonce={found_nonce}", flush=True)
+                    count -= ((found_nonce - start) & U64_MASK) + 1
+                    start = (found_nonce + 1) & U64_MASK
+                total_hashes += batch_size
+                
+                if random_nonce:
+                    nonce = random.randint(0, 0xFFFFFFFFFFFFFFFF)
+                else:
+                    nonce = (nonce + batch_size) & U64_MASK
+            elif USE_NUMBA:
+                # 同 Cython scan：整批在 JIT 迴圈裡掃，找到時回報後從下一個 nonce 續掃
+                start, count = nonce, batch_size
+                while count > 0:
+                    k = scan_numba(*numba_args, np.uint64(start), count, target_words)
+                    if k < 0:
+                        break
+                    found_nonce = (start + k) & U64_MASK
+                    push(worker_id, found_nonce, template_id)
+                    print(f"{log_prefix} 💎 FOUND nonce={found_nonce}", flush=True)
+                    count -= k + 1
+                    start = (found_nonce + 1) & U64_MASK
+                total_hashes += batch_size
+                
+                if random_nonce:
+                    nonce = random.randint(0, 0xFFFFFFFFFFFFFFFF)
+                else:
+                    nonce = (nonce + batch_size) & U64_MASK
             else:
                 # Fallback: 舊的逐個計算方式
                 for _ in range(batch_size):
-                    pow_hash = compute_pow(pre_pow_hash, timestamp, nonce, cached_matrix)
-                    hash_val = hash_to_int(pow_hash)
-                    local_hashes += 1
+                    if pow_input is None:
+                        pow_hash = compute_pow(pre_pow_hash, timestamp, nonce, cached_matrix)
+                    else:
+                        pack_into('<Q', pow_input, 72, nonce)
+                        pow_hash = compute_pow_input(bytes(pow_input), cached_matrix)
+                    total_hashes += 1
                     
-                    if hash_val < target:
-                        result_queue.put({
-                            'type': 'found',
-                            'worker_id': worker_id,
-                            'nonce': nonce,
-                            'hash': pow_hash.hex(),
-                            'template_id': template_id
-                        })
+                    if pow_hash[31] <= target_top and pow_hash[::-1] < target_be:
+                        push(worker_id, nonce, template_id)
                         print(f"{log_prefix} 💎 FOUND nonce={nonce}", flush=True)
                     
                     if random_nonce:
@@ -458,11 +971,13 @@ def worker_process(
                     else:
                         nonce += 1
             
-            now = time.time()
-            if now - last_report >= 1.0:
-                stats_array[worker_id] = local_hashes
-                local_hashes = 0
-                last_report = now
+            stats_array[worker_id] = total_hashes
+            if calibrate_start is not None:
+                # 用第一批實際做的 hash 數換算，之後每批固定大小，不用每批讀時鐘
+                elapsed = time.perf_counter() - calibrate_start
+                done = total_hashes - calibrate_hashes
+                batch_size = max(100, int(done * BATCH_SECONDS / max(elapsed, 1e-6)))
+                calibrate_start = None
     
     print(f"{log_prefix} 停止", flush=True)
 
@@ -479,14 +994,11 @@ class ShioKazeMiner:
         self.num_workers = num_workers
         self.random_nonce = random_nonce
         
-        self.manager = Manager()
-        self.shared_state = self.manager.dict()
-        self.shared_state['num_workers'] = num_workers
-        self.shared_state['random_nonce'] = random_nonce
+        self.shared_template = SharedTemplate()
         
-        self.stats_array = Array('d', num_workers)
+        self.stats_array = RawArray('Q', num_workers)  # 每個 worker 累計的 hash 數（只有該 worker 寫）
         self.running = Value('b', True)
-        self.result_queue = mp.Queue()
+        self.found_ring = FoundRing()
         self.workers = []
         
         self.channel = None
@@ -570,7 +1082,8 @@ class ShioKazeMiner:
         for i in range(self.num_workers):
             p = Process(
                 target=worker_process,
-                args=(i, self.shared_state, self.result_queue, self.stats_array, self.running)
+                args=(i, self.shared_template, self.found_ring, self.stats_array, self.running,
+                      self.num_workers, self.random_nonce)
             )
             p.daemon = True
             p.start()
@@ -612,14 +1125,6 @@ class ShioKazeMiner:
             bits = header.bits
             target = bits_to_target(bits)
             
-            # 生成矩陣（Cython 或 Python）
-            if USE_CYTHON:
-                matrix = kaspa_pow_v2.generate_matrix(pre_pow_hash)
-            elif not USE_RUST:
-                matrix = generate_matrix(pre_pow_hash)
-            else:
-                matrix = None  # Rust 自己管理矩陣
-            
             return {
                 'block': block,
                 'pre_pow_hash': pre_pow_hash,
@@ -627,7 +1132,7 @@ class ShioKazeMiner:
                 'bits': bits,
                 'target': target,
                 'target_bytes': target_to_bytes(target),
-                'matrix': matrix,
+                'matrix': None,  # 確定是新 template 才生成（run() 發布前）
                 'id': time.time()
             }
             
@@ -642,16 +1147,8 @@ class ShioKazeMiner:
             timestamp = template['timestamp']
             target = template['target']
             
-            # 🔍 提交前自檢：重新計算 PoW 確認正確
-            if USE_RUST:
-                matrix = kaspa_pow_py.gen_matrix(pre_pow_hash)
-                verify_hash = kaspa_pow_py.compute_pow(pre_pow_hash, timestamp, nonce, matrix)
-            elif USE_CYTHON:
-                matrix = kaspa_pow_v2.generate_matrix(pre_pow_hash)
-                verify_hash = kaspa_pow_v2.compute_pow(pre_pow_hash, timestamp, nonce, matrix)
-            else:
-                matrix = generate_matrix(pre_pow_hash)
-                verify_hash = compute_pow_python(pre_pow_hash, timestamp, nonce, matrix)
+            # 🔍 提交前自檢：重新計算 PoW 確認正確（矩陣用發布 template 時生成的那份）
+            verify_hash = compute_pow(pre_pow_hash, timestamp, nonce, template['matrix'])
             
             verify_int = hash_to_int(verify_hash)
             
@@ -707,17 +1204,15 @@ class ShioKazeMiner:
             print(f"[Main] ❌ Submit error: {e}", flush=True)
             return False
     
-    def print_stats(self):
-        current_hashes = sum(self.stats_array)
-        self.total_hashes += current_hashes
+    def print_stats(self, elapsed: float):
+        total = sum(self.stats_array)
+        current_hashes = int((total - self.total_hashes) / max(elapsed, 1e-6))
+        self.total_hashes = total
         self.hashrate_history.append(current_hashes)
         
-        for i in range(self.num_workers):
-            self.stats_array[i] = 0
-        
         avg_hashrate = sum(self.hashrate_history) / max(len(self.hashrate_history), 1)
         
-        now = datetime.now().strftime("%H:%M:%S")
+        now = time.strftime("%H:%M:%S")
         
         # 顯示單位
         if avg_hashrate >= 1000000:
@@ -736,8 +1231,12 @@ class ShioKazeMiner:
         print(f"[Main] 🌊 ShioKaze v{__version__}", flush=True)
         if USE_RUST:
             mode = "🦀 Rust (10x 加速)"
+        elif USE_CYTHON_SCAN:
+            mode = "🐍 Cython (v3 scan)"
         elif USE_CYTHON:
             mode = "🐍 Cython"
+        elif USE_NUMBA:
+            mode = "⚡ Numba (JIT)"
         else:
             mode = "🐢 Pure Python"
         print(f"[Main] 🚀 Mode: {mode}", flush=True)
@@ -749,25 +1248,30 @@ class ShioKazeMiner:
         # 啟動前自檢
         if not run_self_test():
             print("[Main] ❌ 自檢失敗，停止挖礦！", flush=True)
+            self.shared_template.release()
             return
         print("", flush=True)
         
         if not self.connect():
+            self.shared_template.release()
             return
         
         self.start_workers()
+        cpu = pin_main(self.num_workers)
+        if cpu is not None:
+            print(f"[Main] 📌 CPU {cpu}", flush=True)
         self.start_time = time.time()
         
         current_template = None
         last_template_time = 0
-        last_stats_time = time.time()
+        last_stats_time = time.monotonic()
         
         try:
             consecutive_failures = 0
             max_failures = 10
             
             while self.running.value:
-                now = time.time()
+                now = time.monotonic()  # 間隔用 monotonic，不受系統校時影響
                 if now - last_template_time >= 0.5:
                     new_template = self.get_block_template()
                     
@@ -786,6 +1290,11 @@ class ShioKazeMiner:
                             
                             current_template = new_template
                             self.template_count += 1
+                            # 整個 template 只在主進程生成一次矩陣，workers 從共享記憶體複製
+                            # 同步生成即可：Rust / Cython 約 0.1 ms，Python（numba 也走 numpy 版）約 3 ms，
+                            # 都遠小於同一圈裡的 GetBlockTemplate RPC 與 found_ring 的 50ms 等待，
+                            # 而且每個新 template 只一次；找到的 nonce 最多晚幾 ms 提交
+                            new_template['matrix'] = generate_matrix(new_template['pre_pow_hash'])
                             
                             tid = new_template['id']
                             self.template_cache[tid] = new_template
@@ -794,48 +1303,37 @@ class ShioKazeMiner:
                                 old_id = self.template_ids.popleft()
                                 self.template_cache.pop(old_id, None)
                             
-                            # 不傳 matrix，讓 worker 自己生成（避免序列化問題）
-                            self.shared_state['template'] = {
-                                'pre_pow_hash': new_template['pre_pow_hash'],
-                                'timestamp': new_template['timestamp'],
-                                'target': new_template['target'],
-                                'target_bytes': new_template['target_bytes'],
-                                'id': new_template['id']
-                            }
+                            self.shared_template.publish(new_template)
                             
                             bits_hex = f"0x{new_template['bits']:08x}"
-                            print(f"[{datetime.now().strftime('%H:%M:%S')}] 🌊 "
+                            print(f"[{time.strftime('%H:%M:%S')}] 🌊 "
                                   f"Template #{self.template_count}: bits={bits_hex}", flush=True)
                     
                     last_template_time = now
                 
-                while not self.result_queue.empty():
-                    try:
-                        result = self.result_queue.get_nowait()
-                        if result['type'] == 'found':
-                            self.blocks_found += 1
-                            print(f"[Main] ✨ 💎 Found nonce: {result['nonce']}", flush=True)
-                            
-                            submit_template = self.template_cache.get(result['template_id'])
-                            if submit_template:
-                                if self.submit_block(submit_template, result['nonce']):
-                                    self.blocks_accepted += 1
-                            else:
-                                print(f"[Main] ⚠️ Template expired", flush=True)
-                    except:
-                        break
+                # 最多等 50ms：worker 一 push 就醒來提交，否則回去輪詢 template
+                for worker_id, nonce, template_id in self.found_ring.wait(0.05):
+                    self.blocks_found += 1
+                    print(f"[Main] ✨ 💎 Found nonce: {nonce}", flush=True)
+                    
+                    submit_template = self.template_cache.get(template_id)
+                    if submit_template:
+                        if self.submit_block(submit_template, nonce):
+                            self.blocks_accepted += 1
+                    else:
+                        print(f"[Main] ⚠️ Template expired", flush=True)
                 
                 if now - last_stats_time >= 1.0:
-                    self.print_stats()
+                    self.print_stats(now - last_stats_time)
                     last_stats_time = now
-                
-                time.sleep(0.05)
         
         except KeyboardInterrupt:
             print("\n[Main] 🛑 收到停止信號...", flush=True)
         
         finally:
             self.stop_workers()
+            self.shared_template.release()
+            self.total_hashes = sum(self.stats_array)
             runtime = time.time() - self.start_time
             avg_hr = self.total_hashes / max(runtime, 1)
             
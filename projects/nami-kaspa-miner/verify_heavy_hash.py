@@ -18,16 +18,10 @@ except:
 
 # 官方測試向量（來自 rusty-kaspa/consensus/pow/src/matrix.rs）
 # expected_hash (heavy_hash 的輸出)
-expected_hash_bytes = bytes([
-    135, 104, 159, 55, 153, 67, 234, 249, 183, 71, 92, 169, 83, 37, 104, 119, 114, 191, 204, 104, 252, 120, 153, 202, 235, 68,
-    9, 236, 69, 144, 195, 37,
-])
+expected_hash_bytes = bytes.fromhex("87689f379943eaf9b7475ca95325687772bfcc68fc7899caeb4409ec4590c325")
 
 # 輸入 hash (heavy_hash 的輸入)
-input_hash_bytes = bytes([
-    82, 46, 212, 218, 28, 192, 143, 92, 213, 66, 86, 63, 245, 241, 155, 189, 73, 159, 229, 180, 202, 105, 159, 166, 109, 172,
-    128, 136, 169, 195, 97, 41,
-])
+input_hash_bytes = bytes.fromhex("522ed4da1cc08f5cd542563ff5f19bbd499fe5b4ca699fa66dac8088a9c36129")
 
 print(f"\n📋 官方測試向量:")
 print(f"  Input hash:    {input_hash_bytes.hex()}")
@@ -55,12 +49,7 @@ print(f"  First row: {matrix[0][:10]}...")
 print(f"\n🔍 測試完整 PoW 計算:")
 
 # 自檢使用的測試向量（來自 shiokaze_v6.py run_self_test）
-test_hash = bytes([
-    0x01, 0x23, 0x45, 0x67, 0x89, 0xab, 0xcd, 0xef,
-    0x01, 0x23, 0x45, 0x67, 0x89, 0xab, 0xcd, 0xef,
-    0x01, 0x23, 0x45, 0x67, 0x89, 0xab, 0xcd, 0xef,
-    0x01, 0x23, 0x45, 0x67, 0x89, 0xab, 0xcd, 0xef,
-])
+test_hash = bytes.fromhex("0123456789abcdef" * 4)
 test_timestamp = 1234567890
 test_nonce = 99999
 
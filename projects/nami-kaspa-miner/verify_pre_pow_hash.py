@@ -8,120 +8,141 @@ import os
 import struct
 import hashlib
 
-sys.path.insert(0, os.path.expanduser("~/nami-backpack/projects/nami-kaspa-miner"))
-sys.path.insert(0, os.path.expanduser("~/kaspa-pminer"))
-import kaspa_pb2
-import kaspa_pb2_grpc
-import grpc
-
 def hash_from_hex(hex_str: str) -> bytes:
     if not hex_str:
         return b'\x00' * 32
     return bytes.fromhex(hex_str)
 
-def write_len(hasher, length: int):
-    hasher.update(struct.pack('<Q', length))
+def hashes_from_hex(hex_list) -> bytes:
+    """多個 hash 一次解碼（空字串仍是 32 bytes 的 0）"""
+    joined = ''.join(hex_list)
+    if len(joined) == 64 * len(hex_list):
+        return bytes.fromhex(joined)
+    return b''.join(hash_from_hex(h) for h in hex_list)
 
-def write_blue_work(hasher, blue_work: str):
+def blue_work_bytes(blue_work: str) -> bytes:
+    """blue_work (BigInt hex) → 去掉前導零的 big-endian bytes"""
     if not blue_work:
-        hasher.update(struct.pack('<Q', 0))
-        return
-    hex_str = blue_work
-    if len(hex_str) % 2 == 1:
-        hex_str = '0' + hex_str
-    work_bytes = bytes.fromhex(hex_str)
-    start = 0
-    while start < len(work_bytes) and work_bytes[start] == 0:
-        start += 1
-    write_len(hasher, len(work_bytes) - start)
-    hasher.update(work_bytes[start:])
+        return b''
+    n = int(blue_work, 16)
+    return n.to_bytes((n.bit_length() + 7) // 8, 'big')
 
-def my_pre_pow_hash(header) -> bytes:
-    """我的 pre_pow_hash 實現"""
-    hasher = hashlib.blake2b(digest_size=32)
-    hasher.update(struct.pack('<H', header.version))
-    
-    parents = list(header.parents)
-    write_len(hasher, len(parents))
+# 格式只解析一次
+U16 = struct.Struct('<H')
+U64 = struct.Struct('<Q')
+HEADER_TAIL = struct.Struct('<QIQQQ')  # timestamp = 0, bits, nonce = 0, daaScore, blueScore
+
+def serialize_header(header) -> bytearray:
+    """序列化 header（timestamp、nonce 填 0）：先算總長度，整塊 bytearray 依 offset 寫入，再一次交給 blake2b"""
+    levels = [hashes_from_hex(level.parentHashes) for level in header.parents]
+    work = blue_work_bytes(header.blueWork)
+    size = (U16.size + U64.size + sum(U64.size + len(h) for h in levels)
+            + 3 * 32 + HEADER_TAIL.size + U64.size + len(work) + 32)
+    buf = bytearray(size)
     
-    for level in parents:
-        parent_hashes = list(level.parentHashes)
-        write_len(hasher, len(parent_hashes))
-        for h in parent_hashes:
-            hasher.update(hash_from_hex(h))
+    U16.pack_into(buf, 0, header.version)
+    U64.pack_into(buf, 2, len(levels))
+    off = 10
+    for hashes in levels:
+        U64.pack_into(buf, off, len(hashes) // 32)
+        buf[off + 8:off + 8 + len(hashes)] = hashes
+        off += 8 + len(hashes)
     
-    hasher.update(hash_from_hex(header.hashMerkleRoot))
-    hasher.update(hash_from_hex(header.acceptedIdMerkleRoot))
-    hasher.update(hash_from_hex(header.utxoCommitment))
-    hasher.update(struct.pack('<Q', 0))  # timestamp = 0
-    hasher.update(struct.pack('<I', header.bits))
-    hasher.update(struct.pack('<Q', 0))  # nonce = 0
-    hasher.update(struct.pack('<Q', header.daaScore))
-    hasher.update(struct.pack('<Q', header.blueScore))
-    write_blue_work(hasher, header.blueWork)
-    hasher.update(hash_from_hex(header.pruningPoint))
+    for h in (header.hashMerkleRoot, header.acceptedIdMerkleRoot, header.utxoCommitment):
+        buf[off:off + 32] = hash_from_hex(h)
+        off += 32
+    HEADER_TAIL.pack_into(buf, off, 0, header.bits, 0, header.daaScore, header.blueScore)
+    off += HEADER_TAIL.size
+    U64.pack_into(buf, off, len(work))
+    off += 8
+    buf[off:off + len(work)] = work
+    off += len(work)
+    buf[off:off + 32] = hash_from_hex(header.pruningPoint)
     
-    return hasher.digest()
+    return buf
+
+def my_pre_pow_hash(header) -> bytes:
+    """我的 pre_pow_hash 實現"""
+    return hashlib.blake2b(serialize_header(header), digest_size=32).digest()
 
-# 連接並獲取 template
-address = "localhost:16210"
-wallet = "kaspatest:qqxhwz070a3tpmz57alnc3zp67uqrw8ll7rdws9nqp8nsvptarw3jl87m5j2m"
+def main():
+    sys.path.insert(0, os.path.expanduser("~/nami-backpack/projects/nami-kaspa-miner"))
+    sys.path.insert(0, os.path.expanduser("~/kaspa-pminer"))
+    import kaspa_pb2
+    import kaspa_pb2_grpc
+    import grpc
 
-channel = grpc.insecure_channel(address)
-stub = kaspa_pb2_grpc.RPCStub(channel)
+    # 連接並獲取 template
+    address = "localhost:16210"
+    wallet = "kaspatest:qqxhwz070a3tpmz57alnc3zp67uqrw8ll7rdws9nqp8nsvptarw3jl87m5j2m"
 
-request = kaspa_pb2.KaspadMessage(
-    getBlockTemplateRequest=kaspa_pb2.GetBlockTemplateRequestMessage(
-        payAddress=wallet,
-        extraData="verify"
+    # keepalive 與 miner 的 KaspaClient 相同；template 交易多時會超過 gRPC 預設的 4 MB 上限
+    channel = grpc.insecure_channel(
+        address,
+        options=[
+            ('grpc.keepalive_time_ms', 10000),
+            ('grpc.max_receive_message_length', 16 * 1024 * 1024),
+        ]
     )
-)
-
-responses = stub.MessageStream(iter([request]))
-response = next(responses)
-
-if not response.HasField('getBlockTemplateResponse'):
-    print("❌ No template response")
-    sys.exit(1)
-
-block = response.getBlockTemplateResponse.block
-header = block.header
-
-print(f"📋 Header from node:")
-print(f"   version: {header.version}")
-print(f"   timestamp: {header.timestamp}")
-print(f"   bits: 0x{header.bits:08x}")
-print(f"   nonce: {header.nonce}")
-print(f"   daaScore: {header.daaScore}")
-print(f"   blueScore: {header.blueScore}")
-print(f"   blueWork: {header.blueWork}")
-
-# 我的計算
-my_hash = my_pre_pow_hash(header)
-print(f"\n🔢 My pre_pow_hash: {my_hash.hex()}")
-
-# 嘗試導入 Rust kaspa_pow_py 並比較
-try:
-    import kaspa_pow_py
-    print("✅ kaspa_pow_py loaded")
-    
-    # 用我的 pre_pow_hash 生成矩陣
-    matrix = kaspa_pow_py.gen_matrix(my_hash)
-    print(f"   Matrix generated OK")
-    
-    # 計算一個測試 PoW
-    test_pow = kaspa_pow_py.compute_pow(my_hash, header.timestamp, 12345, matrix)
-    print(f"   Test PoW: {test_pow.hex()}")
-    
-except ImportError as e:
-    print(f"❌ kaspa_pow_py not available: {e}")
-
-# 驗證 header 序列化
-print(f"\n📦 Header serialization check:")
-print(f"   hashMerkleRoot: {header.hashMerkleRoot}")
-print(f"   acceptedIdMerkleRoot: {header.acceptedIdMerkleRoot}")
-print(f"   utxoCommitment: {header.utxoCommitment}")
-print(f"   pruningPoint: {header.pruningPoint}")
-print(f"   parents levels: {len(header.parents)}")
-if header.parents:
-    print(f"   parents[0] hashes: {len(header.parents[0].parentHashes)}")
+    stub = kaspa_pb2_grpc.RPCStub(channel)
+
+    request = kaspa_pb2.KaspadMessage(
+        getBlockTemplateRequest=kaspa_pb2.GetBlockTemplateRequestMessage(
+            payAddress=wallet,
+            extraData="verify"
+        )
+    )
+
+    responses = stub.MessageStream(iter([request]), timeout=10)
+    response = next(responses)
+    responses.cancel()   # 只要一個回應，不用等 stream 結束
+    channel.close()
+
+    if not response.HasField('getBlockTemplateResponse'):
+        print("❌ No template response")
+        return 1
+
+    block = response.getBlockTemplateResponse.block
+    header = block.header
+
+    print(f"📋 Header from node:")
+    print(f"   version: {header.version}")
+    print(f"   timestamp: {header.timestamp}")
+    print(f"   bits: 0x{header.bits:08x}")
+    print(f"   nonce: {header.nonce}")
+    print(f"   daaScore: {header.daaScore}")
+    print(f"   blueScore: {header.blueScore}")
+    print(f"   blueWork: {header.blueWork}")
+
+    # 我的計算
+    my_hash = my_pre_pow_hash(header)
+    print(f"\n🔢 My pre_pow_hash: {my_hash.hex()}")
+
+    # 嘗試導入 Rust kaspa_pow_py 並比較
+    try:
+        import kaspa_pow_py
+        print("✅ kaspa_pow_py loaded")
+
+        # 用我的 pre_pow_hash 生成矩陣
+        matrix = kaspa_pow_py.gen_matrix(my_hash)
+        print(f"   Matrix generated OK")
+
+        # 計算一個測試 PoW
+        test_pow = kaspa_pow_py.compute_pow(my_hash, header.timestamp, 12345, matrix)
+        print(f"   Test PoW: {test_pow.hex()}")
+
+    except ImportError as e:
+        print(f"❌ kaspa_pow_py not available: {e}")
+
+    # 驗證 header 序列化
+    print(f"\n📦 Header serialization check:")
+    print(f"   hashMerkleRoot: {header.hashMerkleRoot}")
+    print(f"   acceptedIdMerkleRoot: {header.acceptedIdMerkleRoot}")
+    print(f"   utxoCommitment: {header.utxoCommitment}")
+    print(f"   pruningPoint: {header.pruningPoint}")
+    print(f"   parents levels: {len(header.parents)}")
+    if header.parents:
+        print(f"   parents[0] hashes: {len(header.parents[0].parentHashes)}")
+
+if __name__ == "__main__":
+    sys.exit(main())
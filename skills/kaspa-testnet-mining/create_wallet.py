@@ -9,6 +9,7 @@ by Nami (波浪)
   python3 create_wallet.py --verbose  # 顯示地址創造過程
 """
 
+import os
 import json
 import argparse
 import secrets
@@ -164,8 +165,21 @@ def main():
         'note': f'同一私鑰在 {other_network} 的地址: {other_address}',
     }
     
-    with open(output_path, 'w') as f:
-        json.dump(wallet_data, f, indent=2)
+    # 先寫暫存檔再 rename：不會留下寫一半的錢包；含私鑰，只給自己讀寫 (0600)
+    # O_EXCL：一定是新建的檔案，0600 才會生效（沿用上次中斷留下的 .tmp 會保留它原本的權限）
+    tmp_path = f"{output_path}.tmp"
+    try:
+        os.unlink(tmp_path)
+    except FileNotFoundError:
+        pass
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(json.dumps(wallet_data, indent=2).encode())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
     
     print(f"💾 已保存到: {output_path}")
     print(f"\n🎉 完成！現在可以開始挖礦了～")